@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for command latency with many busy boxes
+Run: poetry run python -m benchmarks.bench_box_latency
+
+Every box has a judge sending PROGRESS_UPDATEs and a spectator reading its
+state and asking for snapshots, all on one event loop, as in
+BoxRegistryContentionTest. Each command only takes its own box lock, so the
+latency should not grow with the number of boxes beyond the loop's own load.
+"""
+
+import argparse
+import asyncio
+import time
+
+from escalada.api import live
+from escalada.api.live import Cmd, cmd, get_state
+
+
+async def run(boxes: int, commands: int) -> list[float]:
+    latencies: list[float] = []
+
+    async def judge(box_id: int):
+        await cmd(Cmd(boxId=box_id, type="INIT_ROUTE", competitors=[{"nume": "A"}]))
+        for _ in range(commands):
+            t0 = time.perf_counter()
+            await cmd(Cmd(boxId=box_id, type="PROGRESS_UPDATE", delta=1))
+            latencies.append(time.perf_counter() - t0)
+
+    async def spectator(box_id: int):
+        for _ in range(commands):
+            await get_state(box_id)
+            await live._send_state_snapshot(box_id)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(
+        *(judge(b) for b in range(boxes)),
+        *(spectator(b) for b in range(boxes)),
+    )
+    return latencies
+
+
+def percentile(values: list[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[6, 48, 200])
+    parser.add_argument("-n", type=int, default=20, help="commands per box")
+    args = parser.parse_args()
+
+    # Validation and rate limiting are not what is measured here
+    live.VALIDATION_ENABLED = False
+    print(f"{'boxes':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for boxes in args.boxes:
+        live.state_map.clear()
+        live.state_locks.clear()
+        latencies = sorted(asyncio.run(run(boxes, args.n)))
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        print(f"{boxes:>6} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {latencies[-1] * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for per-box WebSocket fan-out
+Run: poetry run python -m benchmarks.bench_broadcast
+
+Compares the previous fan-out (json.dumps per subscriber, sequential awaits)
+with _broadcast_to_box for 10/100/1000 subscribers on one box. Each fake
+socket simulates a small network latency per send.
+
+"enqueue" is the time the caller (cmd() under the box lock) spends in
+_broadcast_to_box; "delivered" is until every outbox writer has sent the frame.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from escalada.api import live
+
+SEND_LATENCY = 0.0005  # 0.5 ms per send_text
+
+
+class FakeWS:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.bytes_sent = 0
+
+    async def send_text(self, text: str) -> None:
+        self.bytes_sent += len(text)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+def make_snapshot(competitors: int) -> dict:
+    state = live._default_state()
+    state.initiated = True
+    state.set_competitors(
+        [
+            {"nume": f"Competitor Ștefan {i}", "marked": i % 3 == 0}
+            for i in range(competitors)
+        ]
+    )
+    return live._build_snapshot(1, state)
+
+
+async def legacy_broadcast(sockets: list, payload: dict) -> None:
+    for ws in sockets:
+        await ws.send_text(json.dumps(payload, ensure_ascii=False))
+
+
+async def run_case(subscribers: int, payload: dict, latency: float, rounds: int):
+    sockets = [FakeWS(latency) for _ in range(subscribers)]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await legacy_broadcast(sockets, payload)
+    legacy = (time.perf_counter() - start) / rounds
+
+    outboxes = [await live._register_subscriber(ws, 1) for ws in sockets]
+    enqueue = 0.0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await live._broadcast_to_box(1, payload)
+        enqueue += time.perf_counter() - t0
+        for outbox in outboxes:
+            await outbox.flush()
+    current = (time.perf_counter() - start) / rounds
+    for outbox in outboxes:
+        await outbox.close()
+    live.channels.clear()
+
+    return legacy, enqueue / rounds, current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--competitors", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=SEND_LATENCY)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = make_snapshot(args.competitors)
+    size = len(json.dumps(payload, ensure_ascii=False))
+    print(
+        f"payload: STATE_SNAPSHOT with {args.competitors} competitors ({size} bytes), "
+        f"send latency {args.latency * 1000:.2f} ms"
+    )
+    print(
+        f"{'sockets':>8} {'legacy ms':>12} {'enqueue ms':>12} "
+        f"{'delivered ms':>13} {'speedup':>8}"
+    )
+    for n in (10, 100, 1000):
+        legacy, enqueue, current = asyncio.run(
+            run_case(n, payload, args.latency, args.rounds)
+        )
+        print(
+            f"{n:>8} {legacy * 1000:>12.2f} {enqueue * 1000:>12.3f} "
+            f"{current * 1000:>13.2f} {legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
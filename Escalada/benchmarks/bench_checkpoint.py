@@ -0,0 +1,129 @@
+"""
+Benchmark for checkpoints and cold start
+Run: poetry run python -m benchmarks.bench_checkpoint
+
+Builds 100 boxes with 500 competitors each (half already scored), then
+measures the on-loop capture, the off-loop write, and cold start (load the
+checkpoint, restore state_map, replay a short journal tail) against
+replaying the full journal that produced the same state.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from escalada.api import live
+from escalada.checkpoint import Checkpointer, load_checkpoint
+from escalada.journal import Journal, box_key
+
+
+def day_records(box_id: int, competitors: int, scored: int):
+    sid = f"session-{box_id}"
+    names = [f"Concurent Ștefan {box_id}-{i}" for i in range(competitors)]
+    yield {
+        "cmd": {
+            "boxId": box_id,
+            "type": "INIT_ROUTE",
+            "routeIndex": 1,
+            "holdsCount": 40,
+            "competitors": [{"nume": n} for n in names],
+        },
+        "sid": sid,
+    }
+    for name in names[:scored]:
+        yield {"cmd": {"boxId": box_id, "type": "START_TIMER"}, "sid": sid}
+        for _ in range(20):
+            yield {
+                "cmd": {"boxId": box_id, "type": "PROGRESS_UPDATE", "delta": 1},
+                "sid": sid,
+            }
+        yield {
+            "cmd": {
+                "boxId": box_id,
+                "type": "SUBMIT_SCORE",
+                "competitor": name,
+                "score": 20,
+            },
+            "sid": sid,
+        }
+
+
+async def build(directory: str, args) -> tuple[Journal, Checkpointer]:
+    journal = Journal(os.path.join(directory, "journal"), fsync=False)
+    journal.start()
+    last = None
+    for box_id in range(args.boxes):
+        for record in day_records(box_id, args.competitors, args.competitors // 2):
+            last = journal.append(box_key(box_id), record)
+        await last
+    return journal, Checkpointer(
+        journal, live.capture_state, os.path.join(directory, "checkpoint.json")
+    )
+
+
+def cold_start(directory: str, checkpoint_path: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    live.state_map.clear()
+    checkpoint = load_checkpoint(checkpoint_path)
+    after = -1
+    if checkpoint is not None:
+        live.restore_state(checkpoint)
+        after = checkpoint["journal_generation"]
+    replayed = live.replay_journal(Journal(directory).read(after))
+    return time.perf_counter() - start, replayed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--boxes", type=int, default=100)
+    parser.add_argument("--competitors", type=int, default=500)
+    parser.add_argument("--tail", type=int, default=50, help="records per box")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal_dir = os.path.join(tmp, "journal")
+
+        async def scenario():
+            journal, checkpointer = await build(tmp, args)
+            await journal.close()
+            # Full replay, as before checkpoints
+            full, full_records = cold_start(journal_dir, "missing.json")
+
+            journal = Journal(journal_dir, fsync=False)
+            journal.start()
+            checkpointer.journal = journal
+            await checkpointer.checkpoint(force=True)
+            for box_id in range(args.boxes):
+                for _ in range(args.tail):
+                    last = journal.append(
+                        box_key(box_id),
+                        {
+                            "cmd": {
+                                "boxId": box_id,
+                                "type": "TIMER_SYNC",
+                                "remaining": 100,
+                            },
+                            "sid": live.state_map[box_id].sessionId,
+                        },
+                    )
+            await last
+            await journal.close()
+            return checkpointer, full, full_records
+
+        checkpointer, full, full_records = asyncio.run(scenario())
+        stats = checkpointer.stats()
+        print(
+            f"{args.boxes} boxes x {args.competitors} competitors: "
+            f"checkpoint {stats['last_bytes'] / 1e6:.1f} MB, "
+            f"capture (on loop) {stats['last_capture_ms']:.1f} ms, "
+            f"write+compact (off loop) {stats['last_write_ms']:.1f} ms"
+        )
+        print(f"  full journal replay : {full:.3f}s ({full_records:,} records)")
+        elapsed, tail = cold_start(journal_dir, checkpointer.path)
+        print(f"  checkpoint + tail   : {elapsed:.3f}s ({tail:,} tail records)")
+
+
+if __name__ == "__main__":
+    main()
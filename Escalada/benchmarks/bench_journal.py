@@ -0,0 +1,162 @@
+"""
+Benchmark for the command journal
+Run: poetry run python -m benchmarks.bench_journal
+
+Throughput: N concurrent judges append and wait for durability, compared
+with one fsync per command (a single judge waiting on every append).
+
+Replay: a synthetic competition day (START_TIMER, progress taps, one
+TIMER_SYNC per second of climbing, REGISTER_TIME and SUBMIT_SCORE for every
+competitor, on every box) is journaled, then read back and replayed into
+state_map as main.lifespan does at startup.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from escalada.api import live
+from escalada.journal import Journal, box_key
+
+
+async def judge(journal: Journal, box_id: int, commands: int) -> None:
+    for _ in range(commands):
+        await journal.append(
+            box_key(box_id),
+            {
+                "cmd": {"boxId": box_id, "type": "PROGRESS_UPDATE", "delta": 1},
+                "sid": "s",
+            },
+        )
+
+
+async def throughput(directory: str, judges: int, commands: int, fsync: bool):
+    journal = Journal(directory, fsync=fsync)
+    journal.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(judge(journal, j % 6, commands) for j in range(judges)))
+    elapsed = time.perf_counter() - start
+    await journal.close()
+    return journal.records / elapsed, journal.fsyncs
+
+
+def competition_day(boxes: int, rounds: int, competitors: int, climb_seconds: int):
+    for box_id in range(boxes):
+        sid = f"session-{box_id}"
+        for r in range(rounds):
+            names = [f"Competitor {r}-{i}" for i in range(competitors)]
+            yield box_id, {
+                "cmd": {
+                    "boxId": box_id,
+                    "type": "INIT_ROUTE",
+                    "routeIndex": r + 1,
+                    "holdsCount": 40,
+                    "timerPreset": "04:00",
+                    "competitors": [{"nume": n, "marked": False} for n in names],
+                },
+                "sid": sid,
+            }
+            for name in names:
+                yield box_id, {
+                    "cmd": {"boxId": box_id, "type": "START_TIMER"},
+                    "sid": sid,
+                }
+                for s in range(climb_seconds):
+                    if s % 10 == 0:
+                        yield box_id, {
+                            "cmd": {
+                                "boxId": box_id,
+                                "type": "PROGRESS_UPDATE",
+                                "delta": 1,
+                            },
+                            "sid": sid,
+                        }
+                    yield box_id, {
+                        "cmd": {
+                            "boxId": box_id,
+                            "type": "TIMER_SYNC",
+                            "remaining": climb_seconds - s,
+                        },
+                        "sid": sid,
+                    }
+                yield box_id, {
+                    "cmd": {
+                        "boxId": box_id,
+                        "type": "REGISTER_TIME",
+                        "registeredTime": 201.5,
+                    },
+                    "sid": sid,
+                }
+                yield box_id, {
+                    "cmd": {
+                        "boxId": box_id,
+                        "type": "SUBMIT_SCORE",
+                        "competitor": name,
+                        "score": 24.0,
+                    },
+                    "sid": sid,
+                }
+
+
+async def write_day(directory: str, args) -> Journal:
+    journal = Journal(directory, fsync=False)
+    journal.start()
+    last = None
+    days = competition_day(
+        args.boxes, args.rounds, args.competitors, args.climb_seconds
+    )
+    for i, (box_id, record) in enumerate(days, 1):
+        last = journal.append(box_key(box_id), record)
+        if i % 5000 == 0:
+            await last  # keep the pending queue bounded
+    await last
+    await journal.close()
+    return journal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--judges", type=int, default=60)
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--boxes", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--competitors", type=int, default=40)
+    parser.add_argument("--climb-seconds", type=int, default=240)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        serial, serial_fsyncs = asyncio.run(
+            throughput(f"{tmp}/serial", 1, args.commands * 5, True)
+        )
+        grouped, grouped_fsyncs = asyncio.run(
+            throughput(f"{tmp}/grouped", args.judges, args.commands, True)
+        )
+        print("journal throughput (fsync on)")
+        print(
+            f"  1 judge, fsync per command : {serial:>10,.0f} rec/s ({serial_fsyncs} fsyncs)"
+        )
+        print(
+            f"  {args.judges} judges, group commit : {grouped:>10,.0f} rec/s "
+            f"({grouped_fsyncs} fsyncs for {args.judges * args.commands} records)"
+        )
+
+        journal = asyncio.run(write_day(f"{tmp}/day", args))
+        print(
+            f"competition day: {journal.records:,} records, "
+            f"{journal.bytes_written / 1e6:.1f} MB on {args.boxes} boxes"
+        )
+        start = time.perf_counter()
+        records = journal.read()
+        read_done = time.perf_counter()
+        live.state_map.clear()
+        applied = live.replay_journal(records)
+        replay_done = time.perf_counter()
+        print(
+            f"  read {read_done - start:.2f}s + replay {replay_done - read_done:.2f}s "
+            f"= {replay_done - start:.2f}s ({applied / (replay_done - start):,.0f} rec/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for the /api/cmd rate limiter
+Run: poetry run python -m benchmarks.bench_rate_limit
+
+Compares the previous limiter (filter a list of timestamps per check) with
+the ring-buffer RateLimiter at full window occupancy: the clock advances by
+just over 60 s / limit per check, so the per-minute and per-command windows
+always hold `limit` accepted requests and every check is allowed.
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+from escalada import rate_limit
+from escalada.rate_limit import RateLimiter
+
+
+class LegacyRateLimiter:
+    """The list-filtering check that RateLimiter used to do"""
+
+    def __init__(self, max_per_minute: int, max_per_second: int, cmd_limit: int):
+        self.max_per_minute = max_per_minute
+        self.max_per_second = max_per_second
+        self.cmd_limit = cmd_limit
+        self.request_history = defaultdict(lambda: {"requests": [], "blocked_until": 0})
+        self.command_history = defaultdict(lambda: defaultdict(list))
+
+    def check_rate_limit(self, box_id: int, command_type: str) -> tuple[bool, str]:
+        current_time = time.time()
+        history = self.request_history[box_id]
+        if history["blocked_until"] > current_time:
+            return False, "blocked"
+        requests = history["requests"]
+        requests[:] = [ts for ts in requests if current_time - ts < 60]
+        recent_requests = [ts for ts in requests if current_time - ts < 1]
+        if len(recent_requests) >= self.max_per_second:
+            return False, "second"
+        if len(requests) >= self.max_per_minute:
+            return False, "minute"
+        cmd_requests = self.command_history[box_id][command_type]
+        cmd_requests[:] = [ts for ts in cmd_requests if current_time - ts < 60]
+        if len(cmd_requests) >= self.cmd_limit:
+            return False, "command"
+        requests.append(current_time)
+        cmd_requests.append(current_time)
+        return True, ""
+
+
+class FakeClock:
+    def __init__(self, step: float):
+        self.now = 1_000_000.0
+        self.step = step
+
+    def __call__(self) -> float:
+        self.now += self.step
+        return self.now
+
+
+def rate(limiter, limit: int, n: int) -> float:
+    clock = FakeClock(60 / limit * 1.001)
+    with patch.object(rate_limit.time, "time", clock):
+        # Fill the windows first
+        for _ in range(limit * 2):
+            limiter.check_rate_limit(1, "REGISTER_TIME")
+        start = time.perf_counter()
+        for _ in range(n):
+            allowed, reason = limiter.check_rate_limit(1, "REGISTER_TIME")
+        elapsed = time.perf_counter() - start
+    assert allowed, reason
+    return n / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[60, 300, 1200])
+    args = parser.parse_args()
+
+    print(f"{'window':>8} {'legacy checks/s':>16} {'ring checks/s':>14} {'speedup':>8}")
+    for limit in args.limits:
+        legacy = LegacyRateLimiter(limit, 100, limit)
+        ring = RateLimiter(max_per_minute=limit, max_per_second=100)
+        ring.set_command_limit("REGISTER_TIME", limit)
+        old = rate(legacy, limit, max(args.n * 60 // limit, 1000))
+        new = rate(ring, limit, args.n * 10)
+        print(f"{limit:>8} {old:>16,.0f} {new:>14,.0f} {new / old:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for the results store
+Run: poetry run python -m benchmarks.bench_results
+
+Saves a category (all routes, overall) in one transaction, then compares a
+podium read from the store with re-reading the exported overall.xlsx, which
+is what GET /api/podium did before the store existed.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from escalada.api.save_ranking import (
+    RankingIn,
+    _build_overall_df,
+    _overall_df_from_store,
+    _rank_route,
+)
+from escalada.results_store import ResultsStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--competitors", type=int, default=200)
+    parser.add_argument("--routes", type=int, default=3)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    payload = RankingIn(
+        categorie="Seniori",
+        route_count=args.routes,
+        scores={
+            f"Concurent {i}": [rng.randint(0, 40) for _ in range(args.routes)]
+            for i in range(args.competitors)
+        },
+    )
+    times: dict = {}
+    overall_df = _build_overall_df(payload, times)
+    routes = {r + 1: _rank_route(payload, times, r) for r in range(args.routes)}
+    overall = [
+        (row.Nume, int(row.Rank), float(row.Total))
+        for row in overall_df.itertuples(index=False)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(os.path.join(tmp, "results.db"))
+        started = time.perf_counter()
+        store.save_category(
+            payload.categorie,
+            args.routes,
+            False,
+            [(name, "") for name in payload.scores],
+            routes,
+            overall,
+        )
+        print(
+            f"save {args.competitors} competitors x {args.routes} routes: "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms ({store.rows_written} rows)"
+        )
+
+        xlsx = os.path.join(tmp, "overall.xlsx")
+        _overall_df_from_store(store.overall(payload.categorie)).to_excel(
+            xlsx, index=False
+        )
+
+        started = time.perf_counter()
+        for _ in range(args.reads):
+            store.podium(payload.categorie)
+        from_store = (time.perf_counter() - started) / args.reads
+
+        started = time.perf_counter()
+        for _ in range(max(args.reads // 20, 1)):
+            pd.read_excel(xlsx).head(3)
+        from_excel = (time.perf_counter() - started) / max(args.reads // 20, 1)
+
+        print(f"  podium from store : {from_store * 1e6:>10,.0f} us")
+        print(f"  podium from xlsx  : {from_excel * 1e6:>10,.0f} us")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark for command validation
+Run: poetry run python -m benchmarks.bench_validation
+
+Compares the previous validation (model_dump(), drop None values, build a
+ValidatedCmd) with validate_command() for the command types judges send.
+"validate" times only the validation step; "request" also includes parsing
+the JSON body into Cmd, as FastAPI does before cmd() runs.
+"""
+
+import argparse
+import time
+
+from escalada.api.live import Cmd
+from escalada.validation import ValidatedCmd, validate_command
+
+PAYLOADS = {
+    "PROGRESS_UPDATE": {
+        "boxId": 3,
+        "type": "PROGRESS_UPDATE",
+        "delta": 1,
+        "sessionId": "0f8c1a52-8f0e-4d2b-9a57-3b6f5b0d2c11",
+        "boxVersion": 2,
+    },
+    "TIMER_SYNC": {
+        "boxId": 3,
+        "type": "TIMER_SYNC",
+        "remaining": 183.4,
+        "sessionId": "0f8c1a52-8f0e-4d2b-9a57-3b6f5b0d2c11",
+    },
+    "SUBMIT_SCORE": {
+        "boxId": 3,
+        "type": "SUBMIT_SCORE",
+        "score": 27.5,
+        "competitor": "Ștefan Popescu",
+        "registeredTime": 201.3,
+        "sessionId": "0f8c1a52-8f0e-4d2b-9a57-3b6f5b0d2c11",
+        "boxVersion": 2,
+    },
+    "INIT_ROUTE": {
+        "boxId": 3,
+        "type": "INIT_ROUTE",
+        "routeIndex": 1,
+        "holdsCount": 40,
+        "competitors": [{"nume": f"Competitor {i}"} for i in range(100)],
+        "categorie": "Seniori",
+        "timerPreset": "05:00",
+    },
+}
+
+
+def legacy_validate(cmd: Cmd) -> None:
+    cmd_data = {k: v for k, v in cmd.model_dump().items() if v is not None}
+    cmd_data.pop("time", None)
+    ValidatedCmd(**cmd_data)
+
+
+def rate(fn, arg, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return n / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(
+        f"{'command':>16} {'legacy/s':>11} {'validate/s':>11} {'speedup':>8} "
+        f"{'legacy req/s':>13} {'request/s':>11} {'speedup':>8}"
+    )
+    for name, payload in PAYLOADS.items():
+        n = args.n if name != "INIT_ROUTE" else args.n // 20
+        cmd = Cmd(**payload)
+        old = rate(legacy_validate, cmd, n)
+        new = rate(validate_command, cmd, n)
+        old_req = rate(lambda p: legacy_validate(Cmd(**p)), payload, n)
+        new_req = rate(lambda p: validate_command(Cmd(**p)), payload, n)
+        print(
+            f"{name:>16} {old:>11,.0f} {new:>11,.0f} {new / old:>7.1f}x "
+            f"{old_req:>13,.0f} {new_req:>11,.0f} {new_req / old_req:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -356,7 +356,13 @@ const ControlPanel = () => {
             if (msg.type === 'PING') {
               lastPong = Date.now();
               if (ws.readyState === WebSocket.OPEN) {
-                ws.send(JSON.stringify({ type: 'PONG', timestamp: msg.timestamp }));
+                ws.send(
+                  JSON.stringify({
+                    type: 'PONG',
+                    timestamp: msg.timestamp,
+                    clientTime: Date.now(),
+                  }),
+                );
               }
               return;
             }
@@ -103,6 +103,13 @@ export type WebSocketMessage =
   | {
       type: 'PING' | 'PONG';
       timestamp?: number;
+      clientTime?: number;
+    }
+  | {
+      type: 'CLOCK';
+      offsetMs: number;
+      rttMs: number;
+      serverTime: number;
     }
   | {
       type: 'TIME_CRITERION';
@@ -89,7 +89,13 @@ export function useWebSocketWithHeartbeat(url, onMessage) {
             if (msg.type === 'PING') {
               if (ws.readyState === WebSocket.OPEN) {
                 try {
-                  ws.send(JSON.stringify({ type: 'PONG', timestamp: msg.timestamp }));
+                  ws.send(
+                    JSON.stringify({
+                      type: 'PONG',
+                      timestamp: msg.timestamp,
+                      clientTime: Date.now(),
+                    }),
+                  );
                 } catch (e) {
                   logger.warn(`[WebSocket] Failed to send PONG: ${e}`);
                 }
@@ -0,0 +1,79 @@
+from typing import Optional
+
+from escalada.api import live
+from escalada.history import parse_point
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+router = APIRouter()
+
+
+def _history():
+    if live.history is None:
+        raise HTTPException(status_code=503, detail="History is disabled")
+    return live.history
+
+
+def _point(value: Optional[str], name: str) -> Optional[tuple[str, float]]:
+    if value is None:
+        return None
+    try:
+        return parse_point(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name} must be a seq, a Unix timestamp or an ISO 8601 time",
+        )
+
+
+@router.get("/history/{box_id}")
+async def get_state_at(box_id: int, at: str):
+    """
+    What a box's screen showed at a point (for appeals).
+
+    `at` is a box seq (as in STATE_SNAPSHOT), a Unix timestamp or an ISO 8601
+    time. Rebuilt from the nearest keyframe plus a bounded replay; points at or
+    after the latest command are answered from the live state.
+    """
+    history = _history()
+    field, value = _point(at, "at")
+    last = history.last_point(box_id)
+    if last is None:
+        raise HTTPException(status_code=404, detail=f"No history for box {box_id}")
+
+    state = live.state_map.get(box_id)
+    if state is not None and value >= last[0 if field == "seq" else 1]:
+        info = {"ts": last[1], "source": "live", "replayed": 0}
+    else:
+        found = await history.state_at(box_id, field, value, live.replay_cmd)
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"Box {box_id} has no history before {at}")
+        state, info = found
+        info["source"] = "history"
+    return {
+        "boxId": box_id,
+        "at": {field: value},
+        "seq": state.seq,
+        **info,
+        "state": live._build_snapshot(box_id, state),
+    }
+
+
+@router.get("/history/{box_id}/events")
+async def get_events(box_id: int, start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Stream the commands applied to a box between two points, as NDJSON.
+
+    Each line is {"seq", "ts", "cmd", "sid"}; `start` and `end` are inclusive
+    and take the same forms as `at`. Reading starts at the keyframe before
+    `start`, not at the beginning of the file.
+    """
+    history = _history()
+    first, last = _point(start, "start"), _point(end, "end")
+    return StreamingResponse(history.events(box_id, first, last), media_type="application/x-ndjson")
+
+
+@router.get("/stats/history")
+async def get_history_stats():
+    """History size, keyframes, queries and commands replayed for them."""
+    return _history().stats()
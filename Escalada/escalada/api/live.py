@@ -2,36 +2,123 @@
 import asyncio
 import json
 import logging
+import os
+import time
+import uuid
+
 # state per boxId
 from typing import Dict
 
+from escalada.backend import LocalBackend, StateBackend
+from escalada.box_state import BoxState
+from escalada.checkpoint import Checkpointer
+from escalada.clock_sync import (
+    CLOCK_SYNC_BURST,
+    CLOCK_SYNC_BURST_INTERVAL_SEC,
+    ClockEstimate,
+)
+from escalada.event_ring import EventRing
+from escalada.eviction import BoxEvictor, SpillStore, measure, shallow_size
+from escalada.history import HistoryLog
+from escalada.journal import GLOBAL_KEY, Journal, box_key
+from escalada.outbox import Outbox
+from escalada.partition import PARTITION_COUNT, owns_box
+from escalada.rate_limit import (
+    RateLimitSweeper,
+    check_batch_rate_limit,
+    get_rate_limiter,
+)
+from escalada.rate_limit_middleware import (
+    client_keys,
+    precheck_stats,
+    prechecked,
+    sender,
+)
+from escalada.replication import Replica, ReplicationSource
+from escalada.timer_engine import TimerEngine
+
+# Import validation and rate limiting
+from escalada.validation import InputSanitizer, validate_command
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from starlette.websockets import WebSocket
 
-from escalada.rate_limit import check_rate_limit
-# Import validation and rate limiting
-from escalada.validation import InputSanitizer, ValidatedCmd
-
 logger = logging.getLogger(__name__)
 
-state_map: Dict[int, dict] = {}
+state_map: Dict[int, BoxState] = {}
 state_locks: Dict[int, asyncio.Lock] = {}  # Lock per boxId
-init_lock = asyncio.Lock()  # Protects state_map and state_locks initialization
+# No global lock guards these registries: lookups and get-or-create never
+# await, so on the single event loop they cannot interleave with each other
 time_criterion_enabled: bool = False
 time_criterion_lock = asyncio.Lock()  # Global time criterion lock
 
 
 router = APIRouter()
-channels: dict[int, set[WebSocket]] = {}
+channels: dict[int, set[Outbox]] = {}
+
+# Last snapshot broadcast per box; STATE_DELTA frames are diffed against it
+_last_broadcast: dict[int, dict] = {}
+_DELTA_SKIP_FIELDS = {"type", "boxId", "seq", "eventSeq", "competitors"}
+
+# Recent frames per box for ?since= resume; created with the first subscriber
+_event_rings: dict[int, EventRing] = {}
+
+# RTT and clock offset of every connected socket (see escalada.clock_sync)
+_clocks: dict[Outbox, ClockEstimate] = {}
+
+# Merge snapshot broadcasts requested within this window (ms); 0 disables
+SNAPSHOT_COALESCE_MS = float(os.getenv("SNAPSHOT_COALESCE_MS", "0"))
+_pending_snapshots: dict[int, asyncio.Task] = {}
+
+# Counters for snapshot fan-out (see GET /stats/broadcast)
+broadcast_stats = {
+    "snapshots_requested": 0,
+    "snapshots_broadcast": 0,
+    "snapshots_coalesced": 0,
+    "frames_saved": 0,
+    "resumes": 0,
+    "resume_fallbacks": 0,
+    "events_replayed": 0,
+}
 channels_lock = asyncio.Lock()  # Protects concurrent access to channels dict
 
 # Test mode - disable validation for backward compatibility
 VALIDATION_ENABLED = True
 
+# Durable command journal and its checkpointer; attached by main.lifespan
+# (None = in-memory only)
+journal: Journal | None = None
+checkpointer: Checkpointer | None = None
+
+# Hot standby (see escalada.replication); attached by main.lifespan. A replica
+# is read-only until promoted
+replication: ReplicationSource | None = None
+replica: Replica | None = None
+read_only = False
+
+# Per-box command history for /api/history (see escalada.history)
+history: HistoryLog | None = None
+
+# Idle box eviction (see escalada.eviction); attached by main.lifespan. Last
+# command or read per box, in time.monotonic() seconds
+evictor: BoxEvictor | None = None
+spill: SpillStore | None = None
+_last_active: dict[int, float] = {}
+
+# Forgets idle rate limiter entries (see escalada.rate_limit); attached by
+# main.lifespan
+rate_sweeper: RateLimitSweeper | None = None
+
+# Server-side box timers (see escalada.timer_engine); attached by main.lifespan
+timers: TimerEngine | None = None
+
+# Where box state lives and how broadcasts reach other workers; the in-process
+# backend is assigned below the registry helpers, main.lifespan may swap it
+backend: StateBackend
+
 
 class Cmd(BaseModel):
-    """Legacy Cmd model - use ValidatedCmd for new validation"""
+    """Legacy Cmd model - validated per type by validate_command()"""
 
     boxId: int
     type: str  # START_TIMER, STOP_TIMER, RESUME_TIMER, PROGRESS_UPDATE, REQUEST_ACTIVE_COMPETITOR, SUBMIT_SCORE, INIT_ROUTE, REQUEST_STATE
@@ -69,6 +156,41 @@ class Cmd(BaseModel):
     boxVersion: int | None = None
 
 
+# Commands whose echo is followed by an authoritative snapshot
+SNAPSHOT_TYPES = {
+    "INIT_ROUTE",
+    "PROGRESS_UPDATE",
+    "START_TIMER",
+    "STOP_TIMER",
+    "RESUME_TIMER",
+    "REGISTER_TIME",
+    "SUBMIT_SCORE",
+}
+
+# Commands that change box state and therefore advance its seq
+STATE_TYPES = SNAPSHOT_TYPES | {"TIMER_SYNC", "RESET_BOX"}
+
+# Commands after which the server timer follows the box's timerState
+TIMER_TYPES = {
+    "INIT_ROUTE",
+    "START_TIMER",
+    "STOP_TIMER",
+    "RESUME_TIMER",
+    "SUBMIT_SCORE",
+    "RESET_BOX",
+}
+
+# Upper bound on commands accepted in one /cmd/batch request
+MAX_BATCH_SIZE = 50
+
+
+class CmdBatch(BaseModel):
+    """Ordered list of commands for a single box, applied under one lock"""
+
+    boxId: int
+    commands: list[Cmd]
+
+
 @router.post("/cmd")
 async def cmd(cmd: Cmd):
     """
@@ -87,287 +209,581 @@ async def cmd(cmd: Cmd):
     - Per-command-type limits (e.g., PROGRESS_UPDATE: 120/min)
     """
 
-    # ==================== VALIDATION ====================
-    # Map legacy "time" field to registeredTime when provided
-    if cmd.registeredTime is None and cmd.time is not None:
-        cmd.registeredTime = cmd.time
+    _check_writable([cmd])
 
-    try:
-        if VALIDATION_ENABLED:
-            # Build dict with only non-None values
-            cmd_data = {k: v for k, v in cmd.model_dump().items() if v is not None}
-            if "time" in cmd_data and "registeredTime" not in cmd_data:
-                cmd_data["registeredTime"] = cmd_data.pop("time")
-            # Validate and sanitize input
-            validated_cmd = ValidatedCmd(**cmd_data)
-        else:
-            # Validation disabled - use cmd as is
-            validated_cmd = cmd
-    except Exception as e:
-        logger.warning(f"Command validation failed for box {cmd.boxId}: {e}")
-        raise HTTPException(status_code=400, detail=f"Invalid command: {str(e)}")
+    # ==================== VALIDATION ====================
+    _validate_cmd(cmd)
 
     # ==================== RATE LIMITING ====================
-    # Skip rate limiting in test mode (when VALIDATION_ENABLED is False)
-    if VALIDATION_ENABLED:
-        is_allowed, reason = check_rate_limit(cmd.boxId, cmd.type)
-        if not is_allowed:
-            logger.warning(f"Rate limit exceeded for box {cmd.boxId}: {reason}")
-            raise HTTPException(status_code=429, detail=reason)
+    _check_cmd_rate_limit(cmd.boxId, [cmd.type])
 
     # ==================== SANITIZATION ====================
-    # Validation already checks for SQL injection/XSS in ValidatedCmd
+    # Validation already checks for SQL injection/XSS in validate_command
     # No additional sanitization needed - preserve original input including diacritics
 
-    print(f"Backend received cmd: {cmd}")
-
-    # ==================== ATOMIC STATE INITIALIZATION ====================
-    # CRITICAL FIX: Keep lock acquired across entire initialization to prevent race conditions
-    # Get or create the box-specific lock under global init_lock protection
-    async with init_lock:
-        if cmd.boxId not in state_locks:
-            state_locks[cmd.boxId] = asyncio.Lock()
-        lock = state_locks[cmd.boxId]
+    logger.debug("Received %s for box %s", cmd.type, cmd.boxId)
 
     # Toggle global time criterion without touching per‑box state
     if cmd.type == "SET_TIME_CRITERION":
         global time_criterion_enabled
         async with time_criterion_lock:
             time_criterion_enabled = bool(cmd.timeCriterionEnabled)
+            commit = _journal_cmd(None, cmd)
         await _broadcast_time_criterion()
+        await _require_durable(commit)
         return {"status": "ok"}
 
-    # Lock state access for this boxId
-    async with lock:
-        # Initialize state INSIDE the lock (no window for race condition)
-        if cmd.boxId not in state_map:
-            import uuid
-
-            state_map[cmd.boxId] = {
-                "initiated": False,
-                "holdsCount": 0,
-                "currentClimber": "",
-                "started": False,
-                "timerState": "idle",
-                "holdCount": 0.0,
-                "routeIndex": 1,
-                "competitors": [],
-                "categorie": "",
-                "lastRegisteredTime": None,
-                "remaining": None,
-                "timerPreset": None,
-                "timerPresetSec": None,
-                "sessionId": str(
-                    uuid.uuid4()
-                ),  # Generated at creation, not at INIT_ROUTE
-                "boxVersion": 0,  # Incremented on INIT_ROUTE to prevent stale commands
-            }
-
-        # Update server-side state snapshot
-        sm = state_map[cmd.boxId]
+    _check_owner(cmd.boxId)
 
+    # ==================== ATOMIC STATE ACCESS ====================
+    # Exclusive across workers; the state is created on first use
+    async with backend.box(cmd.boxId) as sm:
         # ==================== SESSION & VERSION VALIDATION ====================
-        # Enforce session/version only when validation is enabled (test-mode bypass)
-        if VALIDATION_ENABLED:
-            # CRITICAL: Enforce sessionId for all commands except INIT_ROUTE
-            if cmd.type != "INIT_ROUTE":
-                if not cmd.sessionId:
-                    logger.warning(
-                        f"Command {cmd.type} for box {cmd.boxId} missing sessionId"
-                    )
-                    raise HTTPException(
-                        status_code=400,
-                        detail="sessionId required for all commands except INIT_ROUTE",
-                    )
+        ignored = _check_session(sm, cmd)
+        if ignored:
+            return ignored
 
-                current_session = sm.get("sessionId")
-                if current_session and cmd.sessionId != current_session:
-                    logger.warning(
-                        f"Stale sessionId for box {cmd.boxId}: "
-                        f"received {cmd.sessionId}, expected {current_session}"
-                    )
-                    return {"status": "ignored", "reason": "stale_session"}
-
-            # TASK 2.6: Validate boxVersion if present (prevents stale commands from old browser tabs)
-            if cmd.boxVersion is not None:
-                current_version = sm.get("boxVersion", 0)
-                if cmd.boxVersion < current_version:
-                    logger.warning(
-                        f"Stale command for box {cmd.boxId}: "
-                        f"version {cmd.boxVersion} < {current_version}"
-                    )
-                    return {"status": "ignored", "reason": "stale_version"}
-
-        if cmd.type == "INIT_ROUTE":
-            # INIT_ROUTE: update competition details and mark as initiated
-            # sessionId already generated at state creation
-            cmd.sessionId = sm["sessionId"]  # Use existing sessionId
-            # TASK 2.6: Increment boxVersion on INIT_ROUTE to invalidate old commands
-            sm["boxVersion"] = sm.get("boxVersion", 0) + 1
-            sm["initiated"] = True
-            sm["holdsCount"] = cmd.holdsCount or 0
-            sm["routeIndex"] = cmd.routeIndex or 1
-            # Normalize competitors: ensure dicts with safe 'nume' and boolean 'marked'
-            normalized_competitors: list[dict] = []
-            if cmd.competitors:
-                for comp in cmd.competitors:
-                    try:
-                        if not isinstance(comp, dict):
-                            continue
-                        name = comp.get("nume")
-                        if not isinstance(name, str):
-                            continue
-                        safe_name = InputSanitizer.sanitize_competitor_name(name)
-                        if not safe_name:
-                            continue
-                        marked_val = comp.get("marked", False)
-                        # Coerce to boolean if present
-                        marked_bool = (
-                            bool(marked_val)
-                            if isinstance(marked_val, (bool, int, str))
-                            else False
-                        )
-                        normalized_competitors.append(
-                            {"nume": safe_name, "marked": marked_bool}
-                        )
-                    except Exception:
-                        # Silently skip malformed competitor entries
-                        continue
-            sm["competitors"] = normalized_competitors
-            sm["currentClimber"] = (
-                normalized_competitors[0]["nume"] if normalized_competitors else ""
-            )
-            sm["started"] = False
-            sm["timerState"] = "idle"
-            sm["holdCount"] = 0.0
-            sm["lastRegisteredTime"] = None
-            sm["remaining"] = None
-            if cmd.categorie:
-                sm["categorie"] = cmd.categorie
-            if cmd.timerPreset:
-                sm["timerPreset"] = cmd.timerPreset
-                sm["timerPresetSec"] = _parse_timer_preset(cmd.timerPreset)
-        elif cmd.type == "START_TIMER":
-            sm["started"] = True
-            sm["timerState"] = "running"
-            sm["lastRegisteredTime"] = None
-            sm["remaining"] = None
-        elif cmd.type == "STOP_TIMER":
-            sm["started"] = False
-            sm["timerState"] = "paused"
-        elif cmd.type == "RESUME_TIMER":
-            sm["started"] = True
-            sm["timerState"] = "running"
-            sm["lastRegisteredTime"] = None
-        elif cmd.type == "PROGRESS_UPDATE":
-            delta = cmd.delta or 1
-            new_count = (
-                (int(sm["holdCount"]) + 1)
-                if delta == 1
-                else round(sm["holdCount"] + delta, 1)
-            )
-            # Clamp lower bound
-            if new_count < 0:
-                new_count = 0.0
-            # Cap to holdsCount only when it's a positive configured maximum
-            max_holds = sm.get("holdsCount") or 0
-            if isinstance(max_holds, int) and max_holds > 0 and new_count > max_holds:
-                new_count = float(max_holds)
-            sm["holdCount"] = new_count
-        elif cmd.type == "REGISTER_TIME":
-            # doar persistăm dacă avem un timp valid
-            if cmd.registeredTime is not None:
-                sm["lastRegisteredTime"] = cmd.registeredTime
-        elif cmd.type == "TIMER_SYNC":
-            sm["remaining"] = cmd.remaining
-        elif cmd.type == "SUBMIT_SCORE":
-            # Folosește timpul memorat anterior dacă nu e trimis în request
-            effective_time = (
-                cmd.registeredTime
-                if cmd.registeredTime is not None
-                else sm.get("lastRegisteredTime")
-            )
-            cmd.registeredTime = effective_time
-            sm["started"] = False
-            sm["timerState"] = "idle"
-            sm["holdCount"] = 0.0
-            sm["lastRegisteredTime"] = effective_time
-            sm["remaining"] = None
-            # marchează competitorul și mută la următorul
-            if sm.get("competitors"):
-                for comp in sm["competitors"]:
-                    # Validate that competitor has required fields
-                    if not isinstance(comp, dict):
-                        logger.error(f"Invalid competitor object: {comp}")
-                        continue
-                    if comp.get("nume") == cmd.competitor:
-                        comp["marked"] = True
-                        break
-                next_comp = next(
-                    (
-                        c.get("nume")
-                        for c in sm["competitors"]
-                        if isinstance(c, dict) and not c.get("marked")
-                    ),
-                    "",
-                )
-                sm["currentClimber"] = next_comp
-        elif cmd.type == "REQUEST_STATE":
+        if cmd.type == "REQUEST_STATE":
             await _send_state_snapshot(cmd.boxId)
             return {"status": "ok"}
-        elif cmd.type == "RESET_BOX":
-            # Reset per-box state and regenerate sessionId to invalidate stale tabs
-            import uuid
-
-            sm["initiated"] = False
-            sm["currentClimber"] = ""
-            sm["started"] = False
-            sm["timerState"] = "idle"
-            sm["holdCount"] = 0.0
-            sm["lastRegisteredTime"] = None
-            sm["remaining"] = None
-            sm["competitors"] = []
-            sm["categorie"] = ""
-            sm["timerPreset"] = None
-            sm["timerPresetSec"] = None
-            # Preserve existing routeIndex/holdsCount; ControlPanel re-sends INIT_ROUTE
-            sm["sessionId"] = str(uuid.uuid4())
+        if cmd.type == "TIMER_SYNC" and _server_timed(sm):
+            return {"status": "ignored", "reason": "server_timer"}
+
+        _stamp_timer(sm, cmd)
+        _apply_cmd(sm, cmd)
+        _follow_timer(cmd.boxId, sm, cmd)
+        commit = _journal_cmd(sm, cmd)
+
+        if cmd.type == "RESET_BOX":
             # Broadcast fresh snapshot for clients
             await _send_state_snapshot(cmd.boxId)
-            return {"status": "ok"}
-        # else: leave previous state for other types
-
-        # Broadcast command echo to all active WebSockets for this box
-        await _broadcast_to_box(cmd.boxId, cmd.model_dump())
-
-        # Send authoritative snapshot for real-time clients
-        if cmd.type in {
-            "INIT_ROUTE",
-            "PROGRESS_UPDATE",
-            "START_TIMER",
-            "STOP_TIMER",
-            "RESUME_TIMER",
-            "REGISTER_TIME",
-            "SUBMIT_SCORE",
-        }:
-            await _send_state_snapshot(cmd.boxId)
+        else:
+            # Broadcast command echo to all active WebSockets for this box
+            await _broadcast_to_box(cmd.boxId, cmd.model_dump())
 
+            # Send authoritative snapshot for real-time clients
+            if cmd.type in SNAPSHOT_TYPES:
+                await _send_state_snapshot(cmd.boxId)
+
+    # Acknowledge once the command is on disk; waiting outside the lock lets
+    # the next command join the same group commit
+    await _require_durable(commit)
     return {"status": "ok"}
 
 
-async def _heartbeat(ws: WebSocket, box_id: int) -> None:
-    """Send PING every 30s; close if no PONG for 90s."""
-    last_pong = asyncio.get_event_loop().time()
+@router.post("/cmd/batch")
+async def cmd_batch(batch: CmdBatch):
+    """
+    Apply an ordered list of commands for one box in a single round trip.
+
+    All commands are validated (and rate-limited) up front, sessionId included;
+    if any of them is invalid nothing is applied. Commands for a stale session
+    or box version are reported as ignored, like with POST /cmd. The box lock is taken once, commands are applied
+    in order, and a single STATE_SNAPSHOT is broadcast at the end instead of one
+    per command. Per-command echoes are still broadcast because ContestPage and
+    JudgePage react to them.
+
+    Returns one result per command, in order.
+    """
+    if not batch.commands:
+        raise HTTPException(status_code=400, detail="Batch contains no commands")
+    _check_writable(batch.commands)
+    if len(batch.commands) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch cannot exceed {MAX_BATCH_SIZE} commands",
+        )
+
+    # ==================== VALIDATION ====================
+    for i, c in enumerate(batch.commands):
+        if c.boxId != batch.boxId:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Command {i} targets box {c.boxId}, batch is for box {batch.boxId}",
+            )
+        if c.type == "SET_TIME_CRITERION":
+            raise HTTPException(
+                status_code=400,
+                detail="SET_TIME_CRITERION is global and cannot be batched",
+            )
+        try:
+            _validate_cmd(c)
+            # Stale sessions are only "ignored" below; a missing one fails the batch
+            _require_session(c)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Command {i}: {e.detail}")
+
+    _check_owner(batch.boxId)
+
+    # ==================== RATE LIMITING ====================
+    # One request, however many commands it carries
+    _check_cmd_rate_limit(batch.boxId, [c.type for c in batch.commands])
+
+    logger.info(f"Batch of {len(batch.commands)} commands for box {batch.boxId}")
+
+    results: list[dict] = []
+    applied = False
+    commit = None
+
+    async with backend.box(batch.boxId) as sm:
+        for c in batch.commands:
+            ignored = _check_session(sm, c)
+            if ignored:
+                results.append(ignored)
+                continue
+
+            if c.type == "TIMER_SYNC" and _server_timed(sm):
+                results.append({"status": "ignored", "reason": "server_timer"})
+                continue
+
+            # The final snapshot below answers any REQUEST_STATE in the batch
+            if c.type != "REQUEST_STATE":
+                _stamp_timer(sm, c)
+                _apply_cmd(sm, c)
+                _follow_timer(batch.boxId, sm, c)
+                commit = _journal_cmd(sm, c) or commit
+                applied = True
+                if c.type != "RESET_BOX":
+                    await _broadcast_to_box(batch.boxId, c.model_dump())
+            results.append({"status": "ok"})
+
+        if applied or any(c.type == "REQUEST_STATE" for c in batch.commands):
+            await _send_state_snapshot(batch.boxId)
+
+    # Journal records commit in order, so the last one covers the whole batch
+    await _require_durable(commit)
+    return {"status": "ok", "results": results}
+
+
+def _journal_cmd(sm: BoxState | None, cmd: Cmd) -> asyncio.Future | None:
+    """
+    Queue an applied command for the journal (caller holds the box lock).
+
+    Box records carry the resulting sessionId, which RESET_BOX and a box's
+    first command generate randomly, so replay rebuilds the same session.
+    """
+    if sm is not None and cmd.type not in STATE_TYPES:
+        return None
+    data = cmd.model_dump(exclude_none=True, exclude={"time"})
+    if sm is None:
+        key, record = GLOBAL_KEY, {"cmd": data}
+    else:
+        key, record = box_key(cmd.boxId), {"cmd": data, "sid": sm.sessionId}
+        if history is not None:
+            history.record(cmd.boxId, sm, record)
+    if replication is not None:
+        replication.ship(key, record)
+    if journal is not None:
+        return journal.append(key, record)
+    # Multi-worker: the broker journals records together with the state
+    return backend.journal(key, record)
+
+
+async def _wait_durable(commit: asyncio.Future | None) -> bool:
+    """Wait for a journal commit; False (and logged) when the write failed."""
+    if commit is not None and not await commit:
+        logger.error("Command applied but not persisted to the journal")
+        return False
+    return True
+
+
+async def _require_durable(commit: asyncio.Future | None) -> None:
+    """Wait for a journal commit; HTTP 503 when the write failed."""
+    if not await _wait_durable(commit):
+        raise HTTPException(
+            status_code=503, detail="Command applied but not persisted to the journal"
+        )
+
+
+def replay_journal(journals: dict[str, list[dict]]) -> int:
+    """
+    Rebuild state_map (and the time criterion) from journal records.
+
+    Commands are re-applied through _apply_cmd without validation, session
+    checks or broadcasts; they were all checked when first accepted.
+
+    Returns:
+        int: Number of records applied
+    """
+    applied = 0
+    for key, records in journals.items():
+        for rec in records:
+            apply_record(key, rec)
+            applied += 1
+    return applied
+
+
+def apply_record(key: str, rec: dict) -> BoxState | None:
+    """Apply one journal record; returns the box state it changed, if any."""
+    global time_criterion_enabled
+    if key == GLOBAL_KEY:
+        time_criterion_enabled = bool(rec["cmd"].get("timeCriterionEnabled"))
+        return None
+    sm = _ensure_state(rec["cmd"]["boxId"])
+    replay_cmd(sm, rec)
+    return sm
+
+
+def replay_cmd(sm: BoxState, rec: dict) -> None:
+    """Re-apply a journaled command to a box state, restoring its sessionId."""
+    _apply_cmd(sm, Cmd.model_construct(**rec["cmd"]))
+    sm.sessionId = rec["sid"]
+
+
+def apply_replicated(key: str, rec: dict) -> None:
+    """Replica: apply a record streamed by the primary and journal it locally."""
+    sm = apply_record(key, rec)
+    if journal is not None:
+        journal.append(key, rec)
+    if history is not None and sm is not None:
+        history.record(rec["cmd"]["boxId"], sm, rec)
+    # Viewers on the standby follow along
+    if sm is None:
+        _deliver_time_criterion(
+            {"type": "TIME_CRITERION", "timeCriterionEnabled": time_criterion_enabled}
+        )
+    elif channels.get(rec["cmd"]["boxId"]):
+        _request_snapshot_broadcast(rec["cmd"]["boxId"], sm)
+
+
+async def restore_replicated(snapshot: dict) -> None:
+    """Replica: replace all state with the primary's snapshot."""
+    restore_state(snapshot)
+    if checkpointer is not None:
+        # The local journal continues from this state, not from older files
+        await checkpointer.checkpoint(force=True)
+    for box_id, state in state_map.items():
+        if channels.get(box_id):
+            _request_snapshot_broadcast(box_id, state)
+
+
+def capture_state() -> dict:
+    """JSON-ready copy of every box (and the time criterion) for a checkpoint."""
+    boxes = {}
+    for box_id, sm in state_map.items():
+        record = boxes[str(box_id)] = sm.to_record()
+        # A running server timer restarts from where it is now, not from its start
+        record["remaining"] = _live_remaining(box_id, sm)
+    return {"timeCriterionEnabled": time_criterion_enabled, "boxes": boxes}
+
+
+def restore_state(checkpoint: dict) -> None:
+    """Replace state_map with the boxes of a checkpoint from capture_state()."""
+    global time_criterion_enabled
+    time_criterion_enabled = bool(checkpoint.get("timeCriterionEnabled"))
+    state_map.clear()
+    now = time.monotonic()
+    for box_id, record in checkpoint.get("boxes", {}).items():
+        state_map[int(box_id)] = BoxState.from_record(record)
+        _last_active[int(box_id)] = now
+
+
+def _validate_cmd(cmd: Cmd) -> None:
+    """Validate a command against its per-type model; raise HTTP 400 when invalid."""
+    # Map legacy "time" field to registeredTime when provided
+    if cmd.registeredTime is None and cmd.time is not None:
+        cmd.registeredTime = cmd.time
+
+    if not VALIDATION_ENABLED:
+        # Validation disabled - use cmd as is
+        return
+
+    try:
+        # Single pass against the model for cmd.type (fast path for hot types)
+        validate_command(cmd)
+    except Exception as e:
+        logger.warning(f"Command validation failed for box {cmd.boxId}: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid command: {str(e)}")
+
+
+def _check_cmd_rate_limit(box_id: int, command_types: list[str]) -> None:
+    # Skip rate limiting in test mode (when VALIDATION_ENABLED is False), and
+    # for requests RateLimitMiddleware already counted
+    if not VALIDATION_ENABLED or prechecked.get():
+        return
+    is_allowed, reason = check_batch_rate_limit(box_id, command_types, sender.get())
+    if not is_allowed:
+        logger.warning(f"Rate limit exceeded for box {box_id}: {reason}")
+        raise HTTPException(status_code=429, detail=reason)
+
+
+def _check_writable(cmds: list[Cmd]) -> None:
+    if read_only and any(c.type != "REQUEST_STATE" for c in cmds):
+        raise HTTPException(
+            status_code=503, detail="Read-only standby; promote it to accept commands"
+        )
+
+
+def _check_owner(box_id: int) -> None:
+    # Partitioned workers only hold their own boxes; the dispatcher routes by
+    # the same ring, so this fires only for requests that bypassed it
+    if not owns_box(box_id):
+        raise HTTPException(status_code=421, detail=f"Box {box_id} is served by another worker")
+
+
+def _get_box_lock(box_id: int) -> asyncio.Lock:
+    """Return the lock for box_id, creating it once (no await, so no race)."""
+    lock = state_locks.get(box_id)
+    if lock is None:
+        lock = state_locks[box_id] = asyncio.Lock()
+    return lock
+
+
+def _ensure_state(box_id: int) -> BoxState:
+    """Return the state for box_id, creating it on first use (no await, so no race)."""
+    state = state_map.get(box_id)
+    if state is None:
+        record = spill.load(box_id) if spill is not None else None
+        if record is not None:
+            state = BoxState.from_record(record)
+        else:
+            state = _default_state()
+        state_map[box_id] = state
+    _last_active[box_id] = time.monotonic()
+    return state
+
+
+def _default_state() -> BoxState:
+    return BoxState()
+
+
+local_backend = LocalBackend(_get_box_lock, _ensure_state)
+backend = local_backend
+
+
+def _box_idle(box_id: int, ttl: float, now: float) -> bool:
+    """No subscriber, no command in flight and nothing done for `ttl` seconds."""
+    lock = state_locks.get(box_id)
+    return (
+        now - _last_active.get(box_id, now) >= ttl
+        and not channels.get(box_id)
+        and not (lock is not None and lock.locked())
+        and box_id not in _pending_snapshots
+        and not (timers is not None and timers.running(box_id))
+    )
+
+
+def _forget_box(box_id: int) -> None:
+    state_map.pop(box_id, None)
+    state_locks.pop(box_id, None)
+    channels.pop(box_id, None)
+    _last_broadcast.pop(box_id, None)
+    _event_rings.pop(box_id, None)
+    _last_active.pop(box_id, None)
+
+
+async def evict_idle_boxes(ttl: float) -> dict:
+    """
+    Drop boxes idle for `ttl` seconds from every per-box registry.
+
+    A box that never applied a command (seq 0, e.g. created by a GET for an
+    unused id) is simply forgotten. A used box is written to the spill store
+    first and reloaded on its next use; without a spill store it stays.
+    """
+    now = time.monotonic()
+    evicted = spilled = 0
+    for box_id in [b for b in _last_active if _box_idle(b, ttl, now)]:
+        state = state_map.get(box_id)
+        if state is not None and state.seq > 0:
+            if spill is None:
+                continue
+            seq, touched = state.seq, _last_active[box_id]
+            await spill.save(box_id, state.to_record())
+            # Used or watched while the file was written: keep it
+            if (
+                state_map.get(box_id) is not state
+                or state.seq != seq
+                or _last_active.get(box_id) != touched
+                or not _box_idle(box_id, ttl, time.monotonic())
+            ):
+                continue
+            spilled += 1
+        _forget_box(box_id)
+        evicted += 1
+    return {"evicted": evicted, "spilled": spilled}
+
+
+def _require_session(cmd: Cmd) -> None:
+    """Raise HTTP 400 unless the command carries a sessionId (or needs none)."""
+    # CRITICAL: Enforce sessionId for all commands except INIT_ROUTE
+    if VALIDATION_ENABLED and cmd.type != "INIT_ROUTE" and not cmd.sessionId:
+        logger.warning(f"Command {cmd.type} for box {cmd.boxId} missing sessionId")
+        raise HTTPException(
+            status_code=400,
+            detail="sessionId required for all commands except INIT_ROUTE",
+        )
+
+
+def _check_session(sm: BoxState, cmd: Cmd) -> dict | None:
+    """
+    Enforce sessionId/boxVersion for a command against the current box state.
+
+    Raises HTTP 400 when sessionId is missing; returns an "ignored" result for
+    stale sessions or versions, or None when the command may be applied.
+    """
+    # Enforce session/version only when validation is enabled (test-mode bypass)
+    if not VALIDATION_ENABLED:
+        return None
+
+    _require_session(cmd)
+    if cmd.type != "INIT_ROUTE":
+        current_session = sm.sessionId
+        if current_session and cmd.sessionId != current_session:
+            logger.warning(
+                f"Stale sessionId for box {cmd.boxId}: "
+                f"received {cmd.sessionId}, expected {current_session}"
+            )
+            return {"status": "ignored", "reason": "stale_session"}
+
+    # TASK 2.6: Validate boxVersion if present (prevents stale commands from old browser tabs)
+    if cmd.boxVersion is not None:
+        current_version = sm.boxVersion
+        if cmd.boxVersion < current_version:
+            logger.warning(
+                f"Stale command for box {cmd.boxId}: "
+                f"version {cmd.boxVersion} < {current_version}"
+            )
+            return {"status": "ignored", "reason": "stale_version"}
+
+    return None
+
+
+def _apply_cmd(sm: BoxState, cmd: Cmd) -> None:
+    """Apply a state-changing command to the box state (no I/O)."""
+    if cmd.type == "INIT_ROUTE":
+        # INIT_ROUTE: update competition details and mark as initiated
+        # sessionId already generated at state creation
+        cmd.sessionId = sm.sessionId  # Use existing sessionId
+        # TASK 2.6: Increment boxVersion on INIT_ROUTE to invalidate old commands
+        sm.boxVersion += 1
+        sm.initiated = True
+        sm.holdsCount = cmd.holdsCount or 0
+        sm.routeIndex = cmd.routeIndex or 1
+        # Normalize competitors: ensure dicts with safe 'nume' and boolean 'marked'
+        normalized_competitors: list[dict] = []
+        if cmd.competitors:
+            for comp in cmd.competitors:
+                try:
+                    if not isinstance(comp, dict):
+                        continue
+                    name = comp.get("nume")
+                    if not isinstance(name, str):
+                        continue
+                    safe_name = InputSanitizer.sanitize_competitor_name(name)
+                    if not safe_name:
+                        continue
+                    marked_val = comp.get("marked", False)
+                    # Coerce to boolean if present
+                    marked_bool = (
+                        bool(marked_val) if isinstance(marked_val, (bool, int, str)) else False
+                    )
+                    normalized_competitors.append({"nume": safe_name, "marked": marked_bool})
+                except Exception:
+                    # Silently skip malformed competitor entries
+                    continue
+        sm.set_competitors(normalized_competitors)
+        sm.currentClimber = normalized_competitors[0]["nume"] if normalized_competitors else ""
+        sm.started = False
+        sm.timerState = "idle"
+        sm.holdCount = 0.0
+        sm.lastRegisteredTime = None
+        sm.remaining = None
+        if cmd.categorie:
+            sm.categorie = cmd.categorie
+        if cmd.timerPreset:
+            sm.timerPreset = cmd.timerPreset
+            sm.timerPresetSec = _parse_timer_preset(cmd.timerPreset)
+    elif cmd.type == "START_TIMER":
+        sm.started = True
+        sm.timerState = "running"
+        sm.lastRegisteredTime = None
+        # Set by the server timer (_stamp_timer), else unknown until TIMER_SYNC
+        sm.remaining = cmd.remaining
+    elif cmd.type == "STOP_TIMER":
+        sm.started = False
+        sm.timerState = "paused"
+        if cmd.remaining is not None:
+            sm.remaining = cmd.remaining
+    elif cmd.type == "RESUME_TIMER":
+        sm.started = True
+        sm.timerState = "running"
+        sm.lastRegisteredTime = None
+        if cmd.remaining is not None:
+            sm.remaining = cmd.remaining
+    elif cmd.type == "PROGRESS_UPDATE":
+        delta = cmd.delta or 1
+        new_count = (int(sm.holdCount) + 1) if delta == 1 else round(sm.holdCount + delta, 1)
+        # Clamp lower bound
+        if new_count < 0:
+            new_count = 0.0
+        # Cap to holdsCount only when it's a positive configured maximum
+        max_holds = sm.holdsCount or 0
+        if isinstance(max_holds, int) and max_holds > 0 and new_count > max_holds:
+            new_count = float(max_holds)
+        sm.holdCount = new_count
+    elif cmd.type == "REGISTER_TIME":
+        # doar persistăm dacă avem un timp valid
+        if cmd.registeredTime is not None:
+            sm.lastRegisteredTime = cmd.registeredTime
+    elif cmd.type == "TIMER_SYNC":
+        sm.remaining = cmd.remaining
+    elif cmd.type == "SUBMIT_SCORE":
+        # Folosește timpul memorat anterior dacă nu e trimis în request
+        effective_time = (
+            cmd.registeredTime if cmd.registeredTime is not None else sm.lastRegisteredTime
+        )
+        cmd.registeredTime = effective_time
+        sm.started = False
+        sm.timerState = "idle"
+        sm.holdCount = 0.0
+        sm.lastRegisteredTime = effective_time
+        sm.remaining = None
+        # marchează competitorul și mută la următorul
+        idx = sm.find_competitor(cmd.competitor, cmd.competitorIdx)
+        if idx is not None:
+            sm.mark_competitor(idx)
+        sm.currentClimber = sm.next_unmarked_name()
+    elif cmd.type == "RESET_BOX":
+        # Reset per-box state and regenerate sessionId to invalidate stale tabs
+        sm.initiated = False
+        sm.currentClimber = ""
+        sm.started = False
+        sm.timerState = "idle"
+        sm.holdCount = 0.0
+        sm.lastRegisteredTime = None
+        sm.remaining = None
+        sm.set_competitors([])
+        sm.categorie = ""
+        sm.timerPreset = None
+        sm.timerPresetSec = None
+        # Preserve existing routeIndex/holdsCount; ControlPanel re-sends INIT_ROUTE
+        sm.sessionId = str(uuid.uuid4())
+    # else: leave previous state for other types
+
+    if cmd.type in STATE_TYPES:
+        sm.seq += 1
+
+
+async def _heartbeat(outbox: Outbox, box_id: int, clock: ClockEstimate) -> None:
+    """
+    Send PING every 30s (and a quick burst after connecting, to estimate
+    the client's clock); close if no PONG for 90s.
+    """
+    ws = outbox.ws
     heartbeat_interval = 30
     heartbeat_timeout = 90
+    pings = 0
 
     while True:
         try:
-            await asyncio.sleep(heartbeat_interval)
-            now = asyncio.get_event_loop().time()
+            await asyncio.sleep(
+                CLOCK_SYNC_BURST_INTERVAL_SEC if pings < CLOCK_SYNC_BURST else heartbeat_interval
+            )
+            if outbox.closed:
+                break
 
-            # Check timeout
-            if now - last_pong > heartbeat_timeout:
+            # Check timeout (the receive loop records every PONG)
+            if time.monotonic() - clock.last_pong > heartbeat_timeout:
                 logger.warning(f"Heartbeat timeout for box {box_id}, closing")
                 try:
                     await ws.close(code=1000)
@@ -376,51 +792,232 @@ async def _heartbeat(ws: WebSocket, box_id: int) -> None:
                 break
 
             # Send PING
-            await ws.send_text(
-                json.dumps({"type": "PING", "timestamp": now}, ensure_ascii=False)
-            )
+            outbox.send(json.dumps(clock.ping()))
+            pings += 1
         except Exception as e:
             logger.debug(f"Heartbeat error for box {box_id}: {e}")
             break
 
 
 async def _broadcast_to_box(box_id: int, payload: dict) -> None:
-    """Safely broadcast JSON payload to all subscribers on a box.
-    Removes dead connections automatically.
+    """Enqueue a JSON payload for every subscriber on a box.
+
+    The payload is serialized once and appended to each subscriber's outbox;
+    nothing here waits on network I/O, so it is safe under the box lock.
+    Dead connections remove themselves from the channel. The payload is also
+    published to the other workers.
     """
-    # Get snapshot of current subscribers
+    backend.publish({"kind": "echo", "boxId": box_id, "payload": payload})
+    _deliver_to_box(box_id, payload)
+
+
+def _deliver_to_box(box_id: int, payload: dict) -> None:
+    """Enqueue a payload for the subscribers connected to this worker."""
+    ring = _event_rings.get(box_id)
+    subscribers = channels.get(box_id)
+    if not subscribers and ring is None:
+        return
+
+    snapshot = payload.get("type") == "STATE_SNAPSHOT"
+    if ring is not None:
+        # Recorded even while nobody listens: that is the gap a client resumes
+        seq = ring.next_seq()
+        text = json.dumps({**payload, "eventSeq": seq}, ensure_ascii=False)
+        ring.append(seq, text, snapshot)
+    else:
+        text = json.dumps(payload, ensure_ascii=False)
+    # Serialize once; every subscriber receives the same text frame
+    for outbox in list(subscribers or ()):
+        outbox.send(text, snapshot=snapshot)
+
+
+def _snapshot_text(box_id: int) -> str | None:
+    """Encoded snapshot of a box, used to resync a coalesced outbox."""
+    state = state_map.get(box_id)
+    if state is None:
+        return None
+    return json.dumps(_snapshot_frame(box_id, state), ensure_ascii=False)
+
+
+def _snapshot_frame(box_id: int, state: BoxState) -> dict:
+    """Snapshot for one client, stamped with the box's latest event number."""
+    snapshot = _build_snapshot(box_id, state)
+    ring = _event_rings.get(box_id)
+    if ring is not None:
+        snapshot["eventSeq"] = ring.last
+    return snapshot
+
+
+def _drop_subscriber(outbox: Outbox) -> None:
+    _remove_subscriber(outbox.box_id, outbox)
+
+
+def _remove_subscriber(box_id: int, outbox: Outbox) -> int:
+    """Take an outbox off its box channel; returns the subscribers left."""
+    subscribers = channels.get(box_id)
+    if subscribers is None:
+        return 0
+    subscribers.discard(outbox)
+    if not subscribers:
+        # Empty sets would pile up for every box ever watched
+        del channels[box_id]
+    return len(subscribers)
+
+
+async def _register_subscriber(
+    ws: WebSocket, box_id: int, deltas: bool = False, ticks: bool = True
+) -> Outbox:
+    """Create and start the outbox for a socket and add it to the box channel."""
+    outbox = Outbox(
+        ws,
+        box_id,
+        resync=lambda: _snapshot_text(box_id),
+        on_dead=_drop_subscriber,
+        deltas=deltas,
+        ticks=ticks,
+    )
+    outbox.start()
     async with channels_lock:
-        sockets = list(channels.get(box_id) or set())
+        channels.setdefault(box_id, set()).add(outbox)
+        if box_id not in _event_rings:
+            _event_rings[box_id] = EventRing()
+    return outbox
 
-    dead = []
-    for ws in sockets:
-        try:
-            await ws.send_text(json.dumps(payload, ensure_ascii=False))
-        except Exception as e:
-            logger.debug(f"Broadcast error to box {box_id}: {e}")
-            dead.append(ws)
 
-    # Clean up dead connections
-    if dead:
-        async with channels_lock:
-            for ws in dead:
-                channels.get(box_id, set()).discard(ws)
+def _resume(outbox: Outbox, since: int) -> bool:
+    """
+    Queue the frames a reconnecting client missed since event `since`.
+
+    Must run right after _register_subscriber, without awaiting in between,
+    so the replay ends exactly where live frames begin. Returns False when the
+    client needs a full snapshot instead: the gap was evicted, or replaying
+    it would overflow the outbox.
+    """
+    ring = _event_rings.get(outbox.box_id)
+    missed = ring.since(since) if ring is not None else None
+    if missed is None or len(missed) > outbox.maxsize:
+        broadcast_stats["resume_fallbacks"] += 1
+        return False
+    broadcast_stats["resumes"] += 1
+    broadcast_stats["events_replayed"] += len(missed)
+    for text, snapshot in missed:
+        outbox.send(text, snapshot=snapshot)
+    return True
+
+
+async def _handle_ws_cmd(msg: dict, box_id: int) -> dict:
+    """Run a command received on a box socket through the same path as POST /cmd.
+
+    The client may attach an ``id``; it is echoed back in the ACK/NACK reply so
+    the sender can match replies to taps. ``boxId`` defaults to the socket's box.
+    """
+    msg_id = msg.get("id")
+    data = {k: v for k, v in msg.items() if k != "id"}
+    data.setdefault("boxId", box_id)
+
+    try:
+        parsed = Cmd(**data)
+    except Exception as e:
+        logger.warning(f"Invalid WS command for box {box_id}: {e}")
+        return {"type": "NACK", "id": msg_id, "code": 400, "error": str(e)}
+
+    # A socket only drives its own box (time criterion is global)
+    if parsed.boxId != box_id and parsed.type != "SET_TIME_CRITERION":
+        return {
+            "type": "NACK",
+            "id": msg_id,
+            "code": 400,
+            "error": f"boxId {parsed.boxId} does not match socket box {box_id}",
+        }
+    if parsed.type == "SET_TIME_CRITERION" and PARTITION_COUNT > 1:
+        # Must reach every worker; only the dispatcher fans POST /cmd out
+        return {
+            "type": "NACK",
+            "id": msg_id,
+            "code": 421,
+            "error": "SET_TIME_CRITERION must be sent over HTTP when partitioned",
+        }
+
+    try:
+        result = await cmd(parsed)
+    except HTTPException as e:
+        return {"type": "NACK", "id": msg_id, "code": e.status_code, "error": e.detail}
+
+    return {"type": "ACK", "id": msg_id, **result}
+
+
+async def _handle_ws_batch(msg: dict, box_id: int) -> dict:
+    """WS equivalent of POST /cmd/batch: {"type": "CMD_BATCH", "id", "commands"}."""
+    msg_id = msg.get("id")
+    commands = msg.get("commands")
+    if not isinstance(commands, list):
+        return {
+            "type": "NACK",
+            "id": msg_id,
+            "code": 400,
+            "error": "CMD_BATCH requires a commands list",
+        }
+
+    try:
+        batch = CmdBatch(
+            boxId=box_id,
+            commands=[{"boxId": box_id, **c} if isinstance(c, dict) else c for c in commands],
+        )
+        result = await cmd_batch(batch)
+    except HTTPException as e:
+        return {"type": "NACK", "id": msg_id, "code": e.status_code, "error": e.detail}
+    except Exception as e:
+        logger.warning(f"Invalid WS batch for box {box_id}: {e}")
+        return {"type": "NACK", "id": msg_id, "code": 400, "error": str(e)}
+
+    return {"type": "ACK", "id": msg_id, **result}
+
+
+def _send_ws_reply(outbox: Outbox, payload: dict) -> None:
+    outbox.send(json.dumps(payload, ensure_ascii=False), reply=True)
 
 
 @router.websocket("/ws/{box_id}")
-async def websocket_endpoint(ws: WebSocket, box_id: int):
+async def websocket_endpoint(
+    ws: WebSocket,
+    box_id: int,
+    deltas: bool = False,
+    since: int | None = None,
+    ticks: bool = True,
+):
+    """
+    Live channel for one box.
+
+    Query params:
+    - deltas: receive STATE_DELTA frames instead of full snapshots after the
+      initial STATE_SNAPSHOT (clients resync with REQUEST_STATE on a seq gap)
+    - since: eventSeq of the last frame received before a reconnect; only the
+      frames after it are sent, or a STATE_SNAPSHOT if they are gone
+    - ticks: 0 to skip the per-second TIMER_SYNC frames of the server timer;
+      the client counts down from timerEndsAt, mapped to its own clock with
+      the offset in CLOCK frames (sent after PONGs carrying clientTime)
+    """
+    if not owns_box(box_id):
+        # Refused before the handshake completes (HTTP 403 to the client)
+        await ws.close(code=1008)
+        return
     await ws.accept()
+    # Commands sent over this socket are charged to its client, like POST /cmd
+    sender.set(client_keys(ws.scope))
 
-    # Atomically add to channel
-    async with channels_lock:
-        channels.setdefault(box_id, set()).add(ws)
-        subscriber_count = len(channels[box_id])
+    # Atomically add to channel (with its own outbound queue and writer)
+    outbox = await _register_subscriber(ws, box_id, deltas=deltas, ticks=ticks)
+    subscriber_count = len(channels.get(box_id, ()))
+
+    resumed = since is not None and _resume(outbox, since)
 
     logger.info(f"Client connected to box {box_id}, total: {subscriber_count}")
-    await _send_state_snapshot(box_id, targets={ws})
+    if not resumed:
+        await _send_state_snapshot(box_id, targets={outbox})
 
     # Start heartbeat task
-    heartbeat_task = asyncio.create_task(_heartbeat(ws, box_id))
+    clock = _clocks[outbox] = ClockEstimate()
+    heartbeat_task = asyncio.create_task(_heartbeat(outbox, box_id, clock))
 
     try:
         while True:
@@ -440,19 +1037,28 @@ async def websocket_endpoint(ws: WebSocket, box_id: int):
                 if isinstance(msg, dict):
                     msg_type = msg.get("type")
 
-                    # Acknowledge PONG
+                    # PONG: liveness, plus a clock sample when it echoes a PING
                     if msg_type == "PONG":
+                        if clock.pong(msg):
+                            _send_ws_reply(outbox, clock.frame())
                         continue
 
                     # NEW: Handle REQUEST_STATE command
                     if msg_type == "REQUEST_STATE":
                         requested_box_id = msg.get("boxId", box_id)
-                        logger.info(
-                            f"WebSocket REQUEST_STATE for box {requested_box_id}"
-                        )
-                        await _send_state_snapshot(requested_box_id, targets={ws})
+                        logger.info(f"WebSocket REQUEST_STATE for box {requested_box_id}")
+                        await _send_state_snapshot(requested_box_id, targets={outbox})
+                        if "id" in msg:
+                            _send_ws_reply(outbox, {"type": "ACK", "id": msg["id"], "status": "ok"})
                         continue
 
+                    if msg_type == "CMD_BATCH":
+                        _send_ws_reply(outbox, await _handle_ws_batch(msg, box_id))
+                        continue
+
+                    # Any other type is a judge/control command sent over the socket
+                    _send_ws_reply(outbox, await _handle_ws_cmd(msg, box_id))
+
             except json.JSONDecodeError:
                 logger.debug(f"Invalid JSON from WS box {box_id}")
                 continue
@@ -467,10 +1073,11 @@ async def websocket_endpoint(ws: WebSocket, box_id: int):
         except asyncio.CancelledError:
             pass
 
-        # Atomically remove from channel
+        _clocks.pop(outbox, None)
+        # Atomically remove from channel and stop the writer
         async with channels_lock:
-            channels.get(box_id, set()).discard(ws)
-            remaining = len(channels.get(box_id, set()))
+            remaining = _remove_subscriber(box_id, outbox)
+        await outbox.close()
 
         logger.info(f"Client disconnected from box {box_id}, remaining: {remaining}")
 
@@ -490,97 +1097,383 @@ async def get_state(box_id: int):
     Return current contest state for a judge client.
     Create a placeholder state with sessionId if box doesn't exist yet.
     """
-    # ==================== ATOMIC STATE INITIALIZATION ====================
-    # Use global init_lock to prevent race conditions
-    async with init_lock:
-        if box_id not in state_locks:
-            state_locks[box_id] = asyncio.Lock()
-        if box_id not in state_map:
-            # Create default state with sessionId in advance
-            import uuid
-
-            state_map[box_id] = {
-                "initiated": False,
-                "holdsCount": 0,
-                "currentClimber": "",
-                "started": False,
-                "timerState": "idle",
-                "holdCount": 0.0,
-                "routeIndex": 1,
-                "competitors": [],
-                "categorie": "",
-                "lastRegisteredTime": None,
-                "remaining": None,
-                "timerPreset": None,
-                "timerPresetSec": None,
-                "sessionId": str(uuid.uuid4()),  # Generated for new boxes
-            }
-
-    state = state_map[box_id]
+    _check_owner(box_id)
+    # Create default state with sessionId in advance
+    state = await backend.get(box_id)
     return _build_snapshot(box_id, state)
 
 
+@router.get("/stats/broadcast")
+async def get_broadcast_stats():
+    """Snapshot fan-out counters, including frames saved by coalescing."""
+    return {
+        **broadcast_stats,
+        "coalesce_window_ms": SNAPSHOT_COALESCE_MS,
+        "pending": len(_pending_snapshots),
+        "subscribers": sum(len(s) for s in channels.values()),
+    }
+
+
+@router.get("/stats/journal")
+async def get_journal_stats():
+    """Journal throughput counters (records, group commits, fsyncs, checkpoints)."""
+    if journal is None:
+        return {"enabled": False}
+    stats = {"enabled": True, **journal.stats()}
+    if checkpointer is not None:
+        stats["checkpoint"] = checkpointer.stats()
+    return stats
+
+
+@router.get("/stats/backend")
+async def get_backend_stats():
+    """State backend in use and its traffic counters."""
+    stats = backend.stats()
+    if backend.shared:
+        stats["broker"] = await backend.broker_stats()
+    return stats
+
+
+@router.get("/stats/timers")
+async def get_timer_stats():
+    """Server timer scheduler: running boxes, ticks, frames and expiries."""
+    if timers is None:
+        return {"enabled": False}
+    return {"enabled": True, **timers.stats()}
+
+
+@router.get("/stats/clock")
+async def get_clock_stats():
+    """RTT and clock offset estimates of the connected sockets."""
+    estimates = [c for c in _clocks.values() if c.rtt_ms is not None]
+    rtts = sorted(c.rtt_ms for c in estimates)
+    return {
+        "connections": len(_clocks),
+        "estimated": len(estimates),
+        "rtt_ms_median": round(rtts[len(rtts) // 2], 1) if rtts else None,
+        "max_error_ms": round(rtts[-1] / 2, 1) if rtts else None,
+        "pongs": sum(c.pongs for c in _clocks.values()),
+    }
+
+
+@router.get("/stats/rate_limit")
+async def get_rate_limit_stats():
+    """Boxes tracked by the /cmd rate limiter, its decisions and the sweep."""
+    return {
+        **get_rate_limiter().stats(),
+        "precheck": precheck_stats,
+        "sweep": rate_sweeper.stats() if rate_sweeper is not None else None,
+    }
+
+
+@router.get("/stats/memory")
+async def get_memory_stats():
+    """Entries and approximate bytes of each per-box registry, and eviction totals."""
+    return {
+        "state_map": measure(state_map),
+        "state_locks": measure(state_locks, shallow_size),
+        "channels": measure(channels, shallow_size),
+        "last_broadcast": measure(_last_broadcast),
+        "event_rings": measure(_event_rings),
+        "pending_snapshots": measure(_pending_snapshots, shallow_size),
+        "last_active": measure(_last_active),
+        "eviction": evictor.stats() if evictor is not None else None,
+        "spill": spill.stats() if spill is not None else None,
+    }
+
+
+@router.get("/stats/replication")
+async def get_replication_stats():
+    """Replication role, sequence numbers and lag (primary or standby)."""
+    if replication is not None:
+        return replication.stats()
+    if replica is not None:
+        return replica.stats()
+    return {"role": None}
+
+
+@router.post("/replication/promote")
+async def promote_replica():
+    """
+    Turn this standby into the primary.
+
+    The standby stops tailing, accepts commands and starts serving its own
+    replication socket (the one it followed), so a new standby can attach.
+    Only promote once the old primary is really gone.
+    """
+    global read_only, replication
+    if replica is None or replica.promoted:
+        raise HTTPException(status_code=409, detail="Not a standby")
+    await replica.promote()
+    read_only = False
+    if timers is not None:
+        arm_timers()
+    source = ReplicationSource(capture_state, replica.path)
+    source.seq = replica.applied_seq
+    await source.start()
+    replication = source
+    return {"status": "ok", "seq": replica.applied_seq}
+
+
 # helpers
-def _build_snapshot(box_id: int, state: dict) -> dict:
+def _build_snapshot(box_id: int, state: BoxState) -> dict:
     return {
         "type": "STATE_SNAPSHOT",
         "boxId": box_id,
-        "initiated": state.get("initiated", False),
-        "holdsCount": state.get("holdsCount", 0),
-        "routeIndex": state.get("routeIndex", 1),
-        "currentClimber": state.get("currentClimber", ""),
-        "started": state.get("started", False),
-        "timerState": state.get("timerState", "idle"),
-        "holdCount": state.get("holdCount", 0.0),
-        "competitors": state.get("competitors", []),
-        "categorie": state.get("categorie", ""),
-        "registeredTime": state.get("lastRegisteredTime"),
-        "remaining": state.get("remaining"),
+        "initiated": state.initiated,
+        "holdsCount": state.holdsCount,
+        "routeIndex": state.routeIndex,
+        "currentClimber": state.currentClimber,
+        "started": state.started,
+        "timerState": state.timerState,
+        "holdCount": state.holdCount,
+        "competitors": state.competitors,
+        "categorie": state.categorie,
+        "registeredTime": state.lastRegisteredTime,
+        "remaining": _live_remaining(box_id, state),
         "timeCriterionEnabled": time_criterion_enabled,
-        "timerPreset": state.get("timerPreset"),
-        "timerPresetSec": state.get("timerPresetSec"),
-        "sessionId": state.get("sessionId"),  # Include session ID for client validation
+        "timerPreset": state.timerPreset,
+        "timerPresetSec": state.timerPresetSec,
+        "timerEndsAt": _timer_ends_at(box_id, state),
+        "sessionId": state.sessionId,  # Include session ID for client validation
+        "seq": state.seq,
     }
 
 
-async def _send_state_snapshot(box_id: int, targets: set[WebSocket] | None = None):
-    # Ensure state exists before sending snapshot
-    async with init_lock:
-        if box_id not in state_map:
-            import uuid
-
-            state_map[box_id] = {
-                "initiated": False,
-                "holdsCount": 0,
-                "currentClimber": "",
-                "started": False,
-                "timerState": "idle",
-                "holdCount": 0.0,
-                "routeIndex": 1,
-                "competitors": [],
-                "categorie": "",
-                "lastRegisteredTime": None,
-                "remaining": None,
-                "timerPreset": None,
-                "timerPresetSec": None,
-                "sessionId": str(uuid.uuid4()),
-            }
+def _live_remaining(box_id: int, state: BoxState) -> float | None:
+    """Remaining time of a box: from the server timer while it runs."""
+    if timers is None or state_map.get(box_id) is not state:
+        return state.remaining
+    left = timers.remaining(box_id)
+    return state.remaining if left is None else round(left, 3)
 
-    state = state_map.get(box_id)
-    if state is None:
+
+def _timer_ends_at(box_id: int, state: BoxState) -> int | None:
+    """Server epoch ms at which the live box's running server timer ends."""
+    if timers is None or state_map.get(box_id) is not state:
+        # Past states (history) have no live timer
+        return None
+    return timers.ends_at(box_id)
+
+
+def _build_delta(box_id: int, base: dict, snapshot: dict) -> dict | None:
+    """
+    Diff a snapshot against the last one broadcast for the box.
+
+    Returns a STATE_DELTA carrying only the changed fields, or None when
+    nothing changed. Competitor changes are sent as [index, marked] pairs
+    unless the roster itself was replaced (INIT_ROUTE/RESET_BOX), in which
+    case the whole list is included.
+    """
+    prev = base["snapshot"]
+    changes = {
+        k: v for k, v in snapshot.items() if k not in _DELTA_SKIP_FIELDS and prev.get(k) != v
+    }
+
+    competitors = snapshot["competitors"]
+    marked: list[list] = []
+    if competitors is not base["competitors"] or len(competitors) != len(base["marked"]):
+        changes["competitors"] = competitors
+    else:
+        for i, (comp, was_marked) in enumerate(zip(competitors, base["marked"])):
+            is_marked = bool(comp.get("marked"))
+            if is_marked != was_marked:
+                marked.append([i, is_marked])
+
+    if not changes and not marked:
+        return None
+
+    delta = {
+        "type": "STATE_DELTA",
+        "boxId": box_id,
+        "seq": snapshot["seq"],
+        "baseSeq": prev["seq"],
+        "changes": changes,
+    }
+    if marked:
+        delta["marked"] = marked
+    return delta
+
+
+def _broadcast_snapshot(box_id: int, state: BoxState) -> None:
+    """
+    Broadcast the box state to every subscriber.
+
+    Legacy subscribers get a full STATE_SNAPSHOT. Subscribers that connected
+    with ?deltas=1 get a STATE_DELTA against the previous broadcast; a client
+    whose seq differs from the delta's baseSeq has missed a frame and should
+    send REQUEST_STATE to resync from a full snapshot.
+    """
+    broadcast_stats["snapshots_broadcast"] += 1
+    snapshot = _build_snapshot(box_id, state)
+    competitors = snapshot["competitors"]
+    base = _last_broadcast.get(box_id)
+    delta = _build_delta(box_id, base, snapshot) if base else None
+    _last_broadcast[box_id] = {
+        "snapshot": {k: v for k, v in snapshot.items() if k != "competitors"},
+        "competitors": competitors,
+        "marked": tuple(bool(c.get("marked")) for c in competitors),
+    }
+
+    ring = _event_rings.get(box_id)
+    subscribers = channels.get(box_id)
+    if not subscribers and ring is None:
         return
-    payload = _build_snapshot(box_id, state)
 
-    # If targets specified (e.g., on new connection), send only to them
+    full_text = None
+    delta_text = None
+    if ring is not None:
+        seq = ring.next_seq()
+        snapshot["eventSeq"] = seq
+        if delta is not None:
+            delta["eventSeq"] = seq
+        full_text = json.dumps(snapshot, ensure_ascii=False)
+        ring.append(seq, full_text, snapshot=True)
+    for outbox in list(subscribers or ()):
+        if outbox.deltas and base is not None:
+            if delta is None:
+                continue
+            if delta_text is None:
+                delta_text = json.dumps(delta, ensure_ascii=False)
+            outbox.send(delta_text)
+        else:
+            if full_text is None:
+                full_text = json.dumps(snapshot, ensure_ascii=False)
+            outbox.send(full_text, snapshot=True)
+
+
+async def _send_state_snapshot(box_id: int, targets: set[Outbox] | None = None):
+    # If targets specified (e.g., on new connection), send a full snapshot only to them
     if targets:
-        for ws in list(targets):
-            try:
-                await ws.send_text(json.dumps(payload, ensure_ascii=False))
-            except Exception as e:
-                logger.debug(f"Failed to send snapshot to target: {e}")
+        state = await backend.get(box_id)
+        text = json.dumps(_snapshot_frame(box_id, state), ensure_ascii=False)
+        for outbox in targets:
+            outbox.send(text, snapshot=True)
+    else:
+        # Otherwise broadcast to all subscribers on this box (caller holds the box)
+        state = _ensure_state(box_id)
+        if backend.shared:
+            backend.publish({"kind": "snapshot", "boxId": box_id, "record": state.to_record()})
+        _request_snapshot_broadcast(box_id, state)
+
+
+def _request_snapshot_broadcast(box_id: int, state: BoxState) -> None:
+    """
+    Broadcast a snapshot now, or merge it into a pending one.
+
+    With SNAPSHOT_COALESCE_MS > 0, the first request for a box schedules a
+    broadcast after the window; requests arriving meanwhile are absorbed and
+    the flush sends whatever the state is at that moment. Command echoes are
+    not affected and still go out immediately.
+    """
+    broadcast_stats["snapshots_requested"] += 1
+    if SNAPSHOT_COALESCE_MS <= 0:
+        _broadcast_snapshot(box_id, state)
+        return
+
+    if box_id in _pending_snapshots:
+        broadcast_stats["snapshots_coalesced"] += 1
+        broadcast_stats["frames_saved"] += len(channels.get(box_id) or ())
+        return
+
+    _pending_snapshots[box_id] = asyncio.create_task(_flush_snapshot_later(box_id))
+
+
+async def _flush_snapshot_later(box_id: int) -> None:
+    try:
+        await asyncio.sleep(SNAPSHOT_COALESCE_MS / 1000)
+    finally:
+        _pending_snapshots.pop(box_id, None)
+    state = state_map.get(box_id)
+    if state is not None:
+        _broadcast_snapshot(box_id, state)
+
+
+def _server_timed(sm: BoxState) -> bool:
+    """True when the server timer counts this box down (it has a preset)."""
+    return timers is not None and sm.timerPresetSec is not None
+
+
+def _stamp_timer(sm: BoxState, cmd: Cmd) -> None:
+    """
+    Put the server timer's remaining time on a timer command before it is
+    applied, so the journal (and a replay) carries the authoritative value.
+    """
+    if not _server_timed(sm):
+        return
+    if cmd.type == "START_TIMER":
+        cmd.remaining = float(sm.timerPresetSec)
+    elif cmd.type == "STOP_TIMER":
+        left = timers.remaining(cmd.boxId)
+        if left is not None:
+            cmd.remaining = round(left, 3)
+    elif cmd.type == "RESUME_TIMER":
+        cmd.remaining = sm.remaining
+
+
+def _follow_timer(box_id: int, sm: BoxState, cmd: Cmd) -> None:
+    """Arm or disarm the server timer after a command changed timerState."""
+    if cmd.type not in TIMER_TYPES or timers is None:
+        return
+    if sm.timerState == "running" and _server_timed(sm) and sm.remaining:
+        timers.run(box_id, sm.remaining)
     else:
-        # Otherwise broadcast to all subscribers on this box
-        await _broadcast_to_box(box_id, payload)
+        timers.stop(box_id)
+
+
+def arm_timers() -> int:
+    """Re-arm running boxes from their last known remaining time."""
+    armed = 0
+    for box_id, sm in state_map.items():
+        if sm.timerState == "running" and _server_timed(sm) and sm.remaining:
+            timers.run(box_id, sm.remaining)
+            armed += 1
+    return armed
+
+
+def deliver_timer_ticks(changed: dict[int, int]) -> None:
+    """
+    Timer engine tick: push the remaining whole seconds of running boxes.
+
+    Sent as TIMER_SYNC frames, which viewers already handle. Ticks are not
+    numbered into the event ring: a missed one is superseded by the next,
+    and they would push the frames a resume needs out of the ring. Nor do
+    they touch box state: while a timer runs, its deadline in the engine is
+    the remaining time (see _live_remaining); sm.remaining only changes
+    with the timer commands, under the box lock.
+    """
+    for box_id, remaining in changed.items():
+        subscribers = channels.get(box_id)
+        if subscribers:
+            text = json.dumps({"type": "TIMER_SYNC", "boxId": box_id, "remaining": remaining})
+            for outbox in list(subscribers):
+                if outbox.ticks:
+                    outbox.send(text)
+
+
+async def expire_timer(box_id: int) -> None:
+    """Timer engine: a box ran out of time; stop it and register the full time."""
+    commit = None
+    async with backend.box(box_id) as sm:
+        # Stopped (or restarted) while waiting for the lock
+        if sm.timerState != "running" or timers.running(box_id):
+            return
+        expiry = [Cmd(boxId=box_id, type="STOP_TIMER", remaining=0.0)]
+        if sm.timerPresetSec is not None:
+            expiry.append(
+                Cmd(
+                    boxId=box_id,
+                    type="REGISTER_TIME",
+                    registeredTime=float(sm.timerPresetSec),
+                )
+            )
+        for c in expiry:
+            c.sessionId = sm.sessionId
+            _apply_cmd(sm, c)
+            commit = _journal_cmd(sm, c) or commit
+            await _broadcast_to_box(box_id, c.model_dump())
+        await _send_state_snapshot(box_id)
+    await _wait_durable(commit)
 
 
 def _parse_timer_preset(preset: str | None) -> int | None:
@@ -598,10 +1491,30 @@ async def _broadcast_time_criterion():
         "type": "TIME_CRITERION",
         "timeCriterionEnabled": time_criterion_enabled,
     }
-    for sockets in channels.values():
-        for ws in list(sockets):
-            try:
-                # Preserve UTF-8 diacritics
-                await ws.send_text(json.dumps(payload, ensure_ascii=False))
-            except Exception:
-                sockets.discard(ws)
+    backend.publish({"kind": "time_criterion", "payload": payload})
+    _deliver_time_criterion(payload)
+
+
+def _deliver_time_criterion(payload: dict) -> None:
+    # A frame on every box, each numbered in that box's event sequence
+    for box_id in set(channels) | set(_event_rings):
+        _deliver_to_box(box_id, payload)
+
+
+def handle_backend_message(msg: dict) -> None:
+    """Deliver a broadcast published by another worker to local subscribers."""
+    global time_criterion_enabled
+    kind = msg.get("kind")
+    if kind == "echo":
+        _deliver_to_box(msg["boxId"], msg["payload"])
+    elif kind == "snapshot":
+        box_id = msg["boxId"]
+        state = state_map.get(box_id)
+        if state is None:
+            state = state_map[box_id] = BoxState.from_record(msg["record"])
+        else:
+            state.update_from_record(msg["record"])
+        _request_snapshot_broadcast(box_id, state)
+    elif kind == "time_criterion":
+        time_criterion_enabled = bool(msg["payload"]["timeCriterionEnabled"])
+        _deliver_time_criterion(msg["payload"])
@@ -1,23 +1,35 @@
 import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pandas as pd
+from escalada.results_store import get_results_store
 from fastapi import APIRouter, HTTPException
 
 router = APIRouter()
 
+PODIUM_COLORS = ["#ffd700", "#c0c0c0", "#cd7f32"]  # aur, argint, bronz
 
-@router.get("/podium/{category}", response_model=List[Dict[str, str]])
-async def get_podium(category: str):
-    """
-    Returnează primii 3 clasați pentru categoria specificată,
-    citind fișierul Excel generat anterior.
-    """
+
+def _safe_category(category: str) -> str:
     # Sanitize category to prevent path traversal
     safe_category = os.path.basename(category)
     if not safe_category or safe_category != category:
         raise HTTPException(status_code=400, detail="Invalid category name")
+    return safe_category
+
+
+@router.get("/podium/{category}", response_model=List[Dict[str, str]])
+def get_podium(category: str):
+    """
+    Returnează primii 3 clasați pentru categoria specificată,
+    din store; fișierul Excel e citit doar pentru clasamente salvate înainte de store.
+    """
+    safe_category = _safe_category(category)
+
+    names = get_results_store().podium(safe_category, len(PODIUM_COLORS))
+    if names is not None:
+        return [{"name": name, "color": PODIUM_COLORS[i]} for i, name in enumerate(names)]
 
     excel_path = Path("escalada/clasamente") / safe_category / "overall.xlsx"
     if not excel_path.exists():
@@ -27,12 +39,9 @@ async def get_podium(category: str):
     try:
         df = pd.read_excel(excel_path)
     except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Eroare la citirea fișierului Excel: {e}"
-        )
+        raise HTTPException(status_code=500, detail=f"Eroare la citirea fișierului Excel: {e}")
     # Presupunem că DataFrame-ul are coloana "Nume" și este deja sortat după tipărirea cu Rank
     top3 = df.head(3)
-    colors = ["#ffd700", "#c0c0c0", "#cd7f32"]  # aur, argint, bronz
     result = []
     for idx, row in enumerate(top3.itertuples()):
         name = getattr(row, "Nume", None) or getattr(row, "Name", None)
@@ -41,5 +50,29 @@ async def get_podium(category: str):
                 status_code=500,
                 detail="Excel file is missing required 'Nume' or 'Name' column",
             )
-        result.append({"name": name, "color": colors[idx]})
+        result.append({"name": name, "color": PODIUM_COLORS[idx]})
+    return result
+
+
+@router.get("/ranking/{category}")
+def get_ranking(category: str, route: Optional[int] = None):
+    """
+    Clasamentul general al categoriei sau, cu ?route=N, clasamentul rutei N.
+    """
+    safe_category = _safe_category(category)
+    store = get_results_store()
+    if route is None:
+        result = store.overall(safe_category)
+    else:
+        result = store.route(safe_category, route)
+    if result is None:
+        raise HTTPException(
+            status_code=404, detail="Clasament inexistent pentru categoria specificată."
+        )
     return result
+
+
+@router.get("/stats/results")
+def get_results_stats():
+    """Results store counters (saved categories, rows written, last save time)."""
+    return get_results_store().stats()
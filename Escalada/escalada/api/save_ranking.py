@@ -4,6 +4,7 @@ import os
 from pathlib import Path
 
 import pandas as pd
+from escalada.results_store import get_results_store
 from fastapi import APIRouter
 from pydantic import BaseModel
 from reportlab.lib import colors
@@ -12,8 +13,7 @@ from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
-                                TableStyle)
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
 
 # Register Unicode-capable font for diacritics
 # Try DejaVuSans first, then fallback to reportlab's built-in UnicodeCIDFont
@@ -64,102 +64,149 @@ def save_ranking(payload: RankingIn):
     raw_times = payload.times or {}
     # normalize toate timpiile la secunde (int) sau None
     times = {name: [_to_seconds(t) for t in arr] for name, arr in raw_times.items()}
-    use_time = payload.use_time_tiebreak
 
-    def time_for(name: str, idx: int):
-        arr = times.get(name, [])
-        return _to_seconds(arr[idx]) if idx < len(arr) else None
+    # ---------- store (sursa de adevăr) ----------
+    overall_df = _build_overall_df(payload, times)
+    store = get_results_store()
+    store.save_category(
+        payload.categorie,
+        payload.route_count,
+        payload.use_time_tiebreak,
+        [(name, payload.clubs.get(name, "")) for name in payload.scores],
+        {r + 1: _rank_route(payload, times, r) for r in range(payload.route_count)},
+        [(row.Nume, int(row.Rank), float(row.Total)) for row in overall_df.itertuples(index=False)],
+    )
+
+    # ---------- excel + pdf, exportate din store ----------
+    saved_paths = _export_category(store, payload.categorie, cat_dir)
+    return {"status": "ok", "saved": [str(p) for p in saved_paths]}
+
+
+def _export_category(store, categorie: str, cat_dir: Path) -> list[Path]:
+    """Write overall and per-route Excel/PDF files from the stored rankings."""
+    result = store.overall(categorie)
+    use_time = result["use_time_tiebreak"]
 
     # ---------- excel + pdf TOTAL ----------
-    overall_df = _build_overall_df(payload, times)
+    overall_df = _overall_df_from_store(result)
     xlsx_tot = cat_dir / "overall.xlsx"
     pdf_tot = cat_dir / "overall.pdf"
     overall_df.to_excel(xlsx_tot, index=False)
-    _df_to_pdf(overall_df, pdf_tot, title=f"{payload.categorie} – Overall")
+    _df_to_pdf(overall_df, pdf_tot, title=f"{categorie} – Overall")
     saved_paths = [xlsx_tot, pdf_tot]
 
     # ---------- excel + pdf BY‑ROUTE ----------
-    scores = payload.scores
-    for r in range(payload.route_count):
-        # 1. colectează (nume, scor brut) pentru ruta r
-        route_list = [
-            (name, arr[r] if r < len(arr) else None, time_for(name, r))
-            for name, arr in scores.items()
-        ]
-        # 2. sortează descrescător (None → ultimii)
-        route_list_sorted = sorted(
-            route_list,
-            key=lambda x: (
-                -x[1] if x[1] is not None else math.inf,
-                (
-                    x[2]
-                    if (use_time and x[2] is not None)
-                    else (math.inf if use_time else 0)
-                ),
-            ),
-        )
-
-        # 3. calculează punctajele de ranking cu tie-handling
-        points = {}
-        pos = 1
-        i = 0
-        while i < len(route_list_sorted):
-            same_score = [
-                route_list_sorted[j]
-                for j in range(i, len(route_list_sorted))
-                if route_list_sorted[j][1] == route_list_sorted[i][1]
-                and (
-                    not use_time or (route_list_sorted[j][2] == route_list_sorted[i][2])
-                )
-            ]
-            first = pos
-            last = pos + len(same_score) - 1
-            avg_rank = (first + last) / 2
-            for name, _, _ in same_score:
-                points[name] = avg_rank
-            pos += len(same_score)
-            i += len(same_score)
-
-        # tie-handling pe Score per rută
-        ranks = []
-        prev_score = None
-        prev_time = None
-        prev_rank = 0
-        for idx, (_, score, tm) in enumerate(route_list_sorted, start=1):
-            if score == prev_score and ((not use_time) or tm == prev_time):
-                rank = prev_rank
-            else:
-                rank = idx
-            ranks.append(rank)
-            prev_score = score
-            prev_time = tm
-            prev_rank = rank
-
+    for r in range(result["route_count"]):
         df_route = pd.DataFrame(
             [
                 {
-                    "Rank": ranks[i],
-                    "Name": name,
-                    "Club": payload.clubs.get(name, ""),
-                    "Score": score,
-                    **({"Time": _format_time(tm)} if use_time else {}),
-                    "Points": points.get(name),
+                    "Rank": row["rank"],
+                    "Name": row["name"],
+                    "Club": row["club"],
+                    "Score": row["score"],
+                    **({"Time": _format_time(row["time"])} if use_time else {}),
+                    "Points": row["points"],
                 }
-                for i, (name, score, tm) in enumerate(route_list_sorted)
+                for row in store.route(categorie, r + 1)
             ]
         )
-
-        # 5. salvează Excel și PDF pentru această rută
         xlsx_route = cat_dir / f"route_{r+1}.xlsx"
         pdf_route = cat_dir / f"route_{r+1}.pdf"
         df_route.to_excel(xlsx_route, index=False)
-        _df_to_pdf(df_route, pdf_route, title=f"{payload.categorie} – Route {r+1}")
+        _df_to_pdf(df_route, pdf_route, title=f"{categorie} – Route {r+1}")
         saved_paths.extend([xlsx_route, pdf_route])
-
-    return {"status": "ok", "saved": [str(p) for p in saved_paths]}
+    return saved_paths
 
 
 # ------- helpers -------
+def _rank_route(
+    p: RankingIn, times: dict[str, list[int | None]], r: int
+) -> list[tuple[str, int, float | None, int | None, float | None]]:
+    """
+    Rank route r (0-based).
+
+    Returns:
+        list: (name, rank, score, seconds, points) in ranking order
+    """
+    use_time = p.use_time_tiebreak
+
+    def time_for(name: str, idx: int):
+        arr = times.get(name, [])
+        return _to_seconds(arr[idx]) if idx < len(arr) else None
+
+    # 1. colectează (nume, scor brut) pentru ruta r
+    route_list = [
+        (name, arr[r] if r < len(arr) else None, time_for(name, r))
+        for name, arr in p.scores.items()
+    ]
+    # 2. sortează descrescător (None → ultimii)
+    route_list_sorted = sorted(
+        route_list,
+        key=lambda x: (
+            -x[1] if x[1] is not None else math.inf,
+            (x[2] if (use_time and x[2] is not None) else (math.inf if use_time else 0)),
+        ),
+    )
+
+    # 3. calculează punctajele de ranking cu tie-handling
+    points = {}
+    pos = 1
+    i = 0
+    while i < len(route_list_sorted):
+        same_score = [
+            route_list_sorted[j]
+            for j in range(i, len(route_list_sorted))
+            if route_list_sorted[j][1] == route_list_sorted[i][1]
+            and (not use_time or (route_list_sorted[j][2] == route_list_sorted[i][2]))
+        ]
+        first = pos
+        last = pos + len(same_score) - 1
+        avg_rank = (first + last) / 2
+        for name, _, _ in same_score:
+            points[name] = avg_rank
+        pos += len(same_score)
+        i += len(same_score)
+
+    # 4. tie-handling pe Score per rută
+    ranked = []
+    prev_score = None
+    prev_time = None
+    prev_rank = 0
+    for idx, (name, score, tm) in enumerate(route_list_sorted, start=1):
+        if score == prev_score and ((not use_time) or tm == prev_time):
+            rank = prev_rank
+        else:
+            rank = idx
+        ranked.append((name, rank, score, tm, points.get(name)))
+        prev_score = score
+        prev_time = tm
+        prev_rank = rank
+    return ranked
+
+
+def _overall_df_from_store(result: dict) -> pd.DataFrame:
+    """Rebuild the overall sheet (same columns as _build_overall_df) from the store."""
+    n = result["route_count"]
+    use_time = result["use_time_tiebreak"]
+    cols = ["Rank", "Nume", "Club"]
+    for i in range(n):
+        cols.append(f"Score R{i+1}")
+        if use_time:
+            cols.append(f"Time R{i+1}")
+    cols.append("Total")
+
+    data = []
+    for row in result["rows"]:
+        values = [row["rank"], row["name"], row["club"]]
+        for idx in range(n):
+            values.append(row["scores"][idx])
+            if use_time:
+                values.append(_format_time(row["times"][idx]))
+        values.append(row["total"])
+        data.append(values)
+    return pd.DataFrame(data, columns=cols)
+
+
 def _build_overall_df(
     p: RankingIn, normalized_times: dict[str, list[int | None]] | None = None
 ) -> pd.DataFrame:
@@ -187,11 +234,7 @@ def _build_overall_df(
             scored.sort(
                 key=lambda x: (
                     -x[1],
-                    (
-                        x[2]
-                        if (use_time and x[2] is not None)
-                        else (math.inf if use_time else 0)
-                    ),
+                    (x[2] if (use_time and x[2] is not None) else (math.inf if use_time else 0)),
                 )
             )
 
@@ -258,9 +301,7 @@ def _build_by_route_df(p: RankingIn) -> pd.DataFrame:
             score = arr[r] if r < len(arr) else None
             t_arr = times.get(name, [])
             tm = t_arr[r] if r < len(t_arr) else None
-            rows.append(
-                {"Route": r + 1, "Name": name, "Score": score, "Time": _format_time(tm)}
-            )
+            rows.append({"Route": r + 1, "Name": name, "Score": score, "Time": _format_time(tm)})
     return pd.DataFrame(rows)
 
 
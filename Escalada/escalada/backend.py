@@ -0,0 +1,321 @@
+"""
+Box state and pub/sub backends
+"local" keeps everything in this process (single worker); "broker" shares
+box state, box locks and broadcasts between workers through escalada.broker
+"""
+
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from escalada.box_state import BoxState
+from escalada.journal import GLOBAL_KEY
+
+logger = logging.getLogger(__name__)
+
+# "local" (default) or "broker"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+BROKER_SOCKET = os.getenv("BROKER_SOCKET", os.path.join("data", "broker.sock"))
+# Max size of one framed message (a snapshot record of a large roster)
+BROKER_LINE_LIMIT = 16 * 1024 * 1024
+# How long a worker waits for the broker to grant a box lock
+BROKER_ACQUIRE_TIMEOUT_SEC = float(os.getenv("BROKER_ACQUIRE_TIMEOUT_SEC", "10"))
+
+
+class StateBackend:
+    """
+    Where box state lives and how broadcasts reach other workers
+
+    acquire()/release() bracket every state change and are exclusive per box
+    across all workers; the state returned by acquire() is current. publish()
+    sends a message to the other workers, which hand it to on_message; the
+    worker that publishes has already delivered it to its own subscribers.
+    """
+
+    name = "base"
+    # True when other workers share the state (publish() reaches someone)
+    shared = False
+
+    def __init__(self):
+        self.on_message: Optional[Callable[[dict], None]] = None
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def acquire(self, box_id: int) -> BoxState:
+        raise NotImplementedError
+
+    def release(self, box_id: int, state: BoxState, changed: bool) -> None:
+        raise NotImplementedError
+
+    async def get(self, box_id: int) -> BoxState:
+        """Current state of a box, without taking its lock."""
+        raise NotImplementedError
+
+    def journal(self, key: str, record: dict) -> Optional[asyncio.Future]:
+        """
+        Persist a journal record through the backend.
+
+        Returns:
+            Future[bool] | None: Completes once durable; None if the backend
+            does not journal (the local journal, if any, is used instead)
+        """
+        return None
+
+    def publish(self, message: dict) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    @asynccontextmanager
+    async def box(self, box_id: int):
+        """Hold a box exclusively; its state is written back if seq moved."""
+        state = await self.acquire(box_id)
+        seq = state.seq
+        try:
+            yield state
+        finally:
+            self.release(box_id, state, state.seq != seq)
+
+
+class LocalBackend(StateBackend):
+    """In-process state: the box registry and asyncio locks of this worker"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        lock_for: Callable[[int], asyncio.Lock],
+        state_for: Callable[[int], BoxState],
+    ):
+        super().__init__()
+        self._lock_for = lock_for
+        self._state_for = state_for
+
+    async def acquire(self, box_id: int) -> BoxState:
+        await self._lock_for(box_id).acquire()
+        return self._state_for(box_id)
+
+    def release(self, box_id: int, state: BoxState, changed: bool) -> None:
+        self._lock_for(box_id).release()
+
+    async def get(self, box_id: int) -> BoxState:
+        return self._state_for(box_id)
+
+
+class BrokerBackend(StateBackend):
+    """
+    Client of the broker process (see escalada.broker)
+
+    Requests and replies are JSON lines over one Unix socket per worker.
+    The broker holds the authoritative state and per-box locks; this worker
+    keeps a cache in `states` that the broker refreshes whenever a grant or
+    read finds it out of date. Journal records for a box travel with the
+    release that produced them, so the broker journals and stores them in
+    the same step.
+    """
+
+    name = "broker"
+    shared = True
+
+    def __init__(
+        self,
+        states: dict[int, BoxState],
+        path: str = BROKER_SOCKET,
+        acquire_timeout: float = BROKER_ACQUIRE_TIMEOUT_SEC,
+    ):
+        super().__init__()
+        self.states = states
+        self.path = path
+        self.acquire_timeout = acquire_timeout
+        self.globals: dict = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._next_id = 0
+        self._replies: dict[int, asyncio.Future] = {}
+        # Journal records (and their durability future) waiting for release
+        self._records: dict[int, list[dict]] = {}
+        self._durable: dict[int, asyncio.Future] = {}
+
+        # Counters (see GET /api/stats/backend)
+        self.requests = 0
+        self.published = 0
+        self.received = 0
+        self.records_fetched = 0
+        self.abandoned = 0
+
+    async def start(self) -> None:
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            self.path, limit=BROKER_LINE_LIMIT
+        )
+        self._task = asyncio.create_task(self._run())
+        self.globals = await self._request({"op": "hello", "pid": os.getpid()})
+        logger.info(f"Connected to state broker at {self.path}")
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ==================== PROTOCOL ====================
+
+    def _send(self, message: dict) -> None:
+        line = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        self._writer.write((line + "\n").encode("utf-8"))
+
+    def _request_future(self, message: dict) -> asyncio.Future:
+        self._next_id += 1
+        message["id"] = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._replies[self._next_id] = future
+        self.requests += 1
+        self._send(message)
+        return future
+
+    async def _request(self, message: dict) -> dict:
+        return await self._request_future(message)
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    logger.error("Connection to state broker closed")
+                    break
+                message = json.loads(line)
+                if message.get("op") == "publish":
+                    self.received += 1
+                    if self.on_message is not None:
+                        try:
+                            self.on_message(message["msg"])
+                        except Exception as e:
+                            logger.error(f"Broker message handler failed: {e}")
+                    continue
+                future = self._replies.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            # Fail whatever is still waiting: no reply will come
+            for future in self._replies.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("State broker went away"))
+            self._replies.clear()
+
+    def _cache(self, box_id: int, reply: dict) -> BoxState:
+        record = reply.get("record")
+        if record is not None:
+            self.records_fetched += 1
+            state = self.states.get(box_id)
+            if state is None:
+                self.states[box_id] = BoxState.from_record(record)
+            else:
+                state.update_from_record(record)
+        return self.states[box_id]
+
+    # ==================== StateBackend ====================
+
+    async def acquire(self, box_id: int) -> BoxState:
+        grant = self._request_future({"op": "acquire", "box": box_id})
+        try:
+            reply = await asyncio.wait_for(asyncio.shield(grant), self.acquire_timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # The broker still has us queued; hand the box back once it grants it
+            self.abandoned += 1
+            grant.add_done_callback(lambda f: self._abandon(box_id, f))
+            raise
+        return self._cache(box_id, reply)
+
+    def _abandon(self, box_id: int, grant: asyncio.Future) -> None:
+        """Release a lock granted to an acquire nobody awaits any more."""
+        if grant.cancelled() or grant.exception() is not None:
+            return
+        # Keep the cache in step with what the broker believes we have
+        if grant.result().get("record") is not None:
+            self._cache(box_id, grant.result())
+        if self._writer is not None and not self._writer.is_closing():
+            self._send({"op": "release", "box": box_id})
+
+    def release(self, box_id: int, state: BoxState, changed: bool) -> None:
+        message = {"op": "release", "box": box_id}
+        if changed:
+            message["record"] = state.to_record()
+        records = self._records.pop(box_id, None)
+        durable = self._durable.pop(box_id, None)
+        if records:
+            message["journal"] = records
+            reply = self._request_future(message)
+            reply.add_done_callback(lambda f: _settle(durable, f))
+        else:
+            self._send(message)
+
+    async def get(self, box_id: int) -> BoxState:
+        return self._cache(box_id, await self._request({"op": "get", "box": box_id}))
+
+    def journal(self, key: str, record: dict) -> Optional[asyncio.Future]:
+        if key == GLOBAL_KEY:
+            durable = asyncio.get_running_loop().create_future()
+            reply = self._request_future({"op": "global", "record": record})
+            reply.add_done_callback(lambda f: _settle(durable, f))
+            return durable
+        box_id = record["cmd"]["boxId"]
+        self._records.setdefault(box_id, []).append(record)
+        durable = self._durable.get(box_id)
+        if durable is None:
+            durable = self._durable[box_id] = asyncio.get_running_loop().create_future()
+        return durable
+
+    def publish(self, message: dict) -> None:
+        self.published += 1
+        self._send({"op": "publish", "msg": message})
+
+    async def broker_stats(self) -> dict:
+        reply = await self._request({"op": "stats"})
+        reply.pop("id", None)
+        return reply
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "socket": self.path,
+            "requests": self.requests,
+            "published": self.published,
+            "received": self.received,
+            "records_fetched": self.records_fetched,
+            "abandoned": self.abandoned,
+            "pending": len(self._replies),
+        }
+
+
+def _settle(durable: Optional[asyncio.Future], reply: asyncio.Future) -> None:
+    if durable is None or durable.done():
+        return
+    ok = not reply.cancelled() and reply.exception() is None
+    durable.set_result(ok and bool(reply.result().get("ok")))
+
+
+__all__ = [
+    "StateBackend",
+    "LocalBackend",
+    "BrokerBackend",
+    "STATE_BACKEND",
+    "BROKER_SOCKET",
+    "BROKER_ACQUIRE_TIMEOUT_SEC",
+]
@@ -0,0 +1,174 @@
+"""
+Per-box contest state
+Slotted dataclass with an indexed competitor roster
+"""
+
+import uuid
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional
+
+
+@dataclass(slots=True)
+class BoxState:
+    """
+    Server-side state for one box
+
+    Field names match the keys of the STATE_SNAPSHOT payload so the dict-style
+    accessors (state["holdCount"], state.get(...)) keep working for existing
+    callers. The roster keeps a name -> index map and a cursor on the first
+    unmarked competitor, so scoring does not scan the list.
+    """
+
+    initiated: bool = False
+    holdsCount: int = 0
+    currentClimber: str = ""
+    started: bool = False
+    timerState: str = "idle"  # 'idle', 'running', 'paused'
+    holdCount: float = 0.0
+    routeIndex: int = 1
+    competitors: list[dict] = field(default_factory=list)
+    categorie: str = ""
+    lastRegisteredTime: Optional[float] = None
+    remaining: Optional[float] = None
+    timerPreset: Optional[str] = None
+    timerPresetSec: Optional[int] = None
+    # Generated at creation, not at INIT_ROUTE
+    sessionId: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # Incremented on INIT_ROUTE to prevent stale commands
+    boxVersion: int = 0
+    # Incremented on every state change; carried by snapshots/deltas
+    seq: int = 0
+
+    _name_index: dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _next_unmarked: int = field(default=0, init=False, repr=False, compare=False)
+
+    # ==================== ROSTER ====================
+
+    def set_competitors(self, competitors: list[dict]) -> None:
+        """Replace the roster and rebuild the name index and cursor."""
+        self.competitors = competitors
+        index: dict[str, int] = {}
+        for i, comp in enumerate(competitors):
+            # First occurrence wins, like the previous linear scan
+            index.setdefault(comp["nume"], i)
+        self._name_index = index
+        self._next_unmarked = 0
+        self._advance_cursor()
+
+    def find_competitor(
+        self, name: Optional[str] = None, idx: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Resolve a competitor to its roster index in O(1).
+
+        competitorIdx wins when it is in range and agrees with the name (or no
+        name is given); otherwise the name is looked up.
+        """
+        if idx is not None and 0 <= idx < len(self.competitors):
+            if name is None or self.competitors[idx].get("nume") == name:
+                return idx
+        if name is not None:
+            return self._name_index.get(name)
+        return None
+
+    def mark_competitor(self, idx: int) -> None:
+        self.competitors[idx]["marked"] = True
+        if idx == self._next_unmarked:
+            self._advance_cursor()
+
+    def next_unmarked_name(self) -> str:
+        """Name of the first competitor still to climb ("" when all are done)."""
+        if self._next_unmarked < len(self.competitors):
+            return self.competitors[self._next_unmarked]["nume"]
+        return ""
+
+    def _advance_cursor(self) -> None:
+        comps = self.competitors
+        i = self._next_unmarked
+        while i < len(comps) and comps[i].get("marked"):
+            i += 1
+        self._next_unmarked = i
+
+    # ==================== CHECKPOINT RECORDS ====================
+
+    def to_record(self) -> dict:
+        """
+        Compact, JSON-ready copy of the state (shares nothing mutable).
+
+        The roster is stored as a list of names plus the indexes of marked
+        competitors instead of one dict per competitor.
+        """
+        record = {name: getattr(self, name) for name in _SCALAR_FIELDS}
+        comps = self.competitors
+        record["names"] = [c["nume"] for c in comps]
+        record["marked"] = [i for i, c in enumerate(comps) if c.get("marked")]
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "BoxState":
+        """Rebuild a state written by to_record()."""
+        state = cls(**{name: record[name] for name in _SCALAR_FIELDS if name in record})
+        state.set_competitors(_roster_from_record(record))
+        return state
+
+    def update_from_record(self, record: dict) -> None:
+        """
+        Overwrite this state with a record, in place.
+
+        When the roster names are unchanged only the marked flags are updated,
+        so the competitors list keeps its identity (STATE_DELTA diffs rely on it).
+        """
+        for name in _SCALAR_FIELDS:
+            if name in record:
+                setattr(self, name, record[name])
+        names = record["names"]
+        comps = self.competitors
+        if len(comps) != len(names) or any(c["nume"] != name for c, name in zip(comps, names)):
+            self.set_competitors(_roster_from_record(record))
+            return
+        marked = set(record["marked"])
+        for i, comp in enumerate(comps):
+            comp["marked"] = i in marked
+        self._next_unmarked = 0
+        self._advance_cursor()
+
+    # ==================== DICT-STYLE ACCESS ====================
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_NAMES:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in _FIELD_NAMES:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELD_NAMES
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in _FIELD_NAMES:
+            return default
+        return getattr(self, key)
+
+    def copy(self) -> "BoxState":
+        """Shallow copy (the roster list is shared, like dict.copy())."""
+        clone = BoxState(**{name: getattr(self, name) for name in _FIELD_NAMES})
+        clone._name_index = self._name_index
+        clone._next_unmarked = self._next_unmarked
+        return clone
+
+
+def _roster_from_record(record: dict) -> list[dict]:
+    competitors = [{"nume": name, "marked": False} for name in record["names"]]
+    for i in record["marked"]:
+        competitors[i]["marked"] = True
+    return competitors
+
+
+_FIELD_NAMES = frozenset(f.name for f in fields(BoxState) if f.init)
+_SCALAR_FIELDS = tuple(f.name for f in fields(BoxState) if f.init and f.name != "competitors")
+
+
+__all__ = ["BoxState"]
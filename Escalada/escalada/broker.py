@@ -0,0 +1,262 @@
+"""
+State broker for multi-worker deployments
+Owns box state, per-box locks, the journal and checkpoints; every uvicorn
+worker started with STATE_BACKEND=broker connects to it over a Unix socket
+Run: poetry run python -m escalada.broker --socket data/broker.sock
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+from collections import deque
+from typing import Optional
+
+from escalada.api import live
+from escalada.backend import BROKER_LINE_LIMIT, BROKER_SOCKET
+from escalada.box_state import BoxState
+from escalada.journal import GLOBAL_KEY, Journal, box_key
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+    """One connected worker"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pid = None
+        # Box version this worker last received or sent; older caches get a record
+        self.known: dict[int, int] = {}
+        self.held: set[int] = set()
+
+    def send(self, message: dict) -> None:
+        line = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        self.send_line((line + "\n").encode("utf-8"))
+
+    def send_line(self, line: bytes) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(line)
+
+
+class Broker:
+    """
+    Serves box state to workers
+
+    The authoritative state is live.state_map of this process, so replay,
+    capture_state() and checkpoints work exactly as in a single worker.
+    Locks are granted in request order. A release that changed the box
+    carries the new state and its journal records; both are stored in one
+    synchronous step, so a checkpoint never sees one without the other.
+    """
+
+    def __init__(self, path: str = BROKER_SOCKET, journal: Optional[Journal] = None):
+        self.path = path
+        self.journal = journal
+        self.connections: set[_Connection] = set()
+        self.versions: dict[int, int] = {}
+        self._holders: dict[int, _Connection] = {}
+        self._waiters: dict[int, deque[tuple[_Connection, int]]] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+
+        # Counters (see GET /api/stats/backend on any worker)
+        self.grants = 0
+        self.contended = 0
+        self.releases = 0
+        self.published = 0
+
+    async def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            # Left over from a previous run; connecting to it would fail anyway
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._serve, self.path, limit=BROKER_LINE_LIMIT
+        )
+        logger.info(f"State broker listening on {self.path}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for conn in list(self.connections):
+                conn.writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = _Connection(writer)
+        self.connections.add(conn)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._handle(conn, json.loads(line), line)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Worker {conn.pid} connection lost: {e}")
+        finally:
+            self.connections.discard(conn)
+            for waiters in self._waiters.values():
+                for waiter in [w for w in waiters if w[0] is conn]:
+                    waiters.remove(waiter)
+            # A worker that died mid-command must not keep its boxes locked
+            for box_id in list(conn.held):
+                self._unlock(conn, box_id)
+            writer.close()
+            logger.info(f"Worker {conn.pid} disconnected")
+
+    def _handle(self, conn: _Connection, msg: dict, line: bytes) -> None:
+        op = msg.get("op")
+        if op == "publish":
+            # Forward the line untouched; workers decode it once
+            self.published += 1
+            for other in self.connections:
+                if other is not conn:
+                    other.send_line(line)
+        elif op == "acquire":
+            box_id = msg["box"]
+            if box_id in self._holders:
+                self.contended += 1
+                self._waiters.setdefault(box_id, deque()).append((conn, msg["id"]))
+            else:
+                self._grant(conn, box_id, msg["id"])
+        elif op == "release":
+            self._release(conn, msg)
+        elif op == "get":
+            conn.send(self._state_reply(conn, msg["box"], msg["id"]))
+        elif op == "global":
+            record = msg["record"]
+            live.time_criterion_enabled = bool(record["cmd"].get("timeCriterionEnabled"))
+            self._reply_when_durable(conn, msg["id"], self._append(GLOBAL_KEY, [record]))
+        elif op == "hello":
+            conn.pid = msg.get("pid")
+            logger.info(f"Worker {conn.pid} connected")
+            conn.send({"id": msg["id"], "timeCriterionEnabled": live.time_criterion_enabled})
+        elif op == "stats":
+            conn.send({"id": msg["id"], **self.stats()})
+        else:
+            logger.warning(f"Unknown broker op {op!r} from worker {conn.pid}")
+
+    def _state_reply(self, conn: _Connection, box_id: int, msg_id: int) -> dict:
+        state = live._ensure_state(box_id)
+        version = self.versions.get(box_id, 0)
+        reply = {"id": msg_id}
+        if conn.known.get(box_id) != version:
+            reply["record"] = state.to_record()
+            conn.known[box_id] = version
+        return reply
+
+    def _grant(self, conn: _Connection, box_id: int, msg_id: int) -> None:
+        self._holders[box_id] = conn
+        conn.held.add(box_id)
+        self.grants += 1
+        conn.send(self._state_reply(conn, box_id, msg_id))
+
+    def _release(self, conn: _Connection, msg: dict) -> None:
+        box_id = msg["box"]
+        if self._holders.get(box_id) is not conn:
+            logger.warning(f"Worker {conn.pid} released box {box_id} it does not hold")
+            return
+        self.releases += 1
+        record = msg.get("record")
+        if record is not None:
+            live.state_map[box_id] = BoxState.from_record(record)
+            version = self.versions.get(box_id, 0) + 1
+            self.versions[box_id] = version
+            conn.known[box_id] = version
+        if "id" in msg:
+            commit = self._append(box_key(box_id), msg.get("journal") or [])
+            self._reply_when_durable(conn, msg["id"], commit)
+        self._unlock(conn, box_id)
+
+    def _unlock(self, conn: _Connection, box_id: int) -> None:
+        conn.held.discard(box_id)
+        del self._holders[box_id]
+        waiters = self._waiters.get(box_id)
+        if waiters:
+            next_conn, msg_id = waiters.popleft()
+            self._grant(next_conn, box_id, msg_id)
+        elif waiters is not None:
+            del self._waiters[box_id]
+
+    def _append(self, key: str, records: list[dict]) -> Optional[asyncio.Future]:
+        commit = None
+        if self.journal is not None:
+            for record in records:
+                commit = self.journal.append(key, record)
+        return commit
+
+    def _reply_when_durable(
+        self, conn: _Connection, msg_id: int, commit: Optional[asyncio.Future]
+    ) -> None:
+        if commit is None:
+            conn.send({"id": msg_id, "ok": True})
+            return
+        # Journal records commit in order, so the last one covers the batch
+        commit.add_done_callback(lambda f: conn.send({"id": msg_id, "ok": bool(f.result())}))
+
+    def stats(self) -> dict:
+        stats = {
+            "workers": len(self.connections),
+            "boxes": len(live.state_map),
+            "locked": len(self._holders),
+            "grants": self.grants,
+            "contended": self.contended,
+            "releases": self.releases,
+            "published": self.published,
+        }
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        return stats
+
+
+async def serve(path: str = BROKER_SOCKET) -> None:
+    """Recover state, run the broker until SIGINT/SIGTERM, then checkpoint."""
+    from escalada.logging_config import log_path, setup_logging, stop_logging
+
+    # Before importing escalada.main, whose own setup_logging() is then a no-op
+    setup_logging(log_path("broker"))
+
+    from escalada.checkpoint import CHECKPOINT_PATH, Checkpointer
+    from escalada.journal import JOURNAL_ENABLED
+    from escalada.main import recover_state
+
+    journal = None
+    checkpointer = None
+    if JOURNAL_ENABLED:
+        journal = await recover_state()
+        journal.start()
+        checkpointer = Checkpointer(journal, live.capture_state, CHECKPOINT_PATH)
+        checkpointer.start()
+
+    broker = Broker(path, journal)
+    await broker.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("State broker shutting down...")
+    await broker.close()
+    if journal is not None:
+        await checkpointer.close()
+        await journal.close()
+    stop_logging()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--socket", default=BROKER_SOCKET)
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
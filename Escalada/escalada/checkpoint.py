@@ -0,0 +1,193 @@
+"""
+Periodic checkpoints of all box states
+A checkpoint plus the journal segments written after it rebuild state_map;
+the segments it covers are deleted once it is safely on disk
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from escalada.journal import Journal
+
+logger = logging.getLogger(__name__)
+
+# Bump when the payload layout changes; older servers refuse newer files
+CHECKPOINT_FORMAT = 1
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join("data", "checkpoint.json"))
+CHECKPOINT_INTERVAL_SEC = float(os.getenv("CHECKPOINT_INTERVAL_SEC", "60"))
+
+
+def write_checkpoint(path: str, payload: dict) -> int:
+    """
+    Atomically replace the checkpoint file (blocking; run off the event loop).
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return len(data)
+
+
+def load_checkpoint(path: str = CHECKPOINT_PATH) -> Optional[dict]:
+    """
+    Read the latest checkpoint (blocking).
+
+    Returns:
+        dict | None: The payload, or None if no checkpoint exists
+
+    Raises:
+        RuntimeError: If the file was written in an unknown format
+    """
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    if payload.get("format") != CHECKPOINT_FORMAT:
+        # The journal behind it is already compacted; starting empty would lose data
+        raise RuntimeError(
+            f"Checkpoint {path} has format {payload.get('format')}, "
+            f"expected {CHECKPOINT_FORMAT}"
+        )
+    return payload
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint every `interval` seconds when commands were journaled
+
+    Capturing the state and rotating the journal happen in the same
+    synchronous step, so the checkpoint contains exactly the records of the
+    generations it closes. Encoding, writing and compaction run off the loop.
+    """
+
+    def __init__(
+        self,
+        journal: Journal,
+        capture: Callable[[], dict],
+        path: str = CHECKPOINT_PATH,
+        interval: float = CHECKPOINT_INTERVAL_SEC,
+    ):
+        """
+        Args:
+            journal: Journal whose segments the checkpoint supersedes
+            capture: Returns a JSON-ready copy of the current state
+            path: Checkpoint file
+            interval: Seconds between checkpoints (<= 0 disables the timer)
+        """
+        self.journal = journal
+        self.capture = capture
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._last_appended = journal.appended
+
+        # Counters (see GET /api/stats/journal)
+        self.checkpoints = 0
+        self.last_generation: Optional[int] = None
+        self.last_bytes = 0
+        self.last_capture_ms = 0.0
+        self.last_write_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, final: bool = True) -> None:
+        """Stop the timer and, by default, write a last checkpoint."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if final:
+            await self.checkpoint()
+
+    async def checkpoint(self, force: bool = False) -> bool:
+        """
+        Write a checkpoint and compact the journal behind it.
+
+        Returns:
+            bool: False if skipped because nothing was journaled since the last one
+        """
+        async with self._lock:
+            if not force and self.journal.appended == self._last_appended:
+                return False
+
+            # ---- on the loop, no await: state and generation must match ----
+            started = time.perf_counter()
+            payload = self.capture()
+            generation = self.journal.rotate()
+            appended = self.journal.appended
+            payload["format"] = CHECKPOINT_FORMAT
+            payload["journal_generation"] = generation
+            payload["created"] = time.time()
+            captured = time.perf_counter()
+
+            # ---- off the loop ----
+            size = await asyncio.to_thread(write_checkpoint, self.path, payload)
+            await self.journal.compact(generation)
+
+            # Only now: a failed write must be retried on the next tick
+            self._last_appended = appended
+            self.checkpoints += 1
+            self.last_generation = generation
+            self.last_bytes = size
+            self.last_capture_ms = (captured - started) * 1000
+            self.last_write_ms = (time.perf_counter() - captured) * 1000
+            logger.info(
+                f"Checkpoint {generation}: {len(payload.get('boxes', {}))} boxes, "
+                f"{size} bytes, capture {self.last_capture_ms:.1f} ms"
+            )
+            return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                # Keep journaling; the next tick retries
+                logger.error(f"Checkpoint failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "interval_sec": self.interval,
+            "checkpoints": self.checkpoints,
+            "last_generation": self.last_generation,
+            "last_bytes": self.last_bytes,
+            "last_capture_ms": round(self.last_capture_ms, 3),
+            "last_write_ms": round(self.last_write_ms, 3),
+        }
+
+
+__all__ = [
+    "Checkpointer",
+    "CHECKPOINT_FORMAT",
+    "CHECKPOINT_PATH",
+    "CHECKPOINT_INTERVAL_SEC",
+    "load_checkpoint",
+    "write_checkpoint",
+]
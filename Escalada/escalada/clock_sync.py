@@ -0,0 +1,93 @@
+"""
+Per-connection round-trip time and clock offset from the heartbeat
+PING carries the server time; a PONG echoes it together with the client's own
+clock, which gives one NTP-style sample per round trip. The sample with the
+lowest RTT wins: it had the least room for one-way delay asymmetry
+"""
+
+import math
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# Round trips remembered per connection; the best of them is the estimate
+CLOCK_SYNC_SAMPLES = int(os.getenv("CLOCK_SYNC_SAMPLES", "8"))
+# PINGs sent one second apart right after connecting, so an estimate
+# exists long before the first regular heartbeat
+CLOCK_SYNC_BURST = int(os.getenv("CLOCK_SYNC_BURST", "4"))
+CLOCK_SYNC_BURST_INTERVAL_SEC = 1.0
+# Unanswered PINGs kept for matching (older ones count as lost)
+_MAX_PENDING = 4
+
+
+class ClockEstimate:
+    """
+    RTT and clock offset of one WebSocket client
+
+    offset_ms is client clock minus server clock, so a server instant T is
+    T + offset_ms on the client; its error is at most rtt_ms / 2.
+    """
+
+    def __init__(self, samples: int = CLOCK_SYNC_SAMPLES):
+        self.last_pong = time.monotonic()
+        # PING timestamp (server epoch ms) -> monotonic send time
+        self._pending: dict[int, float] = {}
+        self._samples: deque[tuple[float, float]] = deque(maxlen=samples)
+        self.rtt_ms: Optional[float] = None
+        self.offset_ms: Optional[float] = None
+        self.pongs = 0
+
+    def ping(self) -> dict:
+        """A PING payload, remembered so its PONG can be timed."""
+        timestamp = int(time.time() * 1000)
+        self._pending[timestamp] = time.monotonic()
+        while len(self._pending) > _MAX_PENDING:
+            del self._pending[next(iter(self._pending))]
+        return {"type": "PING", "timestamp": timestamp}
+
+    def pong(self, msg: dict) -> bool:
+        """
+        Record a PONG.
+
+        Every PONG proves the client is alive; one that echoes a pending PING
+        and carries clientTime also adds a sample. Returns True when the
+        estimate changed.
+        """
+        now = time.monotonic()
+        self.last_pong = now
+        self.pongs += 1
+        timestamp = msg.get("timestamp")
+        # Anything but an integer (a list, a dict) cannot be a PING we sent
+        if type(timestamp) is not int:
+            return False
+        sent = self._pending.pop(timestamp, None)
+        client_time = msg.get("clientTime")
+        if sent is None or type(client_time) not in (int, float) or not math.isfinite(client_time):
+            return False
+        rtt = (now - sent) * 1000
+        # The client read its clock about halfway through the round trip
+        offset = client_time - (timestamp + rtt / 2)
+        self._samples.append((rtt, offset))
+        best = min(self._samples)
+        if best == (self.rtt_ms, self.offset_ms):
+            return False
+        self.rtt_ms, self.offset_ms = best
+        return True
+
+    def frame(self) -> dict:
+        """CLOCK message telling the client how to map server instants."""
+        return {
+            "type": "CLOCK",
+            "offsetMs": round(self.offset_ms, 1),
+            "rttMs": round(self.rtt_ms, 1),
+            "serverTime": int(time.time() * 1000),
+        }
+
+
+__all__ = [
+    "CLOCK_SYNC_BURST",
+    "CLOCK_SYNC_BURST_INTERVAL_SEC",
+    "CLOCK_SYNC_SAMPLES",
+    "ClockEstimate",
+]
@@ -0,0 +1,297 @@
+"""
+Front dispatcher for box-partitioned workers
+Reads just the request head (and the body of POST /api/cmd), picks the
+worker that owns the box, then splices the two sockets together; WebSocket
+upgrades pass through untouched
+Run: poetry run python -m escalada.dispatcher --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+from typing import Optional
+
+from escalada.checkpoint import CHECKPOINT_PATH
+from escalada.history import HISTORY_DIR
+from escalada.journal import JOURNAL_DIR
+from escalada.logging_config import log_path
+from escalada.partition import HashRing
+
+logger = logging.getLogger(__name__)
+
+# Request heads larger than this are refused (431)
+MAX_HEAD_BYTES = 64 * 1024
+# Largest /api/cmd body parsed for routing; bigger bodies go to worker 0
+MAX_ROUTED_BODY = 256 * 1024
+PIPE_CHUNK = 64 * 1024
+
+_BOX_PATH = re.compile(r"^/api/(?:ws|state|history)/(-?\d+)(?:/events)?$")
+_CMD_PATHS = ("/api/cmd", "/api/cmd/batch")
+
+
+def _response(status: str, body: dict) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    return (
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n"
+    ).encode("ascii") + data
+
+
+class Dispatcher:
+    """
+    Routes requests to the worker owning their box
+
+    - /api/ws/{box_id}, /api/state/{box_id} and /api/history/{box_id}[/events]:
+      owner of box_id
+    - POST /api/cmd and /api/cmd/batch: owner of the body's boxId;
+      SET_TIME_CRITERION goes to every worker (each keeps its own flag)
+    - anything else: worker 0
+
+    Plain requests are forwarded with "Connection: close", so a keep-alive
+    client cannot send its next request (possibly for another box) down a
+    connection already bound to one worker.
+    """
+
+    def __init__(self, sockets: list[str], ring: Optional[HashRing] = None):
+        self.sockets = sockets
+        self.ring = ring or HashRing(len(sockets))
+        self._server: Optional[asyncio.base_events.Server] = None
+
+        # Counters (see GET /api/stats/dispatcher)
+        self.requests = [0] * len(sockets)
+        self.websockets = 0
+        self.fanouts = 0
+        self.errors = 0
+
+    async def start(self, host: str = "0.0.0.0", port: int = 8000):
+        self._server = await asyncio.start_server(self._serve, host, port, limit=MAX_HEAD_BYTES)
+        return self._server
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def route(self, method: str, path: str, body: bytes) -> list[int]:
+        """Workers for a request; the first one answers the client."""
+        match = _BOX_PATH.match(path)
+        if match:
+            return [self.ring.owner(int(match.group(1)))]
+        if method == "POST" and path in _CMD_PATHS and body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return [0]
+            if not isinstance(data, dict):
+                return [0]
+            if data.get("type") == "SET_TIME_CRITERION":
+                return list(range(len(self.sockets)))
+            box_id = data.get("boxId")
+            if isinstance(box_id, int):
+                return [self.ring.owner(box_id)]
+        return [0]
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.sockets),
+            "requests": self.requests,
+            "websockets": self.websockets,
+            "fanouts": self.fanouts,
+            "errors": self.errors,
+        }
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await self._dispatch(reader, writer)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Dispatch failed: {e}")
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            writer.write(_response("431 Request Header Fields Too Large", {}))
+            return
+        except asyncio.IncompleteReadError:
+            return
+
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        path = target.split("?", 1)[0]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        upgrade = headers.get("upgrade", "").lower() == "websocket"
+
+        if path == "/api/stats/dispatcher":
+            writer.write(_response("200 OK", self.stats()))
+            return
+
+        body = b""
+        length = int(headers.get("content-length") or 0)
+        if path in _CMD_PATHS and 0 < length <= MAX_ROUTED_BODY:
+            body = await reader.readexactly(length)
+
+        workers = self.route(method, path, body)
+        head = self._forward_head(lines, upgrade, writer)
+        for extra in workers[1:]:
+            self.fanouts += 1
+            asyncio.create_task(self._forward_only(extra, head + body))
+
+        worker = workers[0]
+        self.requests[worker] += 1
+        if upgrade:
+            self.websockets += 1
+        try:
+            w_reader, w_writer = await asyncio.open_unix_connection(self.sockets[worker])
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Worker {worker} unreachable: {e}")
+            writer.write(_response("502 Bad Gateway", {"detail": "worker unavailable"}))
+            return
+
+        w_writer.write(head + body)
+        try:
+            await _splice(reader, writer, w_reader, w_writer)
+        finally:
+            w_writer.close()
+
+    def _forward_head(self, lines: list[str], upgrade: bool, writer: asyncio.StreamWriter) -> bytes:
+        out = [lines[0]]
+        for line in lines[1:]:
+            if not line:
+                continue
+            name = line.split(":", 1)[0].strip().lower()
+            if name == "connection" and not upgrade:
+                continue
+            out.append(line)
+        if not upgrade:
+            out.append("Connection: close")
+        peer = writer.get_extra_info("peername")
+        if peer:
+            out.append(f"X-Forwarded-For: {peer[0]}")
+        return ("\r\n".join(out) + "\r\n\r\n").encode("latin-1")
+
+    async def _forward_only(self, worker: int, request: bytes) -> None:
+        """Send a copy of a request to another worker and discard the reply."""
+        try:
+            w_reader, w_writer = await asyncio.open_unix_connection(self.sockets[worker])
+            w_writer.write(request)
+            await w_writer.drain()
+            await w_reader.read()
+            w_writer.close()
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Fan-out to worker {worker} failed: {e}")
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    while True:
+        data = await reader.read(PIPE_CHUNK)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+
+
+async def _splice(
+    c_reader: asyncio.StreamReader,
+    c_writer: asyncio.StreamWriter,
+    w_reader: asyncio.StreamReader,
+    w_writer: asyncio.StreamWriter,
+) -> None:
+    """Copy bytes both ways until either side closes."""
+    upstream = asyncio.create_task(_pipe(c_reader, w_writer))
+    downstream = asyncio.create_task(_pipe(w_reader, c_writer))
+    try:
+        await asyncio.wait({upstream, downstream}, return_when=asyncio.FIRST_COMPLETED)
+        if upstream.done() and not downstream.done():
+            # Client finished sending; the response may still be on its way
+            if w_writer.can_write_eof():
+                w_writer.write_eof()
+            await downstream
+    finally:
+        for task in (upstream, downstream):
+            task.cancel()
+        await asyncio.gather(upstream, downstream, return_exceptions=True)
+
+
+def worker_env(index: int, count: int) -> dict:
+    """Environment of worker `index`: its partition, journal, history, checkpoint and log."""
+    root, ext = os.path.splitext(CHECKPOINT_PATH)
+    return {
+        "PARTITION_COUNT": str(count),
+        "PARTITION_INDEX": str(index),
+        # Each worker journals and keeps history for only the boxes it owns
+        "JOURNAL_DIR": os.path.join(JOURNAL_DIR, f"worker-{index}"),
+        "HISTORY_DIR": os.path.join(HISTORY_DIR, f"worker-{index}"),
+        "CHECKPOINT_PATH": f"{root}.worker-{index}{ext}",
+        # One writer per log file, or rotation in one process loses the others' lines
+        "LOG_FILE": log_path(f"worker-{index}"),
+    }
+
+
+async def serve(workers: int, host: str, port: int, socket_dir: str) -> None:
+    """Start the workers on Unix sockets and dispatch to them until SIGTERM."""
+    from escalada.logging_config import setup_logging, stop_logging
+
+    setup_logging(log_path("dispatcher"))
+    os.makedirs(socket_dir, exist_ok=True)
+    sockets = [os.path.join(socket_dir, f"worker-{i}.sock") for i in range(workers)]
+    procs = []
+    for i, path in enumerate(sockets):
+        if os.path.exists(path):
+            os.remove(path)
+        procs.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "escalada.main:app", "--uds", path],
+                env={**os.environ, **worker_env(i, workers)},
+            )
+        )
+    while not all(os.path.exists(path) for path in sockets):
+        if any(proc.poll() is not None for proc in procs):
+            raise RuntimeError("A worker exited during startup")
+        await asyncio.sleep(0.1)
+
+    dispatcher = Dispatcher(sockets)
+    await dispatcher.start(host, port)
+    logger.info(f"Dispatching {host}:{port} to {workers} workers")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await dispatcher.close()
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        await asyncio.to_thread(proc.wait)
+    stop_logging()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket-dir", default=os.path.join("data", "workers"))
+    args = parser.parse_args()
+    asyncio.run(serve(args.workers, args.host, args.port, args.socket_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Bounded per-box history of outbound WebSocket frames
+Every frame broadcast on a box gets the next event sequence number; a client
+reconnecting with ?since=<eventSeq> is sent only the frames it missed
+"""
+
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# Frames kept per box; an older gap falls back to a full snapshot
+EVENT_RING_SIZE = int(os.getenv("WS_RESUME_BUFFER", "256"))
+
+
+class EventRing:
+    """
+    Last `maxlen` frames of one box, numbered consecutively
+
+    Numbering starts at the creation time in microseconds, so a number from
+    an earlier ring (previous process, another worker, an evicted box) is
+    always below first_seq and reads as "evicted" instead of matching frames
+    it never saw.
+    """
+
+    def __init__(self, maxlen: int = EVENT_RING_SIZE):
+        self.last = time.time_ns() // 1000
+        # (seq, text, is_snapshot)
+        self._events: deque[tuple[int, str, bool]] = deque(maxlen=maxlen)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def next_seq(self) -> int:
+        """Number the next frame; store it with append() once encoded."""
+        self.last += 1
+        return self.last
+
+    def append(self, seq: int, text: str, snapshot: bool = False) -> None:
+        self._events.append((seq, text, snapshot))
+
+    def since(self, seq: int) -> Optional[list[tuple[str, bool]]]:
+        """
+        Frames after `seq`, oldest first.
+
+        Returns:
+            list | None: (text, is_snapshot) pairs (empty if nothing was
+            missed), or None if the gap is no longer buffered or `seq` is unknown
+        """
+        if seq == self.last:
+            return []
+        if not self._events or seq > self.last or seq < self._events[0][0] - 1:
+            return None
+        start = seq - self._events[0][0] + 1
+        return [(text, snap) for _, text, snap in list(self._events)[start:]]
+
+
+__all__ = ["EVENT_RING_SIZE", "EventRing"]
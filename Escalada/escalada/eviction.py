@@ -0,0 +1,216 @@
+"""
+Idle box eviction and per-structure memory accounting
+Any box id a client asks about gets a registry entry (state, lock, channel,
+delta base, event ring); boxes nobody has used for BOX_IDLE_TTL_SEC and
+nobody is watching are dropped again. Boxes that never saw a command are just
+forgotten; used ones are first spilled to disk when a SpillStore is attached
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from escalada.checkpoint import write_checkpoint
+
+logger = logging.getLogger(__name__)
+
+# Seconds without commands or reads before an unwatched box is evicted (0 = never)
+BOX_IDLE_TTL_SEC = float(os.getenv("BOX_IDLE_TTL_SEC", "600"))
+BOX_EVICT_INTERVAL_SEC = float(os.getenv("BOX_EVICT_INTERVAL_SEC", "60"))
+# Spill used boxes to BOX_SPILL_DIR instead of keeping them until restart
+BOX_SPILL_ENABLED = os.getenv("BOX_SPILL_ENABLED", "0") == "1"
+BOX_SPILL_DIR = os.getenv("BOX_SPILL_DIR", os.path.join("data", "spill"))
+
+# Entries measured per structure for the memory report; larger ones are
+# extrapolated from this sample
+MEMORY_SAMPLE = 256
+
+
+def approx_size(obj: object, _seen: Optional[set[int]] = None) -> int:
+    """Deep sys.getsizeof of containers, slotted objects and their contents."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += approx_size(key, seen) + approx_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        for item in obj:
+            size += approx_size(item, seen)
+    elif isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        pass
+    else:
+        for name in getattr(type(obj), "__slots__", ()):
+            size += approx_size(getattr(obj, name, None), seen)
+        if hasattr(obj, "__dict__"):
+            size += approx_size(vars(obj), seen)
+    return size
+
+
+def shallow_size(obj: object) -> int:
+    """Size of an object and its direct members only (locks, sockets)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (set, list)):
+        size += sum(shallow_size(item) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += sys.getsizeof(vars(obj))
+    return size
+
+
+def measure(registry: dict, size_of: Callable[[object], int] = approx_size) -> dict:
+    """Entry count and approximate bytes of a box-keyed registry."""
+    entries = len(registry)
+    size = sys.getsizeof(registry)
+    if entries:
+        sample = [registry[k] for _, k in zip(range(MEMORY_SAMPLE), registry)]
+        per_entry = sum(size_of(v) for v in sample) / len(sample)
+        size += int(per_entry * entries) + entries * sys.getsizeof(0)
+    return {"entries": entries, "bytes": size}
+
+
+class SpillStore:
+    """
+    Evicted box records, one JSON file per box
+
+    A record is written (and fsynced) before its box leaves memory, so the
+    checkpoints that no longer contain the box never lose it. Files are not
+    removed when a box comes back: until the next checkpoint holds the box
+    again, the file is what recovery starts from.
+    """
+
+    def __init__(self, directory: str = BOX_SPILL_DIR):
+        self.directory = directory
+        self.ids: set[int] = set()
+
+        # Counters (see GET /api/stats/memory)
+        self.spilled = 0
+        self.loaded = 0
+
+    def open(self) -> None:
+        """Create the directory and index the boxes already in it (blocking)."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".json" and stem.startswith("box_"):
+                self.ids.add(int(stem[len("box_") :]))
+
+    def path(self, box_id: int) -> str:
+        return os.path.join(self.directory, f"box_{box_id}.json")
+
+    async def save(self, box_id: int, record: dict) -> None:
+        await asyncio.to_thread(write_checkpoint, self.path(box_id), record)
+        self.ids.add(box_id)
+        self.spilled += 1
+
+    def load(self, box_id: int) -> Optional[dict]:
+        """
+        The spilled record of a box, or None if it was never spilled.
+
+        Blocking, but only runs once for a box that sat idle for the TTL.
+        """
+        if box_id not in self.ids:
+            return None
+        with open(self.path(box_id), "rb") as f:
+            record = json.loads(f.read())
+        self.loaded += 1
+        return record
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "boxes": len(self.ids),
+            "spilled": self.spilled,
+            "loaded": self.loaded,
+        }
+
+
+class BoxEvictor:
+    """
+    Runs the eviction sweep every `interval` seconds
+
+    The sweep itself lives next to the registries (live.evict_idle_boxes);
+    this only schedules it and keeps the totals.
+    """
+
+    def __init__(
+        self,
+        sweep: Callable[[float], Awaitable[dict]],
+        ttl: float = BOX_IDLE_TTL_SEC,
+        interval: float = BOX_EVICT_INTERVAL_SEC,
+    ):
+        self.sweep = sweep
+        self.ttl = ttl
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters (see GET /api/stats/memory)
+        self.sweeps = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.last_sweep_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None and self.ttl > 0 and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> dict:
+        started = time.perf_counter()
+        result = await self.sweep(self.ttl)
+        self.sweeps += 1
+        self.evicted += result["evicted"]
+        self.spilled += result["spilled"]
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        if result["evicted"]:
+            logger.info(
+                f"Evicted {result['evicted']} idle boxes "
+                f"({result['spilled']} spilled) in {self.last_sweep_ms:.1f} ms"
+            )
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                # A failed spill keeps the box in memory; the next tick retries
+                logger.error(f"Box eviction failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "ttl_sec": self.ttl,
+            "interval_sec": self.interval,
+            "sweeps": self.sweeps,
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "last_sweep_ms": round(self.last_sweep_ms, 3),
+        }
+
+
+__all__ = [
+    "BOX_EVICT_INTERVAL_SEC",
+    "BOX_IDLE_TTL_SEC",
+    "BOX_SPILL_DIR",
+    "BOX_SPILL_ENABLED",
+    "BoxEvictor",
+    "SpillStore",
+    "approx_size",
+    "measure",
+    "shallow_size",
+]
@@ -0,0 +1,375 @@
+"""
+Per-box command history for "what did the screen show at N" queries
+Unlike the journal, history is never compacted: one JSON-lines file per box
+holds every applied command plus a full state keyframe every
+HISTORY_KEYFRAME_INTERVAL commands, so any point is one keyframe plus a
+bounded replay away
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional
+
+from escalada.box_state import BoxState
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join("data", "history"))
+# Commands between keyframes: the most a query ever replays
+HISTORY_KEYFRAME_INTERVAL = int(os.getenv("HISTORY_KEYFRAME_INTERVAL", "64"))
+# Decoded keyframe segments kept in memory (repeated appeal queries)
+HISTORY_CACHE_SEGMENTS = 64
+# Bytes read per step when streaming a range
+HISTORY_READ_CHUNK = 256 * 1024
+
+# Unix timestamps are above this; smaller numbers are sequence numbers
+_TIMESTAMP_MIN = 1_000_000_000
+
+
+def parse_point(value: str) -> tuple[str, float]:
+    """
+    Parse a history point: a box seq, a Unix timestamp or an ISO 8601 time.
+
+    Returns:
+        tuple: ("seq", n) or ("ts", unix_seconds)
+
+    Raises:
+        ValueError: If the value is none of those
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        return "ts", datetime.fromisoformat(value).timestamp()
+    if number >= _TIMESTAMP_MIN:
+        return "ts", number
+    if not number.is_integer() or number < 0:
+        raise ValueError(f"Invalid sequence number {value!r}")
+    return "seq", int(number)
+
+
+class _BoxIndex:
+    """Where a box's keyframes are in its file"""
+
+    def __init__(self):
+        self.size = 0
+        self.keyframe_seq: list[int] = []
+        self.keyframe_ts: list[float] = []
+        self.keyframe_offset: list[int] = []
+        self.since_keyframe = 0
+        self.last_seq = -1
+        self.last_ts = 0.0
+
+    def add(self, entry: dict, offset: int, length: int) -> None:
+        if "state" in entry:
+            self.keyframe_seq.append(entry["seq"])
+            self.keyframe_ts.append(entry["ts"])
+            self.keyframe_offset.append(offset)
+            self.since_keyframe = 0
+        else:
+            self.since_keyframe += 1
+        self.last_seq = entry["seq"]
+        self.last_ts = entry["ts"]
+        self.size = offset + length
+
+
+class HistoryLog:
+    """
+    Append-only per-box history with keyframes
+
+    record() only encodes the entry and queues it (no I/O on the loop); a
+    writer task appends queued lines from a worker thread. The keyframe index
+    (seq, time, byte offset) is kept in memory and rebuilt from the files on
+    start. A query finds the last keyframe at or before the point and
+    replays at most HISTORY_KEYFRAME_INTERVAL commands from it.
+    """
+
+    def __init__(
+        self,
+        directory: str = HISTORY_DIR,
+        interval: int = HISTORY_KEYFRAME_INTERVAL,
+    ):
+        self.directory = directory
+        self.interval = interval
+        self._index: dict[int, _BoxIndex] = {}
+        # (box_id, line); line None = archive the box's file
+        self._pending: list[tuple[int, Optional[bytes]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._files: dict[int, object] = {}
+        self._segments: OrderedDict[tuple[int, int], list[dict]] = OrderedDict()
+
+        # Counters (see GET /api/stats/history)
+        self.recorded = 0
+        self.keyframes = 0
+        self.queries = 0
+        self.replayed = 0
+        self.cache_hits = 0
+
+    def path(self, box_id: int) -> str:
+        return os.path.join(self.directory, f"box_{box_id}.jsonl")
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(self._load_index)
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await self.flush()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _load_index(self) -> None:
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext != ".jsonl" or not stem.startswith("box_"):
+                continue
+            path = os.path.join(self.directory, name)
+            index = _BoxIndex()
+            offset = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    index.add(json.loads(line), offset, len(line))
+                    offset += len(line)
+            if os.path.getsize(path) > offset:
+                # Torn last line from a crash: appends must start on a line
+                os.truncate(path, offset)
+            self._index[int(stem[len("box_") :])] = index
+
+    # ==================== WRITING ====================
+
+    def record(self, box_id: int, state: BoxState, record: dict) -> None:
+        """Add an applied journal record; `state` is the box right after it."""
+        index = self._index.get(box_id)
+        if index is None:
+            index = self._index[box_id] = _BoxIndex()
+        elif state.seq <= index.last_seq:
+            # The box started over (its state was lost); keyframes are found
+            # by seq, so the old history moves aside instead of mixing in
+            index = self._index[box_id] = _BoxIndex()
+            self._pending.append((box_id, None))
+            for key in [k for k in self._segments if k[0] == box_id]:
+                del self._segments[key]
+        ts = time.time()
+        self._queue(
+            box_id,
+            index,
+            {"seq": state.seq, "ts": ts, "cmd": record["cmd"], "sid": record["sid"]},
+        )
+        self.recorded += 1
+        if not index.keyframe_seq or index.since_keyframe >= self.interval:
+            self._queue(box_id, index, {"seq": state.seq, "ts": ts, "state": state.to_record()})
+            self.keyframes += 1
+
+    def _queue(self, box_id: int, index: _BoxIndex, entry: dict) -> None:
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        index.add(entry, index.size, len(line))
+        self._pending.append((box_id, line))
+        if self._wakeup is not None:
+            self._idle.clear()
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Wait until everything recorded so far is in the files."""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    await asyncio.to_thread(self._write, batch)
+                except OSError as e:
+                    logger.error(f"History write failed: {e}")
+            self._idle.set()
+
+    def _write(self, batch: list[tuple[int, Optional[bytes]]]) -> None:
+        lines: dict[int, list[bytes]] = {}
+        for box_id, line in batch:
+            if line is None:
+                self._append(box_id, lines.pop(box_id, []))
+                self._archive(box_id)
+            else:
+                lines.setdefault(box_id, []).append(line)
+        for box_id, chunk in lines.items():
+            self._append(box_id, chunk)
+
+    def _append(self, box_id: int, chunk: list[bytes]) -> None:
+        if not chunk:
+            return
+        f = self._files.get(box_id)
+        if f is None:
+            f = self._files[box_id] = open(self.path(box_id), "ab")
+        f.write(b"".join(chunk))
+        f.flush()
+
+    def _archive(self, box_id: int) -> None:
+        f = self._files.pop(box_id, None)
+        if f is not None:
+            f.close()
+        path = self.path(box_id)
+        if os.path.exists(path):
+            os.replace(path, f"{path}.{time.time_ns()}")
+
+    # ==================== READING ====================
+
+    def last_point(self, box_id: int) -> Optional[tuple[int, float]]:
+        """(seq, ts) of the newest entry for a box, or None without history."""
+        index = self._index.get(box_id)
+        if index is None or index.last_seq < 0:
+            return None
+        return index.last_seq, index.last_ts
+
+    def _keyframe_before(self, index: _BoxIndex, field: str, value: float) -> int:
+        keys = index.keyframe_seq if field == "seq" else index.keyframe_ts
+        return bisect.bisect_right(keys, value) - 1
+
+    async def _segment(self, box_id: int, index: _BoxIndex, i: int) -> list[dict]:
+        """Entries from keyframe i up to (not including) keyframe i + 1."""
+        start = index.keyframe_offset[i]
+        complete = i + 1 < len(index.keyframe_offset)
+        key = (box_id, start)
+        if complete and key in self._segments:
+            self._segments.move_to_end(key)
+            self.cache_hits += 1
+            return self._segments[key]
+        end = index.keyframe_offset[i + 1] if complete else index.size
+        data = await asyncio.to_thread(self._read, box_id, start, end - start)
+        entries = [json.loads(line) for line in data.splitlines()]
+        if complete:
+            # Closed segments never change
+            self._segments[key] = entries
+            if len(self._segments) > HISTORY_CACHE_SEGMENTS:
+                self._segments.popitem(last=False)
+        return entries
+
+    def _read(self, box_id: int, offset: int, length: int) -> bytes:
+        with open(self.path(box_id), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    async def state_at(
+        self,
+        box_id: int,
+        field: str,
+        value: float,
+        apply: Callable[[BoxState, dict], None],
+    ) -> Optional[tuple[BoxState, dict]]:
+        """
+        Rebuild a box as it was at a point.
+
+        Args:
+            field: "seq" or "ts"
+            value: Last seq / latest time to include
+            apply: Applies one command entry to a state (as journal replay does)
+
+        Returns:
+            tuple | None: (state, info) or None if the point predates the history
+        """
+        await self.flush()
+        index = self._index.get(box_id)
+        if index is None:
+            return None
+        i = self._keyframe_before(index, field, value)
+        if i < 0:
+            return None
+        self.queries += 1
+        entries = await self._segment(box_id, index, i)
+        keyframe = entries[0]
+        state = BoxState.from_record(keyframe["state"])
+        ts = keyframe["ts"]
+        replayed = 0
+        for entry in entries[1:]:
+            if "state" in entry or entry[field] > value:
+                break
+            apply(state, entry)
+            ts = entry["ts"]
+            replayed += 1
+        self.replayed += replayed
+        return state, {"ts": ts, "keyframeSeq": keyframe["seq"], "replayed": replayed}
+
+    async def events(
+        self,
+        box_id: int,
+        start: Optional[tuple[str, float]] = None,
+        end: Optional[tuple[str, float]] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield the command entries between two points (inclusive) as JSON lines."""
+        await self.flush()
+        index = self._index.get(box_id)
+        if index is None:
+            return
+        offset = 0
+        if start is not None:
+            i = self._keyframe_before(index, *start)
+            if i >= 0:
+                offset = index.keyframe_offset[i]
+        stop = index.size
+        rest = b""
+        while offset < stop:
+            data = await asyncio.to_thread(
+                self._read, box_id, offset, min(HISTORY_READ_CHUNK, stop - offset)
+            )
+            offset += len(data)
+            lines = (rest + data).split(b"\n")
+            rest = lines.pop()
+            out = []
+            for line in lines:
+                entry = json.loads(line)
+                if "state" in entry:
+                    continue
+                if start is not None and entry[start[0]] < start[1]:
+                    continue
+                if end is not None and entry[end[0]] > end[1]:
+                    if out:
+                        yield b"".join(out)
+                    return
+                out.append(line + b"\n")
+            if out:
+                yield b"".join(out)
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "boxes": len(self._index),
+            "keyframe_interval": self.interval,
+            "recorded": self.recorded,
+            "keyframes": self.keyframes,
+            "queries": self.queries,
+            "replayed": self.replayed,
+            "cache_hits": self.cache_hits,
+            "cached_segments": len(self._segments),
+            "pending": len(self._pending),
+        }
+
+
+__all__ = [
+    "HISTORY_DIR",
+    "HISTORY_ENABLED",
+    "HISTORY_KEYFRAME_INTERVAL",
+    "HistoryLog",
+    "parse_point",
+]
@@ -0,0 +1,251 @@
+"""
+Append-only command journal
+One JSON-lines file per box and generation; a single writer task group-commits
+appends so concurrent commands share one write+fsync per file
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "1") == "1"
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join("data", "journal"))
+# Set to 0 to skip fsync (records still reach the OS page cache in order)
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") == "1"
+
+GLOBAL_KEY = "global"
+
+
+def box_key(box_id: int) -> str:
+    return f"box_{box_id}"
+
+
+def _parse_segment(name: str) -> tuple[str, int] | None:
+    """'box_1.3.jsonl' -> ('box_1', 3); files without a generation are generation 0."""
+    if not name.endswith(".jsonl"):
+        return None
+    stem = name[: -len(".jsonl")]
+    key, _, gen = stem.rpartition(".")
+    if key and gen.isdigit():
+        return key, int(gen)
+    return stem, 0
+
+
+class Journal:
+    """
+    Per-box append-only journal with group commit
+
+    append() only encodes the record and queues it; it returns a future that
+    completes once the record is on disk. The writer task takes everything
+    queued so far, writes it from a worker thread and fsyncs each touched file
+    once, so N taps arriving during one fsync cost one more fsync, not N.
+
+    Records go to the segment of the current generation. rotate() starts a new
+    generation (a checkpoint covers everything before it) and compact() drops
+    the segments a checkpoint made redundant.
+    """
+
+    def __init__(self, directory: str = JOURNAL_DIR, fsync: bool = JOURNAL_FSYNC):
+        self.directory = directory
+        self.fsync = fsync
+        self.generation = 1
+        # (key, generation, line, future); key None = drop segments <= generation
+        self._pending: list[tuple[Optional[str], int, bytes, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._files: dict[tuple[str, int], object] = {}
+        self._closing = False
+
+        # Counters (see GET /api/stats/journal)
+        self.appended = 0
+        self.records = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.bytes_written = 0
+        self.failures = 0
+
+    def path(self, key: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{key}.{generation}.jsonl")
+
+    def segments(self) -> list[tuple[str, int, str]]:
+        """(key, generation, filename) of every segment on disk, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            parsed = _parse_segment(name)
+            if parsed is not None:
+                found.append((parsed[0], parsed[1], name))
+        found.sort(key=lambda seg: (seg[1], seg[0]))
+        return found
+
+    # ==================== WRITING ====================
+
+    def start(self) -> None:
+        """Start the writer task (requires a running event loop)."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Never append to a segment that existed before this process started
+        for _, generation, _ in self.segments():
+            self.generation = max(self.generation, generation + 1)
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def append(self, key: str, record: dict) -> asyncio.Future:
+        """
+        Queue a record for the journal file `key`.
+
+        Returns:
+            Future[bool]: True once the record is durable, False if writing failed
+        """
+        future = asyncio.get_running_loop().create_future()
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        self._pending.append((key, self.generation, (line + "\n").encode("utf-8"), future))
+        self.appended += 1
+        self._wakeup.set()
+        return future
+
+    def rotate(self) -> int:
+        """
+        Start a new generation; later appends go to new segments.
+
+        Returns:
+            int: The generation that was just closed
+        """
+        closed = self.generation
+        self.generation += 1
+        return closed
+
+    async def compact(self, upto: int) -> bool:
+        """
+        Delete every segment with generation <= upto.
+
+        Queued behind all earlier appends, so it runs after they are written.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((None, upto, b"", future))
+        self._wakeup.set()
+        return await future
+
+    async def close(self) -> None:
+        """Commit everything queued, stop the writer and close the files."""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self._close_files)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                ok = True
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Journal write failed ({len(batch)} records): {e}")
+                ok = False
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_result(ok)
+
+    def _write_batch(self, batch: list) -> None:
+        # Runs in a worker thread: group lines per file, one write+fsync each
+        grouped: dict[tuple[str, int], list[bytes]] = {}
+        compact_upto = None
+        records = 0
+        for key, generation, data, _ in batch:
+            if key is None:
+                compact_upto = max(compact_upto or 0, generation)
+                continue
+            grouped.setdefault((key, generation), []).append(data)
+            records += 1
+
+        for (key, generation), chunks in grouped.items():
+            f = self._files.get((key, generation))
+            if f is None:
+                f = open(self.path(key, generation), "ab")
+                self._files[(key, generation)] = f
+            data = b"".join(chunks)
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+                self.fsyncs += 1
+            self.bytes_written += len(data)
+
+        self.records += records
+        self.batches += 1
+        if compact_upto is not None:
+            self._drop_segments(compact_upto)
+
+    def _drop_segments(self, upto: int) -> None:
+        for (key, generation), f in list(self._files.items()):
+            if generation <= upto:
+                f.close()
+                del self._files[(key, generation)]
+        for key, generation, name in self.segments():
+            if generation <= upto:
+                os.remove(os.path.join(self.directory, name))
+
+    def _close_files(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    # ==================== READING ====================
+
+    def read(self, after: int = -1) -> dict[str, list[dict]]:
+        """
+        Load the segments with generation > after, in append order per key.
+
+        A torn last line (crash mid-write) or any undecodable line is skipped.
+        """
+        journals: dict[str, list[dict]] = {}
+        for key, generation, name in self.segments():
+            if generation <= after:
+                continue
+            records = journals.setdefault(key, [])
+            with open(os.path.join(self.directory, name), "rb") as f:
+                for lineno, line in enumerate(f, 1):
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping bad journal line {name}:{lineno}")
+        return journals
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "fsync": self.fsync,
+            "generation": self.generation,
+            "appended": self.appended,
+            "records": self.records,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "bytes_written": self.bytes_written,
+            "failures": self.failures,
+            "pending": len(self._pending),
+        }
+
+
+__all__ = [
+    "Journal",
+    "JOURNAL_ENABLED",
+    "JOURNAL_DIR",
+    "JOURNAL_FSYNC",
+    "GLOBAL_KEY",
+    "box_key",
+]
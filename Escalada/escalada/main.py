@@ -1,25 +1,60 @@
+import asyncio
 import logging
 import os
-import sys
 from contextlib import asynccontextmanager
-from time import time
-
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from time import perf_counter
 
+from escalada.api import live
+from escalada.api.history import router as history_router
 from escalada.api.live import router as live_router
 from escalada.api.podium import router as podium_router
 from escalada.api.save_ranking import router as save_ranking_router
+from escalada.backend import STATE_BACKEND, BrokerBackend
+from escalada.checkpoint import CHECKPOINT_PATH, Checkpointer, load_checkpoint
+from escalada.eviction import BOX_SPILL_ENABLED, BoxEvictor, SpillStore
+from escalada.history import HISTORY_DIR, HISTORY_ENABLED, HistoryLog
+from escalada.journal import JOURNAL_DIR, JOURNAL_ENABLED, Journal
+from escalada.logging_config import log_path, setup_logging, stop_logging
+from escalada.rate_limit import RateLimitSweeper, get_rate_limiter
+from escalada.rate_limit_middleware import RateLimitMiddleware
+from escalada.replication import REPLICATION_ROLE, Replica, ReplicationSource
+from escalada.results_store import close_results_store
 from escalada.routers.upload import router as upload_router
+from escalada.timer_engine import TIMER_ENGINE_ENABLED, TimerEngine
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler("escalada.log")],
-)
+# uvicorn --workers N runs N copies of this module with one LOG_FILE; with
+# the broker backend each process logs to its own file (LOG_FILE.pid-<pid>)
+LOG_PATH = log_path(f"pid-{os.getpid()}") if STATE_BACKEND == "broker" else None
+
+# Configure logging (queue-backed; file writes happen on a background thread)
+setup_logging(LOG_PATH)
 
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("escalada.access")
+
+
+async def recover_state(
+    journal_dir: str | None = None, checkpoint_path: str | None = None
+) -> Journal:
+    """Rebuild state_map from the latest checkpoint plus the journal tail."""
+    started = perf_counter()
+    journal = Journal(journal_dir or JOURNAL_DIR)
+    checkpoint = await asyncio.to_thread(load_checkpoint, checkpoint_path or CHECKPOINT_PATH)
+    after = -1
+    if checkpoint is not None:
+        live.restore_state(checkpoint)
+        after = checkpoint["journal_generation"]
+        journal.generation = after + 1
+    journals = await asyncio.to_thread(journal.read, after)
+    replayed = live.replay_journal(journals)
+    logger.info(
+        f"Recovered {len(live.state_map)} boxes "
+        f"(checkpoint: {'generation ' + str(after) if checkpoint else 'none'}, "
+        f"{replayed} journal records) in {perf_counter() - started:.3f}s"
+    )
+    return journal
 
 
 # Define application lifespan (replaces deprecated @app.on_event)
@@ -27,10 +62,91 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events for the FastAPI application"""
     # Startup logic
+    setup_logging(LOG_PATH)
     logger.info("🚀 Escalada API starting up...")
+    journal = None
+    checkpointer = None
+    if BOX_SPILL_ENABLED and JOURNAL_ENABLED and STATE_BACKEND != "broker" and not REPLICATION_ROLE:
+        # Before recovery: journal records may continue a spilled box. A
+        # standby would never see the primary's spilled boxes, hence no spill
+        # with replication
+        live.spill = SpillStore()
+        await asyncio.to_thread(live.spill.open)
+    if STATE_BACKEND == "broker":
+        # State, journal and checkpoints live in the broker (escalada.broker)
+        backend = BrokerBackend(live.state_map)
+        backend.on_message = live.handle_backend_message
+        await backend.start()
+        live.time_criterion_enabled = bool(backend.globals.get("timeCriterionEnabled"))
+        live.backend = backend
+    elif JOURNAL_ENABLED:
+        if REPLICATION_ROLE == "replica":
+            # The primary's snapshot supersedes whatever is on disk
+            journal = Journal(JOURNAL_DIR)
+        else:
+            journal = await recover_state()
+        journal.start()
+        checkpointer = Checkpointer(journal, live.capture_state, CHECKPOINT_PATH)
+        checkpointer.start()
+        live.journal = journal
+        live.checkpointer = checkpointer
+    if HISTORY_ENABLED and STATE_BACKEND != "broker":
+        # With the broker each worker would only see its own commands
+        live.history = HistoryLog(HISTORY_DIR)
+        await live.history.start()
+    if STATE_BACKEND != "broker":
+        live.evictor = BoxEvictor(live.evict_idle_boxes)
+        live.evictor.start()
+    live.rate_sweeper = RateLimitSweeper(get_rate_limiter())
+    live.rate_sweeper.start()
+    if TIMER_ENGINE_ENABLED and STATE_BACKEND != "broker":
+        # One scheduler per process; with the broker every worker would tick
+        live.timers = TimerEngine(live.deliver_timer_ticks, live.expire_timer)
+        live.timers.start()
+        if REPLICATION_ROLE != "replica":
+            # A standby arms its timers when promoted
+            live.arm_timers()
+    if REPLICATION_ROLE == "primary":
+        live.replication = ReplicationSource(live.capture_state)
+        await live.replication.start()
+    elif REPLICATION_ROLE == "replica":
+        live.read_only = True
+        live.replica = Replica(live.restore_replicated, live.apply_replicated)
+        live.replica.start()
     yield
     # Shutdown logic
     logger.info("🛑 Escalada API shutting down...")
+    if live.timers is not None:
+        await live.timers.close()
+        live.timers = None
+    if live.evictor is not None:
+        await live.evictor.close()
+        live.evictor = None
+    if live.rate_sweeper is not None:
+        await live.rate_sweeper.close()
+        live.rate_sweeper = None
+    if live.replica is not None:
+        await live.replica.close()
+        live.replica = None
+        live.read_only = False
+    if live.replication is not None:
+        await live.replication.close()
+        live.replication = None
+    if live.history is not None:
+        await live.history.close()
+        live.history = None
+    if journal is not None:
+        # Final checkpoint so the next start has (almost) no journal to replay
+        await checkpointer.close()
+        live.journal = None
+        live.checkpointer = None
+        await journal.close()
+    live.spill = None
+    if live.backend is not live.local_backend:
+        await live.backend.close()
+        live.backend = live.local_backend
+    close_results_store()
+    stop_logging()
 
 
 app = FastAPI(
@@ -39,15 +155,16 @@ app = FastAPI(
 )
 
 # Secure CORS configuration
-DEFAULT_ORIGINS = (
-    "http://localhost:5173,http://localhost:3000,http://192.168.100.205:5173"
-)
+DEFAULT_ORIGINS = "http://localhost:5173,http://localhost:3000,http://192.168.100.205:5173"
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", DEFAULT_ORIGINS).split(",")
 
 # Allow localhost, 127.0.0.1, local network IPs, and .local hostnames
 DEFAULT_ORIGIN_REGEX = r"^https?://(localhost|127\.0\.0\.1|[a-zA-Z0-9-]+\.local|192\.168\.\d{1,3}\.\d{1,3}|10\.\d{1,3}\.\d{1,3}\.\d{1,3})(:\d+)?$"
 ALLOWED_ORIGIN_REGEX = os.getenv("ALLOWED_ORIGIN_REGEX", DEFAULT_ORIGIN_REGEX)
 
+# Inside CORS and request logging, so its 429/413 answers get both
+app.add_middleware(RateLimitMiddleware, enabled=lambda: live.VALIDATION_ENABLED)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
@@ -61,31 +178,39 @@ app.add_middleware(
 # Custom middleware for request logging
 @app.middleware("http")
 async def log_requests(request, call_next):
-    """Log all HTTP requests and responses"""
-    start_time = time()
-
-    # Log incoming request
-    logger.info(
-        f"{request.method} {request.url.path} - Client: {request.client.host if request.client else 'unknown'}"
-    )
-
+    """Log one line per HTTP request (level-gated, formatted off the event loop)"""
+    start_time = perf_counter()
     try:
         response = await call_next(request)
-        process_time = time() - start_time
-        logger.info(
-            f"{request.method} {request.url.path} - Status: {response.status_code} - Duration: {process_time:.3f}s"
-        )
-        return response
-    except Exception as e:
-        process_time = time() - start_time
+    except Exception:
         logger.error(
-            f"{request.method} {request.url.path} - Error: {str(e)} - Duration: {process_time:.3f}s",
+            "%s %s - Error - Duration: %.3fs",
+            request.method,
+            request.url.path,
+            perf_counter() - start_time,
             exc_info=True,
         )
         raise
 
+    if access_logger.isEnabledFor(logging.INFO):
+        duration = perf_counter() - start_time
+        access_logger.info(
+            "%s %s - Status: %s - Duration: %.3fs",
+            request.method,
+            request.url.path,
+            response.status_code,
+            duration,
+            extra={
+                "client": request.client.host if request.client else "unknown",
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+            },
+        )
+    return response
+
 
 app.include_router(upload_router, prefix="/api")
 app.include_router(save_ranking_router, prefix="/api")
 app.include_router(live_router, prefix="/api")
 app.include_router(podium_router, prefix="/api")
+app.include_router(history_router, prefix="/api")
@@ -0,0 +1,195 @@
+"""
+Per-subscriber outbound queues for WebSocket fan-out
+Broadcasts enqueue pre-encoded frames; each socket is drained by its own writer task
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Max frames buffered per subscriber before the overflow policy kicks in
+OUTBOX_MAXSIZE = int(os.getenv("WS_OUTBOX_SIZE", "64"))
+
+# "coalesce": drop queued state frames and resync with the latest snapshot
+# "disconnect": close the slow socket with SLOW_CONSUMER_CLOSE_CODE
+OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+
+# 1013 = "Try Again Later"; clients reconnect and receive a fresh snapshot
+SLOW_CONSUMER_CLOSE_CODE = int(os.getenv("WS_SLOW_CONSUMER_CLOSE_CODE", "1013"))
+
+
+class Outbox:
+    """
+    Bounded outbound queue for one WebSocket
+
+    send() never awaits, so state mutation (which happens under the per-box
+    lock) never waits on a subscriber's network I/O. A dedicated writer task
+    drains the queue into the socket, one frame at a time and in order.
+    """
+
+    def __init__(
+        self,
+        ws,
+        box_id: int,
+        resync: Optional[Callable[[], Optional[str]]] = None,
+        on_dead: Optional[Callable[["Outbox"], None]] = None,
+        maxsize: Optional[int] = None,
+        policy: Optional[str] = None,
+        deltas: bool = False,
+        ticks: bool = True,
+    ):
+        """
+        Args:
+            ws: The WebSocket to write to
+            box_id: Box the socket is subscribed to
+            resync: Returns an encoded snapshot of the box (used when coalescing)
+            on_dead: Called once when the socket fails or is evicted
+            maxsize: Queue bound (defaults to OUTBOX_MAXSIZE)
+            policy: Overflow policy (defaults to OVERFLOW_POLICY)
+            deltas: Subscriber wants STATE_DELTA frames instead of full snapshots
+            ticks: Subscriber wants per-second TIMER_SYNC frames (False: it
+                counts down locally from timerEndsAt)
+        """
+        self.ws = ws
+        self.box_id = box_id
+        self.maxsize = maxsize or OUTBOX_MAXSIZE
+        self.policy = policy or OVERFLOW_POLICY
+        self.deltas = deltas
+        self.ticks = ticks
+        self._resync = resync
+        self._on_dead = on_dead
+        # (frame, reply) pairs
+        self._queue: deque[tuple[str, bool]] = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Counters for debugging slow consumers
+        self.sent = 0
+        self.overflows = 0
+
+    def start(self) -> None:
+        """Start the writer task (requires a running event loop)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def send(self, text: str, snapshot: bool = False, reply: bool = False) -> bool:
+        """
+        Enqueue a pre-encoded frame without blocking.
+
+        Args:
+            text: Encoded JSON frame
+            snapshot: True if the frame is a full STATE_SNAPSHOT
+            reply: True if the frame answers this client's own command
+                (ACK/NACK); replies are never coalesced away
+
+        Returns:
+            bool: False if the frame was dropped (closed or evicted socket)
+        """
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.maxsize:
+            self.overflows += 1
+            replies = deque(frame for frame in self._queue if frame[1])
+            if self.policy == "disconnect" or len(replies) >= self.maxsize:
+                logger.warning(
+                    f"Slow consumer on box {self.box_id}: {len(self._queue)} frames queued, disconnecting"
+                )
+                self.evict()
+                return False
+
+            # Coalesce: queued state frames are superseded by the latest
+            # snapshot; replies stay queued, in order
+            logger.info(
+                f"Slow consumer on box {self.box_id}: coalescing "
+                f"{len(self._queue) - len(replies)} frames"
+            )
+            self._queue = replies
+            if not snapshot:
+                resync = self._resync() if self._resync else None
+                if not reply:
+                    if resync is None:
+                        return False
+                    text = resync
+                elif resync is not None:
+                    self._queue.append((resync, False))
+
+        self._queue.append((text, reply))
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def evict(self) -> None:
+        """Drop the subscriber and close its socket with the slow-consumer code."""
+        if self.closed:
+            return
+        self._mark_dead()
+        if self._task is not None:
+            self._task.cancel()
+        asyncio.create_task(self._close_ws(SLOW_CONSUMER_CLOSE_CODE))
+
+    async def flush(self) -> None:
+        """Wait until every queued frame has been written (or the socket died)."""
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        """Stop the writer task; queued frames are discarded."""
+        self.closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                if not self._queue:
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                text, _ = self._queue.popleft()
+                await self.ws.send_text(text)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Writer for box {self.box_id} stopped: {e}")
+            self._mark_dead()
+
+    def _mark_dead(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._on_dead is not None:
+            self._on_dead(self)
+
+    async def _close_ws(self, code: int) -> None:
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+
+__all__ = [
+    "Outbox",
+    "OUTBOX_MAXSIZE",
+    "OVERFLOW_POLICY",
+    "SLOW_CONSUMER_CLOSE_CODE",
+]
@@ -0,0 +1,65 @@
+"""
+Box partitioning across worker processes
+A consistent-hash ring maps every box id to one worker, so each box has a
+single writer and workers never coordinate (see escalada.dispatcher)
+"""
+
+import bisect
+import hashlib
+import os
+from functools import lru_cache
+
+# Set by the dispatcher for each worker it starts; 1 = not partitioned
+PARTITION_COUNT = int(os.getenv("PARTITION_COUNT", "1"))
+PARTITION_INDEX = int(os.getenv("PARTITION_INDEX", "0"))
+# Points per worker on the ring; more points = more even spread
+PARTITION_VNODES = int(os.getenv("PARTITION_VNODES", "64"))
+
+
+def _hash(key: str) -> int:
+    # Stable across processes (str hash() is salted per interpreter)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of box ids onto `nodes` workers
+
+    Adding a worker only moves the boxes that land on its new points, about
+    1/nodes of them; every other box keeps its owner (and its journal).
+    """
+
+    def __init__(self, nodes: int, vnodes: int = PARTITION_VNODES):
+        if nodes < 1:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = nodes
+        points = sorted(
+            (_hash(f"worker-{node}#{v}"), node) for node in range(nodes) for v in range(vnodes)
+        )
+        self._keys = [key for key, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, box_id: int) -> int:
+        """Index of the worker that owns box_id."""
+        if self.nodes == 1:
+            return 0
+        i = bisect.bisect(self._keys, _hash(f"box-{box_id}")) % len(self._keys)
+        return self._owners[i]
+
+
+_ring = HashRing(PARTITION_COUNT)
+
+
+@lru_cache(maxsize=4096)
+def owns_box(box_id: int) -> bool:
+    """True if this worker owns box_id (always true when not partitioned)."""
+    return _ring.owner(box_id) == PARTITION_INDEX
+
+
+__all__ = [
+    "HashRing",
+    "PARTITION_COUNT",
+    "PARTITION_INDEX",
+    "PARTITION_VNODES",
+    "owns_box",
+]
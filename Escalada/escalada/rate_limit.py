@@ -3,18 +3,223 @@ Rate limiting implementation using in-memory tracking
 Prevents DoS attacks on /api/cmd endpoint
 """
 
+import asyncio
 import logging
+import os
 import time
-from collections import defaultdict
-from typing import Dict, Tuple
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Boxes tracked at most; checking a new one past this forgets the least
+# recently checked, so probing arbitrary boxIds cannot grow memory
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# Background sweep: how often, how many boxes per tick at most, and how
+# long a box must go unchecked before it is forgotten
+RATE_LIMIT_SWEEP_INTERVAL_SEC = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL_SEC", "30"))
+RATE_LIMIT_SWEEP_BUDGET = int(os.getenv("RATE_LIMIT_SWEEP_BUDGET", "1000"))
+RATE_LIMIT_IDLE_SEC = 300
+# Per-client limits: share of the per-box minute limit one client IP or one
+# JWT subject may use per box it drives (0 disables the class; bursts may
+# reach the per-second limit per box), buckets per class, and how many boxes
+# of one client are counted at most
+RATE_LIMIT_IP_SHARE = float(os.getenv("RATE_LIMIT_IP_SHARE", "0.5"))
+RATE_LIMIT_SUB_SHARE = float(os.getenv("RATE_LIMIT_SUB_SHARE", "0.5"))
+RATE_LIMIT_CLIENT_SLOTS = int(os.getenv("RATE_LIMIT_CLIENT_SLOTS", "4096"))
+RATE_LIMIT_CLIENT_BOXES = int(os.getenv("RATE_LIMIT_CLIENT_BOXES", "8"))
+# A box counts towards its client's budget this long after its last request
+RATE_LIMIT_CLIENT_BOX_SEC = 60
+
+
+class _Window:
+    """
+    Timestamps of the last `limit` accepted requests, in a ring
+
+    "limit requests within the window" holds exactly when the oldest of the
+    last `limit` is inside it, so a check reads one slot instead of
+    filtering a list. Timestamps are unboxed doubles; after the ring has
+    grown to its limit, recording one overwrites a slot without allocating.
+    """
+
+    __slots__ = ("times", "head", "limit")
+
+    def __init__(self):
+        self.times = array("d")
+        self.head = 0  # Oldest slot once the ring is full
+        self.limit = 0
+
+    def full(self, now: float, window: float, limit: int) -> bool:
+        """True if `limit` requests were already accepted in the last `window` s."""
+        if limit != self.limit:
+            self._resize(limit)
+        if len(self.times) < limit:
+            return False
+        return limit == 0 or now - self.times[self.head] < window
+
+    def add(self, now: float) -> None:
+        if len(self.times) < self.limit:
+            self.times.append(now)
+        else:
+            self.times[self.head] = now
+            self.head = (self.head + 1) % self.limit
+
+    def _resize(self, limit: int) -> None:
+        # Limits changed at runtime: keep the newest timestamps, in order
+        ordered = self.times[self.head :] + self.times[: self.head]
+        self.times = ordered[max(0, len(ordered) - limit) :]
+        self.head = 0
+        self.limit = limit
+
+    def count(self, now: float, window: float) -> int:
+        """Requests inside the window (O(limit); for stats only)."""
+        return sum(1 for ts in self.times if now - ts < window)
+
+    def newest(self) -> Optional[float]:
+        if not self.times:
+            return None
+        return self.times[self.head - 1] if self.head else self.times[-1]
+
+
+class _BoxHistory:
+    """Accepted requests of one box: a ring per window, and the block"""
+
+    __slots__ = ("minute", "second", "blocked_until", "last_seen")
+
+    def __init__(self):
+        self.minute = _Window()
+        self.second = _Window()
+        self.blocked_until = 0.0
+        self.last_seen = 0.0  # Last check, accepted or not
+
+
+class ClientBuckets:
+    """
+    Token buckets for one class of client keys (IP addresses, JWT subjects)
+
+    Keys hash into a fixed number of slots, so memory stays the same however
+    many clients show up; str hashes are salted per process, so colliding
+    with someone else's slot cannot be arranged from outside. A slot holds
+    tokens, when they were last topped up, and the boxes it sent requests to
+    in the last minute (up to `boxes` of them). Its budget grows with those
+    boxes: one scoreboard PC with six ContestPage windows needs six times
+    what a single judge tablet does.
+
+    A client that runs dry only has its excess requests rejected; it is
+    never blocked, so a busy but legitimate client recovers within a second.
+    """
+
+    def __init__(
+        self,
+        share: float,
+        slots: int = RATE_LIMIT_CLIENT_SLOTS,
+        boxes: int = RATE_LIMIT_CLIENT_BOXES,
+    ):
+        self.share = share
+        self.slots = slots
+        self.boxes = boxes
+        self.reset()
+
+        # Counters (see GET /api/stats/rate_limit)
+        self.checks = 0
+        self.rejected = 0
+
+    def reset(self) -> None:
+        self.tokens = array("d", bytes(8 * self.slots))
+        self.updated = array("d", bytes(8 * self.slots))
+        # Per slot, `boxes` entries: box id hash and when it was last seen
+        self.box_ids = array("q", bytes(8 * self.slots * self.boxes))
+        self.box_seen = array("d", bytes(8 * self.slots * self.boxes))
+
+    def _drive(self, slot: int, box_id: Optional[int], now: float) -> int:
+        """Note that the slot sent a request to `box_id`; boxes it drives."""
+        first = slot * self.boxes
+        oldest = first
+        found = box_id is None
+        box_key = 0 if found else hash(box_id)
+        driven = 0
+        for j in range(first, first + self.boxes):
+            seen = self.box_seen[j]
+            if not found and seen and self.box_ids[j] == box_key:
+                self.box_seen[j] = now
+                found = True
+                driven += 1
+                continue
+            if now - seen < RATE_LIMIT_CLIENT_BOX_SEC:
+                driven += 1
+            if seen < self.box_seen[oldest]:
+                oldest = j
+        if not found:
+            # Takes the place of the box seen longest ago
+            if now - self.box_seen[oldest] >= RATE_LIMIT_CLIENT_BOX_SEC:
+                driven += 1
+            self.box_ids[oldest] = box_key
+            self.box_seen[oldest] = now
+        return max(driven, 1)
+
+    def take(
+        self,
+        key: str,
+        now: float,
+        burst: float,
+        rate: float,
+        box_id: Optional[int] = None,
+    ) -> bool:
+        """
+        Spend one token of `key`'s slot for a request to `box_id`
+
+        Per box the client drives, the bucket holds `burst` tokens and
+        refills at `rate` per second scaled by the class share. False if
+        it is empty.
+        """
+        i = hash(key) % self.slots
+        self.checks += 1
+        boxes = self._drive(i, box_id, now)
+        tokens = min(
+            burst * boxes,
+            self.tokens[i] + (now - self.updated[i]) * rate * self.share * boxes,
+        )
+        self.updated[i] = now
+        if tokens < 1:
+            self.tokens[i] = tokens
+            self.rejected += 1
+            return False
+        self.tokens[i] = tokens - 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "share": self.share,
+            "slots": self.slots,
+            "boxes_per_slot": self.boxes,
+            "slots_used": sum(1 for t in self.updated if t),
+            "checks": self.checks,
+            "rejected": self.rejected,
+        }
+
 
 class RateLimiter:
     """
     Per-box and per-command-type rate limiter
     Tracks requests in memory with automatic cleanup
+
+    Sliding windows over the accepted requests: at most max_per_second in
+    any second and max_per_minute in any minute per box (exceeding either
+    blocks the box for block_duration), and the command's per-minute limit
+    per box and type. Every check is O(1).
+
+    Requests may also name their client by key class ("ip", "sub"). Each
+    client then gets its own token bucket: per box it drives, a burst of
+    max_per_second refilling at a share of max_per_minute (see
+    ClientBuckets). Past that only its excess is rejected. A box limit hit
+    by such a request only rejects it too: blocking the box would lock the
+    judge out along with a runaway tab. Every request through the middleware
+    has an IP, so boxes are only blocked when RATE_LIMIT_IP_SHARE is 0.
+
+    Only check_rate_limit() creates entries. request_history is kept in
+    least-recently-checked order, so the sweep and the max_keys cap both
+    take from its front; neither forgets a box while it is blocked.
     """
 
     def __init__(
@@ -22,6 +227,7 @@ class RateLimiter:
         max_per_minute: int = 300,
         max_per_second: int = 20,
         block_duration: int = 60,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
     ):
         """
         Initialize rate limiter
@@ -30,160 +236,336 @@ class RateLimiter:
             max_per_minute: Max requests per box per minute
             max_per_second: Max requests per box per second
             block_duration: How long to block after limit (seconds)
+            max_keys: Max boxes tracked; the least recently checked goes first
         """
         self.max_per_minute = max_per_minute
         self.max_per_second = max_per_second
         self.block_duration = block_duration
+        self.max_keys = max_keys
 
-        # Track requests: { boxId: { 'requests': [timestamp, ...], 'blocked_until': time } }
-        self.request_history: Dict[int, Dict] = defaultdict(
-            lambda: {"requests": [], "blocked_until": 0}
-        )
+        # Track requests: { boxId: _BoxHistory }, least recently checked first
+        self.request_history: OrderedDict[int, _BoxHistory] = OrderedDict()
 
-        # Per-command limits: { boxId: { command_type: [timestamp, ...] } }
-        self.command_history: Dict[int, Dict[str, list]] = defaultdict(
-            lambda: defaultdict(list)
-        )
+        # Per-command limits: { boxId: { command_type: _Window } }
+        self.command_history: Dict[int, Dict[str, _Window]] = {}
 
         # Custom per-command limits
         self.command_limits: Dict[str, int] = {}
 
+        # Per-client limits: { key class: ClientBuckets }
+        self.client_limits: Dict[str, ClientBuckets] = {
+            "ip": ClientBuckets(RATE_LIMIT_IP_SHARE),
+            "sub": ClientBuckets(RATE_LIMIT_SUB_SHARE),
+        }
+
+        # Counters (see GET /api/stats/rate_limit)
+        self.checks = 0
+        self.rejected = 0
+        self.lru_evicted = 0
+
     def set_command_limit(self, command_type: str, max_per_minute: int):
         """Set custom limit for specific command type"""
         self.command_limits[command_type] = max_per_minute
 
     def reset_all(self):
         """Reset all rate limiting data (for testing)"""
-        self.request_history = defaultdict(lambda: {"requests": [], "blocked_until": 0})
-        self.command_history = defaultdict(lambda: defaultdict(list))
+        self.request_history = OrderedDict()
+        self.command_history = {}
+        for buckets in self.client_limits.values():
+            buckets.reset()
 
     def is_blocked(self, box_id: int) -> bool:
         """Check if box is currently blocked"""
-        blocked_until = self.request_history[box_id]["blocked_until"]
-        if blocked_until > time.time():
-            logger.warning(f"Box {box_id} is rate-limited until {blocked_until}")
+        history = self.request_history.get(box_id)
+        if history is not None and history.blocked_until > time.time():
+            logger.warning(f"Box {box_id} is rate-limited until {history.blocked_until}")
             return True
         return False
 
-    def check_rate_limit(self, box_id: int, command_type: str) -> Tuple[bool, str]:
+    def _history(self, box_id: int, now: float) -> _BoxHistory:
+        history = self.request_history.get(box_id)
+        if history is None:
+            while len(self.request_history) >= self.max_keys and self._evict(now):
+                self.lru_evicted += 1
+            history = self.request_history[box_id] = _BoxHistory()
+        else:
+            self.request_history.move_to_end(box_id)
+        history.last_seen = now
+        return history
+
+    def _evict(self, now: float) -> bool:
+        """
+        Forget the least recently checked box that is not blocked
+
+        Blocked boxes it passes go to the back, so the next eviction does not
+        look at them again; forgetting one would lift its block. False if
+        every box is blocked (the table then grows past max_keys).
+        """
+        for _ in range(len(self.request_history)):
+            box_id, history = next(iter(self.request_history.items()))
+            if history.blocked_until <= now:
+                self._forget(box_id)
+                return True
+            self.request_history.move_to_end(box_id)
+        return False
+
+    def _forget(self, box_id: int) -> None:
+        del self.request_history[box_id]
+        self.command_history.pop(box_id, None)
+
+    def check_rate_limit(
+        self,
+        box_id: int,
+        command_type: str,
+        clients: Optional[Dict[str, str]] = None,
+    ) -> Tuple[bool, str]:
         """
         Check if request should be rate-limited
 
         Args:
             box_id: The box ID
             command_type: The command type
+            clients: Who sent it, by key class (e.g. {"ip": ..., "sub": ...})
 
         Returns:
             Tuple[bool, str]: (is_allowed, reason)
                 is_allowed: True if request is allowed
                 reason: Reason if blocked (empty string if allowed)
         """
+        return self.check_batch(box_id, (command_type,), clients)
+
+    def check_batch(
+        self,
+        box_id: int,
+        command_types: Sequence[str],
+        clients: Optional[Dict[str, str]] = None,
+    ) -> Tuple[bool, str]:
+        """
+        Check a batch of commands for one box as a single request
+
+        The batch takes one slot of the box's windows, one client token, and
+        one slot of each command type's window; every limit is checked before
+        any of them is charged, so a rejected batch costs nothing but the
+        client token.
+        """
         current_time = time.time()
+        if clients:
+            allowed, reason = self.check_clients(clients, current_time, box_id)
+            if not allowed:
+                return allowed, reason
+
+        if len(command_types) > 1:
+            command_types = tuple(dict.fromkeys(command_types))
+        allowed, reason = self._check(box_id, command_types, current_time, clients)
+        self.checks += 1
+        if not allowed:
+            self.rejected += 1
+        return allowed, reason
+
+    def check_clients(
+        self,
+        clients: Dict[str, str],
+        now: Optional[float] = None,
+        box_id: Optional[int] = None,
+    ) -> Tuple[bool, str]:
+        """Spend a token of each client key; without a box_id, for a request with none."""
+        if now is None:
+            now = time.time()
+        burst = self.max_per_second
+        rate = self.max_per_minute / 60
+        for key_class, key in clients.items():
+            buckets = self.client_limits.get(key_class)
+            if buckets is None or not buckets.share:
+                continue
+            if not buckets.take(key, now, burst, rate, box_id):
+                logger.warning(f"Client {key_class}={key} exceeded its rate limit")
+                return False, "Rate limit exceeded for this client"
+        return True, ""
 
-        # Check if box is blocked
-        if self.is_blocked(box_id):
-            return False, f"Box {box_id} is rate-limited. Try again later."
+    def _identified(self, clients: Optional[Dict[str, str]]) -> bool:
+        """True if a client key whose class has a budget limits this sender."""
+        return any(
+            key_class in self.client_limits and self.client_limits[key_class].share
+            for key_class in clients or ()
+        )
 
+    def _check(
+        self,
+        box_id: int,
+        command_types: Sequence[str],
+        current_time: float,
+        clients: Optional[Dict[str, str]],
+    ) -> Tuple[bool, str]:
         # Get history for this box
-        history = self.request_history[box_id]
-        requests = history["requests"]
+        history = self._history(box_id, current_time)
 
-        # Remove old requests (older than 1 minute)
-        requests[:] = [ts for ts in requests if current_time - ts < 60]
+        # Check if box is blocked
+        if history.blocked_until > current_time:
+            logger.warning(f"Box {box_id} is rate-limited until {history.blocked_until}")
+            return False, f"Box {box_id} is rate-limited. Try again later."
 
         # Check per-second limit
-        recent_requests = [ts for ts in requests if current_time - ts < 1]
-        if len(recent_requests) >= self.max_per_second:
-            # Block this box
-            history["blocked_until"] = current_time + self.block_duration
+        if history.second.full(current_time, 1, self.max_per_second):
+            # Block this box only if no key class with a budget identifies the
+            # sender: client_keys always finds an IP, so this takes
+            # RATE_LIMIT_IP_SHARE=0 and no verified sub (or no sender at all)
+            if not self._identified(clients):
+                history.blocked_until = current_time + self.block_duration
             logger.warning(
                 f"Box {box_id} exceeded per-second limit ({self.max_per_second} req/sec)"
             )
             return False, f"Rate limit exceeded (too many requests per second)"
 
         # Check per-minute limit
-        if len(requests) >= self.max_per_minute:
-            history["blocked_until"] = current_time + self.block_duration
+        if history.minute.full(current_time, 60, self.max_per_minute):
+            if not self._identified(clients):
+                history.blocked_until = current_time + self.block_duration
             logger.warning(
                 f"Box {box_id} exceeded per-minute limit ({self.max_per_minute} req/min)"
             )
             return False, f"Rate limit exceeded (too many requests per minute)"
 
         # Check command-specific limits
-        cmd_limit = self.command_limits.get(
-            command_type, 999
-        )  # Default: very permissive
-        cmd_requests = self.command_history[box_id][command_type]
-
-        # Remove old command requests
-        cmd_requests[:] = [ts for ts in cmd_requests if current_time - ts < 60]
-
-        if len(cmd_requests) >= cmd_limit:
-            logger.warning(
-                f"Box {box_id} exceeded {command_type} limit ({cmd_limit} per minute)"
-            )
-            return False, f"Rate limit exceeded for {command_type} command"
+        commands = self.command_history.get(box_id)
+        if commands is None:
+            commands = self.command_history[box_id] = {}
+        for command_type in command_types:
+            cmd_limit = self.command_limits.get(command_type, 999)  # Default: very permissive
+            cmd_requests = commands.get(command_type)
+            if cmd_requests is None:
+                cmd_requests = commands[command_type] = _Window()
+            if cmd_requests.full(current_time, 60, cmd_limit):
+                logger.warning(
+                    f"Box {box_id} exceeded {command_type} limit ({cmd_limit} per minute)"
+                )
+                return False, f"Rate limit exceeded for {command_type} command"
 
         # Record this request
-        requests.append(current_time)
-        cmd_requests.append(current_time)
+        history.second.add(current_time)
+        history.minute.add(current_time)
+        for command_type in command_types:
+            commands[command_type].add(current_time)
 
         return True, ""
 
-    def cleanup_old_data(self, max_age_seconds: int = 300):
-        """Remove old data to prevent memory buildup (call periodically)"""
+    def cleanup_old_data(self, max_age_seconds: int = 300, budget: Optional[int] = None) -> int:
+        """
+        Forget boxes not checked for max_age_seconds and no longer blocked
+
+        Looks at no more than `budget` boxes (all if None), oldest first, and
+        stops at the first one still in use: every box behind it was checked
+        more recently. Returns the number of boxes forgotten.
+        """
         current_time = time.time()
         cutoff_time = current_time - max_age_seconds
 
-        # Clean request history
-        to_delete = []
-        for box_id, history in self.request_history.items():
-            history["requests"][:] = [
-                ts for ts in history["requests"] if ts > cutoff_time
-            ]
-            # Delete empty entries
-            if not history["requests"] and history["blocked_until"] < current_time:
-                to_delete.append(box_id)
-
-        for box_id in to_delete:
-            del self.request_history[box_id]
-
-        # Clean command history
-        cmd_to_delete = []
-        for box_id, commands in self.command_history.items():
-            for cmd_type, requests in commands.items():
-                commands[cmd_type] = [ts for ts in requests if ts > cutoff_time]
-            if not commands:
-                cmd_to_delete.append(box_id)
-
-        for box_id in cmd_to_delete:
-            del self.command_history[box_id]
+        removed = 0
+        while self.request_history and (budget is None or removed < budget):
+            box_id, history = next(iter(self.request_history.items()))
+            if history.last_seen > cutoff_time or history.blocked_until >= current_time:
+                break
+            self._forget(box_id)
+            removed += 1
+        return removed
 
     def get_stats(self, box_id: int) -> dict:
         """Get rate limit stats for debugging"""
         current_time = time.time()
-        history = self.request_history[box_id]
-        requests = history["requests"]
-
-        # Count recent requests
-        recent_1sec = len([ts for ts in requests if current_time - ts < 1])
-        recent_1min = len([ts for ts in requests if current_time - ts < 60])
+        history = self.request_history.get(box_id) or _BoxHistory()
 
         # Count per-command
         command_counts = {}
-        for cmd_type, cmd_requests in self.command_history[box_id].items():
-            command_counts[cmd_type] = len(
-                [ts for ts in cmd_requests if current_time - ts < 60]
-            )
+        for cmd_type, cmd_requests in self.command_history.get(box_id, {}).items():
+            command_counts[cmd_type] = cmd_requests.count(current_time, 60)
 
         return {
-            "requests_per_second": recent_1sec,
-            "requests_per_minute": recent_1min,
+            "requests_per_second": history.second.count(current_time, 1),
+            "requests_per_minute": history.minute.count(current_time, 60),
             "is_blocked": self.is_blocked(box_id),
-            "blocked_until": history["blocked_until"],
+            "blocked_until": history.blocked_until,
             "command_counts": command_counts,
         }
 
+    def stats(self) -> dict:
+        """Counters per key class: boxes, then each client class."""
+        return {
+            "box": {
+                "tracked": len(self.request_history),
+                "max_keys": self.max_keys,
+                "checks": self.checks,
+                "rejected": self.rejected,
+                "lru_evicted": self.lru_evicted,
+            },
+            **{key_class: buckets.stats() for key_class, buckets in self.client_limits.items()},
+        }
+
+
+class RateLimitSweeper:
+    """
+    Forgets idle boxes of a RateLimiter every `interval` seconds
+
+    Each tick looks at no more than `budget` boxes, so a sweep after a burst
+    of probing never holds the event loop for long; what is left over goes
+    on the next tick.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        interval: float = RATE_LIMIT_SWEEP_INTERVAL_SEC,
+        budget: int = RATE_LIMIT_SWEEP_BUDGET,
+        max_age: float = RATE_LIMIT_IDLE_SEC,
+    ):
+        self.limiter = limiter
+        self.interval = interval
+        self.budget = budget
+        self.max_age = max_age
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters (see GET /api/stats/rate_limit)
+        self.sweeps = 0
+        self.swept = 0
+        self.last_sweep_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def run_once(self) -> int:
+        started = time.perf_counter()
+        removed = self.limiter.cleanup_old_data(self.max_age, self.budget)
+        self.sweeps += 1
+        self.swept += removed
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Rate limit sweep failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "interval_sec": self.interval,
+            "budget": self.budget,
+            "idle_sec": self.max_age,
+            "sweeps": self.sweeps,
+            "swept": self.swept,
+            "last_sweep_ms": round(self.last_sweep_ms, 3),
+        }
+
 
 # Global rate limiter instance
 _rate_limiter = None
@@ -193,25 +575,31 @@ def get_rate_limiter() -> RateLimiter:
     """Get or create global rate limiter"""
     global _rate_limiter
     if _rate_limiter is None:
-        _rate_limiter = RateLimiter(
-            max_per_minute=300, max_per_second=20, block_duration=60
-        )
+        _rate_limiter = RateLimiter(max_per_minute=300, max_per_second=20, block_duration=60)
 
         # Set command-specific limits
         _rate_limiter.set_command_limit("PROGRESS_UPDATE", 120)  # Frequent
         _rate_limiter.set_command_limit("INIT_ROUTE", 10)  # Rare
         _rate_limiter.set_command_limit("SUBMIT_SCORE", 30)  # Occasional
-        _rate_limiter.set_command_limit(
-            "REGISTER_TIME", 300
-        )  # Allow frequent timestamp saves
+        _rate_limiter.set_command_limit("REGISTER_TIME", 300)  # Allow frequent timestamp saves
 
     return _rate_limiter
 
 
-def check_rate_limit(box_id: int, command_type: str) -> Tuple[bool, str]:
+def check_rate_limit(
+    box_id: int, command_type: str, clients: Optional[Dict[str, str]] = None
+) -> Tuple[bool, str]:
     """Convenience function to check rate limit"""
     limiter = get_rate_limiter()
-    return limiter.check_rate_limit(box_id, command_type)
+    return limiter.check_rate_limit(box_id, command_type, clients)
+
+
+def check_batch_rate_limit(
+    box_id: int, command_types: Sequence[str], clients: Optional[Dict[str, str]] = None
+) -> Tuple[bool, str]:
+    """Convenience function to check a batch's rate limit"""
+    limiter = get_rate_limiter()
+    return limiter.check_batch(box_id, command_types, clients)
 
 
 def cleanup_rate_limit_data():
@@ -221,8 +609,18 @@ def cleanup_rate_limit_data():
 
 
 __all__ = [
+    "RATE_LIMIT_CLIENT_BOXES",
+    "RATE_LIMIT_CLIENT_SLOTS",
+    "RATE_LIMIT_IP_SHARE",
+    "RATE_LIMIT_MAX_KEYS",
+    "RATE_LIMIT_SWEEP_BUDGET",
+    "RATE_LIMIT_SUB_SHARE",
+    "RATE_LIMIT_SWEEP_INTERVAL_SEC",
+    "ClientBuckets",
+    "RateLimitSweeper",
     "RateLimiter",
     "get_rate_limiter",
     "check_rate_limit",
+    "check_batch_rate_limit",
     "cleanup_rate_limit_data",
 ]
@@ -0,0 +1,235 @@
+"""
+Rate limiting for /api/cmd before FastAPI parses the body
+Reads the raw body (refusing it past CMD_MAX_BODY_BYTES), peeks at boxId and
+type and rejects with 429 there, so a flood never reaches Cmd parsing and
+validation. Requests it checked are flagged so cmd() does not count them twice.
+Each request is also charged to its client IP and, with a valid bearer token,
+to the JWT subject
+"""
+
+import json
+import logging
+import os
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+import jwt
+from escalada import auth, rate_limit
+from escalada.validation import ALLOWED_CMD_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Largest /api/cmd or /api/cmd/batch body accepted (413 past it); an
+# INIT_ROUTE with the full 500 competitors stays well below
+CMD_MAX_BODY_BYTES = int(os.getenv("CMD_MAX_BODY_BYTES", str(256 * 1024)))
+
+_CMD_PATHS = ("/api/cmd", "/api/cmd/batch")
+
+# Set while handling a request whose commands were already rate-limited here
+prechecked: ContextVar[bool] = ContextVar("rate_limit_prechecked", default=False)
+# Client keys of the connection commands come from, for those cmd() checks
+# itself (set by the WebSocket endpoint for commands sent over the socket)
+sender: ContextVar[Optional[dict[str, str]]] = ContextVar("rate_limit_sender", default=None)
+
+# Counters (see GET /api/stats/rate_limit)
+precheck_stats = {
+    "prechecked": 0,
+    "rejected": 0,
+    "too_large": 0,
+    "passed_through": 0,
+}
+
+
+def peek_commands(path: str, body: bytes) -> Optional[list[tuple[int, str]]]:
+    """
+    (boxId, type) of each command in a /api/cmd or /api/cmd/batch body
+
+    None unless every command has an integer boxId and a known type; such
+    requests go on unchecked and cmd() rate-limits them after validation.
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    box_id = data.get("boxId")
+    if type(box_id) is not int:
+        return None
+    commands = data.get("commands") if path == "/api/cmd/batch" else [data]
+    if not isinstance(commands, list) or not commands:
+        return None
+    peeked = []
+    for command in commands:
+        cmd_type = command.get("type") if isinstance(command, dict) else None
+        if cmd_type not in ALLOWED_CMD_TYPES:
+            return None
+        # Batched commands must target the batch's box; cmd_batch checks that
+        peeked.append((box_id, cmd_type))
+    return peeked
+
+
+def client_keys(scope) -> dict[str, str]:
+    """
+    Rate limit keys of the request's (or WebSocket's) sender, by key class
+
+    "ip" is the peer address; behind the dispatcher (a unix socket, no peer)
+    it is the X-Forwarded-For entry the dispatcher appended last. "sub" is
+    the subject of a bearer token, only if its signature checks out.
+    """
+    keys = {}
+    forwarded = None
+    authorization = None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            forwarded = value
+        elif name == b"authorization":
+            authorization = value
+
+    client = scope.get("client")
+    if client and client[0]:
+        keys["ip"] = client[0]
+    elif forwarded:
+        keys["ip"] = forwarded.decode("latin-1").rsplit(",", 1)[-1].strip()
+
+    if authorization and authorization[:7].lower() == b"bearer ":
+        try:
+            payload = jwt.decode(
+                authorization[7:].decode("latin-1"),
+                auth.SECRET_KEY,
+                algorithms=[auth.ALGORITHM],
+            )
+        except jwt.InvalidTokenError:
+            payload = {}
+        if payload.get("sub") is not None:
+            keys["sub"] = str(payload["sub"])
+    return keys
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware in front of POST /api/cmd and /api/cmd/batch
+
+    `enabled` is read per request (tests switch rate limiting off through
+    live.VALIDATION_ENABLED); the body size limit always applies.
+    """
+
+    def __init__(
+        self,
+        app,
+        enabled: Callable[[], bool] = lambda: True,
+        max_body: int = CMD_MAX_BODY_BYTES,
+    ):
+        self.app = app
+        self.enabled = enabled
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in _CMD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_body:
+                    await self._too_large(send)
+                    return
+                break
+
+        body = await self._read_body(receive)
+        if body is None:
+            await self._too_large(send)
+            return
+
+        token = None
+        if self.enabled():
+            clients = client_keys(scope)
+            commands = peek_commands(scope["path"], body)
+            if commands is None:
+                # Still charged to the client; the box is limited after validation
+                precheck_stats["passed_through"] += 1
+                allowed, reason = rate_limit.get_rate_limiter().check_clients(clients)
+                if not allowed:
+                    precheck_stats["rejected"] += 1
+                    await _respond(send, 429, {"detail": reason})
+                    return
+            else:
+                # A batch is one request: charged once, all limits checked first
+                box_id = commands[0][0]
+                allowed, reason = rate_limit.check_batch_rate_limit(
+                    box_id, [cmd_type for _, cmd_type in commands], clients
+                )
+                if not allowed:
+                    precheck_stats["rejected"] += 1
+                    logger.warning(f"Rate limit exceeded for box {box_id}: {reason}")
+                    await _respond(send, 429, {"detail": reason})
+                    return
+                precheck_stats["prechecked"] += 1
+                token = prechecked.set(True)
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            if token is not None:
+                prechecked.reset(token)
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """The whole body, or None once it exceeds max_body."""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away; the app gets what arrived, then the disconnect
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _too_large(self, send) -> None:
+        precheck_stats["too_large"] += 1
+        await _respond(
+            send,
+            413,
+            {"detail": f"Request body exceeds {self.max_body} bytes"},
+        )
+
+
+async def _respond(send, status: int, body: dict) -> None:
+    data = json.dumps(body).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(data)).encode("ascii")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": data})
+
+
+__all__ = [
+    "CMD_MAX_BODY_BYTES",
+    "RateLimitMiddleware",
+    "client_keys",
+    "peek_commands",
+    "precheck_stats",
+    "prechecked",
+    "sender",
+]
@@ -0,0 +1,305 @@
+"""
+Hot-standby replication over a local socket
+The primary streams every journal record to its replicas as it is accepted;
+a replica applies them to its own state_map and can be promoted to primary
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from escalada.backend import BROKER_LINE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# "" (default, no replication), "primary" or "replica"
+REPLICATION_ROLE = os.getenv("REPLICATION_ROLE", "")
+# The primary listens here; replicas connect here
+REPLICATION_SOCKET = os.getenv("REPLICATION_SOCKET", os.path.join("data", "replication.sock"))
+REPLICATION_HEARTBEAT_SEC = float(os.getenv("REPLICATION_HEARTBEAT_SEC", "0.5"))
+# A replica this far behind (bytes not yet sent) is dropped; it reconnects and
+# starts over from a fresh snapshot instead of growing the primary's memory
+REPLICATION_MAX_BUFFER = 8 * 1024 * 1024
+
+
+def _encode(message: dict) -> bytes:
+    line = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+    return (line + "\n").encode("utf-8")
+
+
+class _Follower:
+    """One connected replica, as seen by the primary"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.acked = 0
+
+
+class ReplicationSource:
+    """
+    Primary side: snapshot on connect, then every record in order
+
+    A new replica first receives capture_state() together with the current
+    record sequence number, then each record shipped after it. Both happen on
+    the event loop without awaiting, so the snapshot holds exactly the records
+    numbered up to its seq. Shipping does not wait for replicas.
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], dict],
+        path: str = REPLICATION_SOCKET,
+        heartbeat: float = REPLICATION_HEARTBEAT_SEC,
+    ):
+        self.capture = capture
+        self.path = path
+        self.heartbeat = heartbeat
+        self.seq = 0
+        self.followers: set[_Follower] = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters (see GET /api/stats/replication)
+        self.shipped = 0
+        self.snapshots = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._serve, self.path, limit=BROKER_LINE_LIMIT
+        )
+        self._task = asyncio.create_task(self._heartbeats())
+        logger.info(f"Replication source listening on {self.path}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for follower in list(self.followers):
+                follower.writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def ship(self, key: str, record: dict) -> None:
+        """Send one journal record to every replica (caller holds the box)."""
+        self.seq += 1
+        self.shipped += 1
+        if not self.followers:
+            return
+        line = _encode(
+            {
+                "op": "record",
+                "seq": self.seq,
+                "ts": time.time(),
+                "key": key,
+                "record": record,
+            }
+        )
+        for follower in list(self.followers):
+            self._send(follower, line)
+
+    def _send(self, follower: _Follower, line: bytes) -> None:
+        writer = follower.writer
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > REPLICATION_MAX_BUFFER:
+            logger.warning("Replica fell too far behind; dropping it")
+            self.dropped += 1
+            self.followers.discard(follower)
+            writer.close()
+            return
+        writer.write(line)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        follower = _Follower(writer)
+        # ---- no await: the snapshot must match self.seq ----
+        self.snapshots += 1
+        follower.acked = self.seq
+        writer.write(
+            _encode(
+                {
+                    "op": "snapshot",
+                    "seq": self.seq,
+                    "ts": time.time(),
+                    "state": self.capture(),
+                }
+            )
+        )
+        self.followers.add(follower)
+        logger.info("Replica connected")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg.get("op") == "ack":
+                    follower.acked = msg["seq"]
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Replica connection lost: {e}")
+        finally:
+            self.followers.discard(follower)
+            writer.close()
+            logger.info("Replica disconnected")
+
+    async def _heartbeats(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            line = _encode({"op": "heartbeat", "seq": self.seq, "ts": time.time()})
+            for follower in list(self.followers):
+                self._send(follower, line)
+
+    def stats(self) -> dict:
+        return {
+            "role": "primary",
+            "seq": self.seq,
+            "shipped": self.shipped,
+            "snapshots": self.snapshots,
+            "dropped": self.dropped,
+            "replicas": [
+                {
+                    "acked_seq": f.acked,
+                    "lag_records": self.seq - f.acked,
+                    "buffered_bytes": f.writer.transport.get_write_buffer_size(),
+                }
+                for f in self.followers
+            ],
+        }
+
+
+class Replica:
+    """
+    Replica side: tails the primary until promoted
+
+    on_snapshot replaces the whole state (called on every (re)connect);
+    on_record applies one record. A lost primary is retried every
+    `retry` seconds, so a restarted primary is picked up again.
+    """
+
+    def __init__(
+        self,
+        on_snapshot: Callable[[dict], Awaitable[None]],
+        on_record: Callable[[str, dict], None],
+        path: str = REPLICATION_SOCKET,
+        retry: float = 0.2,
+    ):
+        self.on_snapshot = on_snapshot
+        self.on_record = on_record
+        self.path = path
+        self.retry = retry
+        self.connected = False
+        self.promoted = False
+        self._task: Optional[asyncio.Task] = None
+
+        # Lag tracking (see GET /api/stats/replication)
+        self.applied_seq = 0
+        self.primary_seq = 0
+        self.last_delay = 0.0
+        self.last_contact: Optional[float] = None
+        self.snapshots = 0
+        self.records = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.connected = False
+
+    async def promote(self) -> None:
+        """Stop following the primary; the caller starts accepting writes."""
+        await self.close()
+        self.promoted = True
+        logger.info(f"Replica promoted at seq {self.applied_seq}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self.path, limit=BROKER_LINE_LIMIT
+                )
+            except OSError:
+                await asyncio.sleep(self.retry)
+                continue
+            self.connected = True
+            logger.info(f"Replica connected to primary at {self.path}")
+            try:
+                await self._follow(reader, writer)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Primary connection lost: {e}")
+            finally:
+                self.connected = False
+                writer.close()
+            logger.warning("Primary gone; waiting for it or for promotion")
+            await asyncio.sleep(self.retry)
+
+    async def _follow(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            msg = json.loads(line)
+            now = time.time()
+            self.last_contact = now
+            self.primary_seq = msg["seq"]
+            op = msg["op"]
+            if op == "record":
+                self.on_record(msg["key"], msg["record"])
+                self.applied_seq = msg["seq"]
+                self.last_delay = now - msg["ts"]
+                self.records += 1
+            elif op == "snapshot":
+                await self.on_snapshot(msg["state"])
+                self.applied_seq = msg["seq"]
+                self.snapshots += 1
+            elif op == "heartbeat":
+                writer.write(_encode({"op": "ack", "seq": self.applied_seq}))
+
+    def stats(self) -> dict:
+        since = None
+        if self.last_contact is not None:
+            since = round((time.time() - self.last_contact) * 1000, 1)
+        return {
+            "role": "primary" if self.promoted else "replica",
+            "connected": self.connected,
+            "applied_seq": self.applied_seq,
+            "primary_seq": self.primary_seq,
+            "lag_records": self.primary_seq - self.applied_seq,
+            # Primary accepted a record -> replica applied it
+            "lag_ms": round(self.last_delay * 1000, 3),
+            "since_primary_ms": since,
+            "snapshots": self.snapshots,
+            "records": self.records,
+        }
+
+
+__all__ = [
+    "REPLICATION_HEARTBEAT_SEC",
+    "REPLICATION_ROLE",
+    "REPLICATION_SOCKET",
+    "Replica",
+    "ReplicationSource",
+]
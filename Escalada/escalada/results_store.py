@@ -0,0 +1,399 @@
+"""
+Embedded results store
+SQLite in WAL mode: readers (podium, rankings) never wait for a writer, and
+each saved ranking is one transaction. Excel/PDF files are exports of it.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DB = os.getenv("RESULTS_DB", os.path.join("data", "results.db"))
+# The app runs one competition at a time; its results are filed under this name
+RESULTS_COMPETITION = os.getenv("RESULTS_COMPETITION", "default")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS competitions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    competition_id INTEGER NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    route_count INTEGER NOT NULL,
+    use_time_tiebreak INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    UNIQUE (competition_id, name)
+);
+CREATE TABLE IF NOT EXISTS competitors (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    club TEXT NOT NULL DEFAULT '',
+    UNIQUE (category_id, name)
+);
+CREATE TABLE IF NOT EXISTS routes (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    route_index INTEGER NOT NULL,
+    UNIQUE (category_id, route_index)
+);
+CREATE TABLE IF NOT EXISTS scores (
+    route_id INTEGER NOT NULL REFERENCES routes(id) ON DELETE CASCADE,
+    competitor_id INTEGER NOT NULL REFERENCES competitors(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    score REAL,
+    points REAL,
+    PRIMARY KEY (route_id, competitor_id)
+);
+CREATE INDEX IF NOT EXISTS scores_by_position ON scores (route_id, position);
+CREATE TABLE IF NOT EXISTS times (
+    route_id INTEGER NOT NULL REFERENCES routes(id) ON DELETE CASCADE,
+    competitor_id INTEGER NOT NULL REFERENCES competitors(id) ON DELETE CASCADE,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (route_id, competitor_id)
+);
+CREATE TABLE IF NOT EXISTS overall (
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    competitor_id INTEGER NOT NULL REFERENCES competitors(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (category_id, competitor_id)
+);
+CREATE INDEX IF NOT EXISTS overall_by_position ON overall (category_id, position);
+"""
+
+
+class ResultsStore:
+    """
+    Rankings per competition and category
+
+    One connection per thread (FastAPI runs sync endpoints in a thread pool);
+    WAL lets those readers run while another thread holds the write lock.
+    Rows keep the position they had in the computed ranking, so reads are
+    an index range scan in display order and exports match what was saved.
+    """
+
+    def __init__(self, path: str = RESULTS_DB, competition: str = RESULTS_COMPETITION):
+        self.path = path
+        self.competition = competition
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        # Counters (see GET /api/stats/results)
+        self.saves = 0
+        self.rows_written = 0
+        self.last_save_ms = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False, timeout=5.0
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: a commit survives a process crash without an fsync per save
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    # ==================== WRITING ====================
+
+    def save_category(
+        self,
+        category: str,
+        route_count: int,
+        use_time_tiebreak: bool,
+        competitors: Iterable[tuple[str, str]],
+        routes: dict[int, list[tuple]],
+        overall: list[tuple],
+    ) -> None:
+        """
+        Replace the results of a category in a single transaction.
+
+        Args:
+            category: Category name
+            route_count: Number of routes
+            use_time_tiebreak: Whether times broke ties
+            competitors: (name, club) pairs
+            routes: route index (1-based) -> [(name, rank, score, seconds, points)]
+                in ranking order
+            overall: [(name, rank, total)] in ranking order
+        """
+        started = time.perf_counter()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO competitions (name) VALUES (?)",
+                (self.competition,),
+            )
+            (competition_id,) = conn.execute(
+                "SELECT id FROM competitions WHERE name = ?", (self.competition,)
+            ).fetchone()
+            # Saving again replaces everything below the category
+            conn.execute(
+                "DELETE FROM categories WHERE competition_id = ? AND name = ?",
+                (competition_id, category),
+            )
+            category_id = conn.execute(
+                "INSERT INTO categories "
+                "(competition_id, name, route_count, use_time_tiebreak, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    competition_id,
+                    category,
+                    route_count,
+                    int(use_time_tiebreak),
+                    time.time(),
+                ),
+            ).lastrowid
+
+            competitor_ids = {}
+            for name, club in competitors:
+                competitor_ids[name] = conn.execute(
+                    "INSERT INTO competitors (category_id, name, club) " "VALUES (?, ?, ?)",
+                    (category_id, name, club),
+                ).lastrowid
+
+            rows = 0
+            for route_index, ranking in routes.items():
+                route_id = conn.execute(
+                    "INSERT INTO routes (category_id, route_index) VALUES (?, ?)",
+                    (category_id, route_index),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO scores "
+                    "(route_id, competitor_id, position, rank, score, points) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (route_id, competitor_ids[name], pos, rank, score, points)
+                        for pos, (name, rank, score, _, points) in enumerate(ranking)
+                    ],
+                )
+                conn.executemany(
+                    "INSERT INTO times (route_id, competitor_id, seconds) " "VALUES (?, ?, ?)",
+                    [
+                        (route_id, competitor_ids[name], seconds)
+                        for name, _, _, seconds, _ in ranking
+                        if seconds is not None
+                    ],
+                )
+                rows += len(ranking)
+
+            conn.executemany(
+                "INSERT INTO overall "
+                "(category_id, competitor_id, position, rank, total) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (category_id, competitor_ids[name], pos, rank, total)
+                    for pos, (name, rank, total) in enumerate(overall)
+                ],
+            )
+            rows += len(overall)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.saves += 1
+        self.rows_written += rows
+        self.last_save_ms = (time.perf_counter() - started) * 1000
+
+    # ==================== READING ====================
+
+    def _category(self, category: str) -> Optional[tuple[int, int, bool]]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT c.id, c.route_count, c.use_time_tiebreak FROM categories c "
+                "JOIN competitions m ON m.id = c.competition_id "
+                "WHERE m.name = ? AND c.name = ?",
+                (self.competition, category),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return row[0], row[1], bool(row[2])
+
+    def categories(self) -> list[str]:
+        return [
+            name
+            for (name,) in self._conn().execute(
+                "SELECT c.name FROM categories c "
+                "JOIN competitions m ON m.id = c.competition_id "
+                "WHERE m.name = ? ORDER BY c.name",
+                (self.competition,),
+            )
+        ]
+
+    def podium(self, category: str, limit: int = 3) -> Optional[list[str]]:
+        """
+        Names of the first `limit` competitors of the overall ranking.
+
+        Returns:
+            list[str] | None: None if the category was never saved
+        """
+        found = self._category(category)
+        if found is None:
+            return None
+        return [
+            name
+            for (name,) in self._conn().execute(
+                "SELECT p.name FROM overall o "
+                "JOIN competitors p ON p.id = o.competitor_id "
+                "WHERE o.category_id = ? ORDER BY o.position LIMIT ?",
+                (found[0], limit),
+            )
+        ]
+
+    def overall(self, category: str) -> Optional[dict]:
+        """
+        Overall ranking with every route's score and time.
+
+        Returns:
+            dict | None: {"route_count", "use_time_tiebreak", "rows"} with rows
+            {"rank", "name", "club", "scores", "times", "total"} in ranking order,
+            or None if the category was never saved
+        """
+        found = self._category(category)
+        if found is None:
+            return None
+        category_id, route_count, use_time = found
+        conn = self._conn()
+
+        per_route: dict[int, tuple[list, list]] = {}
+        for competitor_id, route_index, score, seconds in conn.execute(
+            "SELECT s.competitor_id, r.route_index, s.score, t.seconds FROM routes r "
+            "JOIN scores s ON s.route_id = r.id "
+            "LEFT JOIN times t "
+            "ON t.route_id = s.route_id AND t.competitor_id = s.competitor_id "
+            "WHERE r.category_id = ?",
+            (category_id,),
+        ):
+            scores, times = per_route.setdefault(
+                competitor_id, ([None] * route_count, [None] * route_count)
+            )
+            scores[route_index - 1] = score
+            times[route_index - 1] = seconds
+
+        rows = []
+        for competitor_id, rank, name, club, total in conn.execute(
+            "SELECT o.competitor_id, o.rank, p.name, p.club, o.total FROM overall o "
+            "JOIN competitors p ON p.id = o.competitor_id "
+            "WHERE o.category_id = ? ORDER BY o.position",
+            (category_id,),
+        ):
+            scores, times = per_route.get(
+                competitor_id, ([None] * route_count, [None] * route_count)
+            )
+            rows.append(
+                {
+                    "rank": rank,
+                    "name": name,
+                    "club": club,
+                    "scores": scores,
+                    "times": times,
+                    "total": total,
+                }
+            )
+        return {"route_count": route_count, "use_time_tiebreak": use_time, "rows": rows}
+
+    def route(self, category: str, route_index: int) -> Optional[list[dict]]:
+        """
+        Ranking of one route (1-based index).
+
+        Returns:
+            list[dict] | None: {"rank", "name", "club", "score", "time", "points"}
+            in ranking order, or None if the category or route does not exist
+        """
+        found = self._category(category)
+        if found is None or not 1 <= route_index <= found[1]:
+            return None
+        return [
+            {
+                "rank": rank,
+                "name": name,
+                "club": club,
+                "score": score,
+                "time": seconds,
+                "points": points,
+            }
+            for rank, name, club, score, seconds, points in self._conn().execute(
+                "SELECT s.rank, p.name, p.club, s.score, t.seconds, s.points "
+                "FROM routes r "
+                "JOIN scores s ON s.route_id = r.id "
+                "JOIN competitors p ON p.id = s.competitor_id "
+                "LEFT JOIN times t "
+                "ON t.route_id = s.route_id AND t.competitor_id = s.competitor_id "
+                "WHERE r.category_id = ? AND r.route_index = ? ORDER BY s.position",
+                (found[0], route_index),
+            )
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "competition": self.competition,
+            "categories": len(self.categories()),
+            "saves": self.saves,
+            "rows_written": self.rows_written,
+            "last_save_ms": round(self.last_save_ms, 3),
+        }
+
+
+# Global store (opened on first use)
+_results_store: Optional[ResultsStore] = None
+_results_store_lock = threading.Lock()
+
+
+def get_results_store() -> ResultsStore:
+    """Get or create the global results store"""
+    global _results_store
+    if _results_store is None:
+        with _results_store_lock:
+            if _results_store is None:
+                _results_store = ResultsStore(RESULTS_DB)
+    return _results_store
+
+
+def close_results_store() -> None:
+    global _results_store
+    with _results_store_lock:
+        if _results_store is not None:
+            _results_store.close()
+            _results_store = None
+
+
+__all__ = [
+    "ResultsStore",
+    "RESULTS_DB",
+    "RESULTS_COMPETITION",
+    "get_results_store",
+    "close_results_store",
+]
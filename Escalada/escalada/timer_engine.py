@@ -0,0 +1,209 @@
+"""
+Server-side climbing timers for every box on one scheduler
+START_TIMER/STOP_TIMER/RESUME_TIMER arm and disarm a monotonic deadline per
+box; a single task ticks TIMER_TICK_HZ times a second, pushes the remaining
+seconds to viewers and fires expiry through a hashed timing wheel, so judge
+tablets no longer have to POST TIMER_SYNC every second
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+TIMER_ENGINE_ENABLED = os.getenv("TIMER_ENGINE_ENABLED", "1") == "1"
+# Scheduler ticks per second: expiry precision (viewers still get whole seconds)
+TIMER_TICK_HZ = float(os.getenv("TIMER_TICK_HZ", "4"))
+# Wheel size in ticks; longer deadlines wait out extra laps in their slot
+TIMER_WHEEL_SLOTS = 512
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel keyed by tick number
+
+    arm() and cancel() are O(1); advance() only looks at the slots of the
+    ticks that passed, not at every armed timer.
+    """
+
+    def __init__(self, slots: int = TIMER_WHEEL_SLOTS):
+        self._slots: list[dict[int, int]] = [{} for _ in range(slots)]
+        self._where: dict[int, int] = {}
+        self.tick = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def arm(self, key: int, due: int) -> None:
+        """Fire `key` at tick `due` (the next tick if that has passed)."""
+        self.cancel(key)
+        due = max(due, self.tick + 1)
+        self._slots[due % len(self._slots)][key] = due
+        self._where[key] = due
+
+    def cancel(self, key: int) -> None:
+        due = self._where.pop(key, None)
+        if due is not None:
+            del self._slots[due % len(self._slots)][key]
+
+    def advance(self, tick: int) -> list[int]:
+        """Move to `tick`; returns the keys due at any tick passed on the way."""
+        expired = []
+        # A stalled loop never scans more than one full lap
+        start = max(self.tick + 1, tick - len(self._slots) + 1)
+        for t in range(start, tick + 1):
+            slot = self._slots[t % len(self._slots)]
+            for key in [k for k, due in slot.items() if due <= tick]:
+                del slot[key]
+                del self._where[key]
+                expired.append(key)
+        self.tick = max(self.tick, tick)
+        return expired
+
+
+class _Timer:
+    __slots__ = ("deadline", "ends_at", "shown")
+
+    def __init__(self, remaining: float):
+        self.deadline = time.monotonic() + remaining
+        # Same instant on the wall clock (epoch ms), for clients
+        self.ends_at = int((time.time() + remaining) * 1000)
+        self.shown: Optional[int] = None
+
+
+class TimerEngine:
+    """
+    Running timers of all boxes on this worker
+
+    Remaining time is always derived from a monotonic deadline, never counted
+    down, so a late tick cannot drift the clock. `on_tick` receives the boxes
+    whose displayed second changed; `on_expire` runs as a task per expired box.
+    """
+
+    def __init__(
+        self,
+        on_tick: Callable[[dict[int, int]], None],
+        on_expire: Callable[[int], Awaitable[None]],
+        hz: float = TIMER_TICK_HZ,
+    ):
+        self.on_tick = on_tick
+        self.on_expire = on_expire
+        self.interval = 1 / hz
+        self._wheel = TimerWheel()
+        self._timers: dict[int, _Timer] = {}
+        self._origin = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._expiring: set[asyncio.Task] = set()
+
+        # Counters (see GET /api/stats/timers)
+        self.ticks = 0
+        self.frames = 0
+        self.expired = 0
+        self.late_ticks = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        tasks = [t for t in (self._task, *self._expiring) if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._expiring.clear()
+
+    # ==================== CONTROL ====================
+
+    def run(self, box_id: int, remaining: float) -> None:
+        """Start or resume a box's timer with `remaining` seconds to go."""
+        timer = self._timers[box_id] = _Timer(remaining)
+        self._wheel.arm(box_id, math.ceil((timer.deadline - self._origin) / self.interval))
+
+    def stop(self, box_id: int) -> Optional[float]:
+        """Disarm a box's timer; returns the seconds it had left, if it ran."""
+        timer = self._timers.pop(box_id, None)
+        self._wheel.cancel(box_id)
+        if timer is None:
+            return None
+        return max(0.0, timer.deadline - time.monotonic())
+
+    def running(self, box_id: int) -> bool:
+        return box_id in self._timers
+
+    def ends_at(self, box_id: int) -> Optional[int]:
+        """When a running timer hits zero, in server epoch milliseconds."""
+        timer = self._timers.get(box_id)
+        return timer.ends_at if timer is not None else None
+
+    def remaining(self, box_id: int) -> Optional[float]:
+        timer = self._timers.get(box_id)
+        if timer is None:
+            return None
+        return max(0.0, timer.deadline - time.monotonic())
+
+    # ==================== SCHEDULER ====================
+
+    async def _run(self) -> None:
+        due = time.monotonic()
+        while True:
+            due += self.interval
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind (loop was blocked): skip to now instead of bursting
+                self.late_ticks += 1
+                due = time.monotonic()
+                await asyncio.sleep(0)
+            try:
+                self._tick(time.monotonic())
+            except Exception as e:
+                logger.error(f"Timer tick failed: {e}")
+
+    def _tick(self, now: float) -> None:
+        self.ticks += 1
+        changed = {}
+        for box_id in self._wheel.advance(int((now - self._origin) / self.interval)):
+            if self._timers.pop(box_id).shown != 0:
+                changed[box_id] = 0
+            self.expired += 1
+            task = asyncio.create_task(self.on_expire(box_id))
+            self._expiring.add(task)
+            task.add_done_callback(self._expiring.discard)
+
+        for box_id, timer in self._timers.items():
+            # Whole seconds, rounded up like the tablets show them
+            shown = math.ceil(max(0.0, timer.deadline - now) - 1e-6)
+            if shown != timer.shown:
+                timer.shown = changed[box_id] = shown
+        if changed:
+            self.frames += len(changed)
+            self.on_tick(changed)
+
+    def stats(self) -> dict:
+        return {
+            "tick_hz": round(1 / self.interval, 3),
+            "running": len(self._timers),
+            "armed": len(self._wheel),
+            "ticks": self.ticks,
+            "frames": self.frames,
+            "expired": self.expired,
+            "late_ticks": self.late_ticks,
+        }
+
+
+__all__ = [
+    "TIMER_ENGINE_ENABLED",
+    "TIMER_TICK_HZ",
+    "TimerEngine",
+    "TimerWheel",
+]
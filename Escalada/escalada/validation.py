@@ -5,23 +5,181 @@ Validates all command types and API inputs
 
 import logging
 import re
-from typing import Dict, List, Optional, Self
+from typing import Annotated, Any, Dict, List, Literal, Optional, Self, Union, get_args
 
-from pydantic import (BaseModel, ConfigDict, Field, field_validator,
-                      model_validator)
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    TypeAdapter,
+    field_validator,
+    model_validator,
+)
 
 logger = logging.getLogger(__name__)
 
 # ==================== VALIDATOR FUNCTIONS ====================
 
+# Commands accepted by POST /api/cmd and the WebSocket command channel
+ALLOWED_CMD_TYPES = {
+    "START_TIMER",
+    "STOP_TIMER",
+    "RESUME_TIMER",
+    "PROGRESS_UPDATE",
+    "REQUEST_ACTIVE_COMPETITOR",
+    "SUBMIT_SCORE",
+    "INIT_ROUTE",
+    "REQUEST_STATE",
+    "SET_TIME_CRITERION",
+    "REGISTER_TIME",
+    "TIMER_SYNC",
+    "ACTIVE_CLIMBER",
+    "RESET_BOX",
+}
+
+
+def check_competitor_name(v: Optional[str]) -> Optional[str]:
+    """Validate competitor name is safe"""
+    if v is None:
+        return v
+
+    # Remove leading/trailing whitespace
+    v = v.strip()
+
+    # Check for malicious patterns (SQL injection, XSS)
+    dangerous_patterns = [
+        "--",
+        "/*",
+        "*/",
+        "DROP",
+        "DELETE",
+        "INSERT",
+        "UPDATE",
+        "SELECT",
+        "<script",
+        "</script",
+        "javascript:",
+        "onerror=",
+        "onclick=",
+        "onload=",
+        "<iframe",
+        "<object",
+        "<embed",
+        "eval(",
+        "alert(",
+    ]
+
+    v_upper = v.upper()
+    for pattern in dangerous_patterns:
+        if pattern.upper() in v_upper:
+            raise ValueError(f"competitor contains potentially dangerous pattern: {pattern}")
+
+    # Block SQL injection with quotes (but allow apostrophes in names like O'Connor)
+    if "'" in v and ("OR" in v_upper or "AND" in v_upper or "=" in v):
+        raise ValueError("competitor contains potential SQL injection pattern")
+
+    # Block HTML tags
+    if "<" in v and ">" in v:
+        raise ValueError("competitor contains HTML tags")
+
+    if len(v) == 0:
+        raise ValueError("competitor name cannot be empty")
+
+    return v
+
+
+def check_categorie(v: Optional[str]) -> Optional[str]:
+    """Validate category name"""
+    if v is None:
+        return v
+    v = v.strip()
+    if len(v) == 0:
+        raise ValueError("categorie cannot be empty")
+    return v
+
+
+def check_timer_preset(v: Optional[str]) -> Optional[str]:
+    """Validate timer preset format (MM:SS) and normalize to zero-padded format"""
+    if v is None:
+        return v
+
+    v = v.strip()
+    if not isinstance(v, str):
+        raise ValueError("timerPreset must be string")
+
+    # Expected format: MM:SS
+    parts = v.split(":")
+    if len(parts) != 2:
+        raise ValueError("timerPreset must be MM:SS format")
+
+    try:
+        mins = int(parts[0])
+        secs = int(parts[1])
+
+        if mins < 0 or mins > 99:
+            raise ValueError("minutes must be 0-99")
+        if secs < 0 or secs > 59:
+            raise ValueError("seconds must be 0-59")
+
+        # TASK 2.2: Auto-pad single-digit minutes (5:00 → 05:00)
+        # This prevents frontend/backend mismatch where frontend sends "5:00"
+        normalized = f"{mins:02d}:{secs:02d}"
+
+        logger.debug(f"Normalized timerPreset: {v} → {normalized}")
+        return normalized
+
+    except (ValueError, IndexError):
+        raise ValueError("timerPreset must be MM:SS format with valid numbers")
+
+
+def check_competitors_list(v: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    """Validate competitors list format"""
+    if v is None:
+        return v
+
+    if not isinstance(v, list):
+        raise ValueError("competitors must be a list")
+
+    if len(v) == 0:
+        return v
+
+    if len(v) > 500:
+        raise ValueError("competitors cannot exceed 500 entries")
+
+    for i, competitor in enumerate(v):
+        if not isinstance(competitor, dict):
+            raise ValueError(f"competitor {i} must be a dict")
+
+        if "nume" not in competitor:
+            raise ValueError(f'competitor {i} missing "nume" field')
+
+        if not isinstance(competitor["nume"], str):
+            raise ValueError(f'competitor {i} "nume" must be string')
+
+        name = competitor["nume"].strip()
+        if len(name) == 0:
+            raise ValueError(f'competitor {i} "nume" cannot be empty')
+
+        # Validate name safety
+        dangerous_patterns = ["--", "/*", "<script", "javascript:", "onerror="]
+        for pattern in dangerous_patterns:
+            if pattern.upper() in name.upper():
+                raise ValueError(f"competitor {i} contains dangerous pattern: {pattern}")
+
+    return v
+
 
 class ValidatedCmd(BaseModel):
-    """Enhanced Cmd model with comprehensive validation"""
+    """
+    Enhanced Cmd model with comprehensive validation
+
+    Flat model covering every command type. The live command path validates
+    with validate_command() instead, which only checks the fields of the
+    command's own type.
+    """
 
     # Accept -1 as sentinel for global commands (e.g., SET_TIME_CRITERION)
-    boxId: int = Field(
-        ..., ge=-1, le=9999, description="Box ID (-1 for global, 0-9999 for boxes)"
-    )
+    boxId: int = Field(..., ge=-1, le=9999, description="Box ID (-1 for global, 0-9999 for boxes)")
     type: str = Field(..., min_length=1, max_length=50, description="Command type")
 
     # Generic optional fields with validation
@@ -37,12 +195,8 @@ class ValidatedCmd(BaseModel):
     )
 
     # INIT_ROUTE fields
-    routeIndex: Optional[int] = Field(
-        None, gt=0, le=999, description="Route index (1-999)"
-    )
-    holdsCount: Optional[int] = Field(
-        None, ge=0, le=100, description="Hold count (0-100)"
-    )
+    routeIndex: Optional[int] = Field(None, gt=0, le=999, description="Route index (1-999)")
+    holdsCount: Optional[int] = Field(None, ge=0, le=100, description="Hold count (0-100)")
     competitors: Optional[List[Dict]] = Field(None, description="Competitors list")
     categorie: Optional[str] = Field(None, max_length=100, description="Category name")
     timerPreset: Optional[str] = Field(
@@ -50,9 +204,7 @@ class ValidatedCmd(BaseModel):
     )
 
     # Timer sync
-    remaining: Optional[float] = Field(
-        None, ge=0, le=9999, description="Remaining seconds"
-    )
+    remaining: Optional[float] = Field(None, ge=0, le=9999, description="Remaining seconds")
 
     # Time criterion
     timeCriterionEnabled: Optional[bool] = None
@@ -85,163 +237,29 @@ class ValidatedCmd(BaseModel):
     @classmethod
     def validate_type(cls, v: str) -> str:
         """Validate command type is one of allowed types"""
-        allowed_types = {
-            "START_TIMER",
-            "STOP_TIMER",
-            "RESUME_TIMER",
-            "PROGRESS_UPDATE",
-            "REQUEST_ACTIVE_COMPETITOR",
-            "SUBMIT_SCORE",
-            "INIT_ROUTE",
-            "REQUEST_STATE",
-            "SET_TIME_CRITERION",
-            "REGISTER_TIME",
-            "TIMER_SYNC",
-            "ACTIVE_CLIMBER",
-            "RESET_BOX",
-        }
-        if v not in allowed_types:
-            raise ValueError(f"type must be one of {allowed_types}, got {v}")
+        if v not in ALLOWED_CMD_TYPES:
+            raise ValueError(f"type must be one of {ALLOWED_CMD_TYPES}, got {v}")
         return v
 
     @field_validator("competitor")
     @classmethod
     def validate_competitor_name(cls, v: Optional[str]) -> Optional[str]:
-        """Validate competitor name is safe"""
-        if v is None:
-            return v
-
-        # Remove leading/trailing whitespace
-        v = v.strip()
-
-        # Check for malicious patterns (SQL injection, XSS)
-        dangerous_patterns = [
-            "--",
-            "/*",
-            "*/",
-            "DROP",
-            "DELETE",
-            "INSERT",
-            "UPDATE",
-            "SELECT",
-            "<script",
-            "</script",
-            "javascript:",
-            "onerror=",
-            "onclick=",
-            "onload=",
-            "<iframe",
-            "<object",
-            "<embed",
-            "eval(",
-            "alert(",
-        ]
-
-        v_upper = v.upper()
-        for pattern in dangerous_patterns:
-            if pattern.upper() in v_upper:
-                raise ValueError(
-                    f"competitor contains potentially dangerous pattern: {pattern}"
-                )
-
-        # Block SQL injection with quotes (but allow apostrophes in names like O'Connor)
-        if "'" in v and ("OR" in v_upper or "AND" in v_upper or "=" in v):
-            raise ValueError("competitor contains potential SQL injection pattern")
-
-        # Block HTML tags
-        if "<" in v and ">" in v:
-            raise ValueError("competitor contains HTML tags")
-
-        if len(v) == 0:
-            raise ValueError("competitor name cannot be empty")
-
-        return v
+        return check_competitor_name(v)
 
     @field_validator("categorie")
     @classmethod
     def validate_categorie(cls, v: Optional[str]) -> Optional[str]:
-        """Validate category name"""
-        if v is None:
-            return v
-        v = v.strip()
-        if len(v) == 0:
-            raise ValueError("categorie cannot be empty")
-        return v
+        return check_categorie(v)
 
     @field_validator("timerPreset")
     @classmethod
     def validate_timer_preset(cls, v: Optional[str]) -> Optional[str]:
-        """Validate timer preset format (MM:SS) and normalize to zero-padded format"""
-        if v is None:
-            return v
-
-        v = v.strip()
-        if not isinstance(v, str):
-            raise ValueError("timerPreset must be string")
-
-        # Expected format: MM:SS
-        parts = v.split(":")
-        if len(parts) != 2:
-            raise ValueError("timerPreset must be MM:SS format")
-
-        try:
-            mins = int(parts[0])
-            secs = int(parts[1])
-
-            if mins < 0 or mins > 99:
-                raise ValueError("minutes must be 0-99")
-            if secs < 0 or secs > 59:
-                raise ValueError("seconds must be 0-59")
-
-            # TASK 2.2: Auto-pad single-digit minutes (5:00 → 05:00)
-            # This prevents frontend/backend mismatch where frontend sends "5:00"
-            normalized = f"{mins:02d}:{secs:02d}"
-
-            logger.debug(f"Normalized timerPreset: {v} → {normalized}")
-            return normalized
-
-        except (ValueError, IndexError):
-            raise ValueError("timerPreset must be MM:SS format with valid numbers")
+        return check_timer_preset(v)
 
     @field_validator("competitors")
     @classmethod
     def validate_competitors_list(cls, v: Optional[List[Dict]]) -> Optional[List[Dict]]:
-        """Validate competitors list format"""
-        if v is None:
-            return v
-
-        if not isinstance(v, list):
-            raise ValueError("competitors must be a list")
-
-        if len(v) == 0:
-            return v
-
-        if len(v) > 500:
-            raise ValueError("competitors cannot exceed 500 entries")
-
-        for i, competitor in enumerate(v):
-            if not isinstance(competitor, dict):
-                raise ValueError(f"competitor {i} must be a dict")
-
-            if "nume" not in competitor:
-                raise ValueError(f'competitor {i} missing "nume" field')
-
-            if not isinstance(competitor["nume"], str):
-                raise ValueError(f'competitor {i} "nume" must be string')
-
-            name = competitor["nume"].strip()
-            if len(name) == 0:
-                raise ValueError(f'competitor {i} "nume" cannot be empty')
-
-            # Validate name safety
-            dangerous_patterns = ["--", "/*", "<script", "javascript:", "onerror="]
-            for pattern in dangerous_patterns:
-                if pattern.upper() in name.upper():
-                    raise ValueError(
-                        f"competitor {i} contains dangerous pattern: {pattern}"
-                    )
-
-        return v
+        return check_competitors_list(v)
 
     @model_validator(mode="after")
     def validate_cmd_fields(self) -> Self:
@@ -287,6 +305,193 @@ class ValidatedCmd(BaseModel):
     model_config = ConfigDict(extra="forbid")  # Forbid unknown fields
 
 
+# ==================== PER-COMMAND MODELS ====================
+# One small model per command type, selected by the "type" discriminator.
+# Fields a command type does not use are rejected by validate_command, so
+# nothing unvalidated is echoed to subscribers or journaled.
+
+
+class _CmdBase(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Accept -1 as sentinel for global commands (e.g., SET_TIME_CRITERION)
+    boxId: int = Field(..., ge=-1, le=9999)
+    sessionId: Optional[str] = Field(None, min_length=1, max_length=64)
+    boxVersion: Optional[int] = Field(None, ge=0, le=99999)
+
+
+class SimpleCmd(_CmdBase):
+    """Commands that carry no payload beyond the box/session fields"""
+
+    type: Literal[
+        "START_TIMER",
+        "STOP_TIMER",
+        "RESUME_TIMER",
+        "REQUEST_STATE",
+        "REQUEST_ACTIVE_COMPETITOR",
+        "RESET_BOX",
+    ]
+    # Client-timed boxes report the remaining time on STOP/RESUME
+    remaining: Optional[float] = Field(None, ge=0, le=9999)
+
+
+class ActiveClimberCmd(_CmdBase):
+    type: Literal["ACTIVE_CLIMBER"]
+    competitor: Optional[str] = Field(None, min_length=1, max_length=255)
+
+    @field_validator("competitor")
+    @classmethod
+    def validate_competitor_name(cls, v: Optional[str]) -> Optional[str]:
+        return check_competitor_name(v)
+
+
+class ProgressUpdateCmd(_CmdBase):
+    type: Literal["PROGRESS_UPDATE"]
+    delta: float = Field(..., ge=-10.0, le=10.0)
+
+
+class TimerSyncCmd(_CmdBase):
+    type: Literal["TIMER_SYNC"]
+    remaining: float = Field(..., ge=0, le=9999)
+
+
+class RegisterTimeCmd(_CmdBase):
+    type: Literal["REGISTER_TIME"]
+    registeredTime: float = Field(..., ge=0, le=3600)
+
+
+class SubmitScoreCmd(_CmdBase):
+    type: Literal["SUBMIT_SCORE"]
+    score: float = Field(..., ge=0.0, le=100.0)
+    competitor: str = Field(..., min_length=1, max_length=255)
+    registeredTime: Optional[float] = Field(None, ge=0, le=3600)
+    competitorIdx: Optional[int] = Field(None, ge=0, le=1000)
+
+    @field_validator("competitor")
+    @classmethod
+    def validate_competitor_name(cls, v: Optional[str]) -> Optional[str]:
+        return check_competitor_name(v)
+
+
+class InitRouteCmd(_CmdBase):
+    type: Literal["INIT_ROUTE"]
+    routeIndex: int = Field(..., gt=0, le=999)
+    holdsCount: int = Field(..., ge=0, le=100)
+    competitors: List[Dict]
+    categorie: Optional[str] = Field(None, max_length=100)
+    timerPreset: Optional[str] = Field(None, max_length=20)
+
+    @field_validator("competitors")
+    @classmethod
+    def validate_competitors_list(cls, v: List[Dict]) -> List[Dict]:
+        return check_competitors_list(v)
+
+    @field_validator("categorie")
+    @classmethod
+    def validate_categorie(cls, v: Optional[str]) -> Optional[str]:
+        return check_categorie(v)
+
+    @field_validator("timerPreset")
+    @classmethod
+    def validate_timer_preset(cls, v: Optional[str]) -> Optional[str]:
+        return check_timer_preset(v)
+
+
+class SetTimeCriterionCmd(_CmdBase):
+    type: Literal["SET_TIME_CRITERION"]
+    timeCriterionEnabled: bool
+
+
+AnyCmd = Annotated[
+    Union[
+        SimpleCmd,
+        ActiveClimberCmd,
+        ProgressUpdateCmd,
+        TimerSyncCmd,
+        RegisterTimeCmd,
+        SubmitScoreCmd,
+        InitRouteCmd,
+        SetTimeCriterionCmd,
+    ],
+    Field(discriminator="type"),
+]
+
+_cmd_adapter = TypeAdapter(AnyCmd)
+
+# Fields each command type may carry, taken from its per-type model
+_CMD_FIELDS: Dict[str, frozenset] = {
+    cmd_type: frozenset(model.model_fields)
+    for model in get_args(get_args(AnyCmd)[0])
+    for cmd_type in get_args(model.model_fields["type"].annotation)
+}
+
+
+def _check_common(cmd: Any) -> None:
+    box_id = cmd.boxId
+    if not -1 <= box_id <= 9999:
+        raise ValueError(f"boxId must be between -1 and 9999, got {box_id}")
+    session_id = cmd.sessionId
+    if session_id is not None and not 1 <= len(session_id) <= 64:
+        raise ValueError("sessionId must be 1-64 characters")
+    box_version = cmd.boxVersion
+    if box_version is not None and not 0 <= box_version <= 99999:
+        raise ValueError("boxVersion must be between 0 and 99999")
+
+
+def _fast_progress_update(cmd: Any) -> None:
+    _check_common(cmd)
+    delta = cmd.delta
+    if delta is None:
+        raise ValueError("PROGRESS_UPDATE requires delta field")
+    if not -10.0 <= delta <= 10.0:
+        raise ValueError(f"delta must be between -10 and 10, got {delta}")
+
+
+def _fast_timer_sync(cmd: Any) -> None:
+    _check_common(cmd)
+    remaining = cmd.remaining
+    if remaining is None:
+        raise ValueError("TIMER_SYNC requires remaining field")
+    if not 0 <= remaining <= 9999:
+        raise ValueError(f"remaining must be between 0 and 9999, got {remaining}")
+
+
+# High-frequency commands checked without building a model; the rules must
+# stay in sync with ProgressUpdateCmd / TimerSyncCmd
+_FAST_PATHS = {
+    "PROGRESS_UPDATE": _fast_progress_update,
+    "TIMER_SYNC": _fast_timer_sync,
+}
+
+
+def _check_foreign(cmd: Any) -> None:
+    allowed = _CMD_FIELDS.get(cmd.type)
+    if allowed is None:
+        return  # unknown type; the adapter reports it
+    for name in getattr(cmd, "model_fields_set", ()):
+        # Legacy "time" is an alias of registeredTime
+        field = "registeredTime" if name == "time" else name
+        if field not in allowed and getattr(cmd, name) is not None:
+            raise ValueError(f"{cmd.type} does not accept field {name}")
+
+
+def validate_command(cmd: Any) -> None:
+    """
+    Validate an already-parsed command (any object with Cmd attributes)
+
+    Set fields that the command type does not use are rejected.
+
+    Raises:
+        ValueError: If validation fails (pydantic's ValidationError included)
+    """
+    _check_foreign(cmd)
+    fast = _FAST_PATHS.get(cmd.type)
+    if fast is not None:
+        fast(cmd)
+        return
+    _cmd_adapter.validate_python(cmd, from_attributes=True)
+
+
 class RateLimitConfig:
     """Rate limiting configuration"""
 
@@ -370,6 +575,16 @@ class InputSanitizer:
 
 __all__ = [
     "ValidatedCmd",
+    "AnyCmd",
+    "SimpleCmd",
+    "ActiveClimberCmd",
+    "ProgressUpdateCmd",
+    "TimerSyncCmd",
+    "RegisterTimeCmd",
+    "SubmitScoreCmd",
+    "InitRouteCmd",
+    "SetTimeCriterionCmd",
+    "validate_command",
     "RateLimitConfig",
     "InputSanitizer",
 ]
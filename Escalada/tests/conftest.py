@@ -2,10 +2,50 @@
 """
 Pytest configuration and fixtures for Escalada tests
 """
+import os
+import shutil
 import sys
+import tempfile
 import types
 from typing import Any
 
+import pytest
+
+# Runtime data (journal, checkpoint, history, results DB, spill files) and the
+# log go to a throwaway directory instead of ./data and ./escalada.log. Set
+# before any escalada module reads its settings, and inherited by the worker
+# processes some tests start
+_DATA_DIR = tempfile.mkdtemp(prefix="escalada-tests-")
+os.environ.update(
+    {
+        "JOURNAL_DIR": os.path.join(_DATA_DIR, "journal"),
+        "CHECKPOINT_PATH": os.path.join(_DATA_DIR, "checkpoint.json"),
+        "HISTORY_DIR": os.path.join(_DATA_DIR, "history"),
+        "RESULTS_DB": os.path.join(_DATA_DIR, "results.db"),
+        "BOX_SPILL_DIR": os.path.join(_DATA_DIR, "spill"),
+        "LOG_FILE": os.path.join(_DATA_DIR, "escalada.log"),
+    }
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _remove_data_dir():
+    yield
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_data_dir(tmp_path, monkeypatch):
+    """A fresh data directory per test, so app lifespans don't recover each other's boxes"""
+    main = sys.modules.get("escalada.main")
+    if main is not None:
+        monkeypatch.setattr(main, "JOURNAL_DIR", str(tmp_path / "journal"))
+        monkeypatch.setattr(main, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.json"))
+        monkeypatch.setattr(main, "HISTORY_DIR", str(tmp_path / "history"))
+    results_store = sys.modules.get("escalada.results_store")
+    if results_store is not None:
+        monkeypatch.setattr(results_store, "RESULTS_DB", str(tmp_path / "results.db"))
+
 
 def pytest_configure(config):
     """Configure pytest - only stub if modules aren't installed"""
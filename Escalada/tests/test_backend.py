@@ -0,0 +1,185 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from escalada.checkpoint import load_checkpoint
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 3
+TAPS = 10
+
+
+def _worker(index, env, ready, go, results):
+    """One uvicorn-like worker: its own app, lifespan and live module."""
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+
+    from escalada.main import app
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/ws/1") as ws:
+            session_id = ws.receive_json()["sessionId"]
+            ready.put(index)
+            go.wait()
+            # Read before any worker can finish and disconnect
+            stats = client.get("/api/stats/backend").json()
+
+            if index == 0:
+                response = client.post(
+                    "/api/cmd",
+                    json={
+                        "boxId": 1,
+                        "type": "INIT_ROUTE",
+                        "routeIndex": 1,
+                        "holdsCount": 50,
+                        "competitors": [{"nume": "Alex"}, {"nume": "Bob"}],
+                        "sessionId": session_id,
+                    },
+                )
+                assert response.status_code == 200, response.text
+
+            # The INIT_ROUTE snapshot reaches every worker through the broker
+            msg = ws.receive_json()
+            while not (msg.get("type") == "STATE_SNAPSHOT" and msg["initiated"]):
+                msg = ws.receive_json()
+
+            for _ in range(TAPS):
+                response = client.post(
+                    "/api/cmd",
+                    json={
+                        "boxId": 1,
+                        "type": "PROGRESS_UPDATE",
+                        "delta": 1,
+                        "sessionId": session_id,
+                    },
+                )
+                assert response.status_code == 200, response.text
+
+            echoes = 0
+            while True:
+                msg = ws.receive_json()
+                if msg.get("type") == "PROGRESS_UPDATE":
+                    echoes += 1
+                elif msg.get("type") == "STATE_SNAPSHOT":
+                    if msg["holdCount"] == WORKERS * TAPS:
+                        break
+            state = client.get("/api/state/1").json()
+            results.put((index, echoes, state["holdCount"], stats["broker"]["workers"]))
+
+
+class MultiWorkerBrokerTest(unittest.TestCase):
+    """Several worker processes share box state and broadcasts via the broker"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.socket = os.path.join(self.tmp.name, "broker.sock")
+        self.checkpoint = os.path.join(self.tmp.name, "checkpoint.json")
+        self.env = {
+            "BROKER_SOCKET": self.socket,
+            "JOURNAL_DIR": os.path.join(self.tmp.name, "journal"),
+            "CHECKPOINT_PATH": self.checkpoint,
+            "LOG_FILE": os.path.join(self.tmp.name, "escalada.log"),
+        }
+
+    def _start_broker(self) -> subprocess.Popen:
+        broker = subprocess.Popen(
+            [sys.executable, "-m", "escalada.broker", "--socket", self.socket],
+            cwd=PROJECT_DIR,
+            env={**os.environ, **self.env},
+        )
+        self.addCleanup(broker.kill)
+        deadline = time.monotonic() + 20
+        while not os.path.exists(self.socket):
+            self.assertIsNone(broker.poll(), "broker exited during startup")
+            self.assertLess(time.monotonic(), deadline, "broker did not start")
+            time.sleep(0.05)
+        return broker
+
+    def test_commands_reach_subscribers_on_every_worker(self):
+        broker = self._start_broker()
+        ctx = multiprocessing.get_context("spawn")
+        ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+        env = {**self.env, "STATE_BACKEND": "broker"}
+        workers = [
+            ctx.Process(target=_worker, args=(i, env, ready, go, results))
+            for i in range(WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+            self.addCleanup(worker.kill)
+        for _ in workers:
+            ready.get(timeout=60)
+        go.set()
+
+        outcome = sorted(results.get(timeout=60) for _ in workers)
+        for worker in workers:
+            worker.join(timeout=10)
+            self.assertEqual(worker.exitcode, 0)
+
+        # Every worker saw every tap and reads the same final state
+        for index, echoes, hold_count, connected in outcome:
+            self.assertEqual(echoes, WORKERS * TAPS, f"worker {index}")
+            self.assertEqual(hold_count, WORKERS * TAPS, f"worker {index}")
+            self.assertEqual(connected, WORKERS)
+
+        # The broker journaled the commands and checkpoints them on shutdown
+        broker.send_signal(signal.SIGTERM)
+        self.assertEqual(broker.wait(timeout=20), 0)
+        box = load_checkpoint(self.checkpoint)["boxes"]["1"]
+        self.assertEqual(box["holdCount"], WORKERS * TAPS)
+        self.assertEqual(box["names"], ["Alex", "Bob"])
+
+
+class AbandonedAcquireTest(unittest.TestCase):
+    """A waiter that gives up must not leave the box locked at the broker"""
+
+    def test_cancelled_and_timed_out_acquires_hand_the_lock_back(self):
+        # Not at module level: spawned workers import this module before
+        # setting STATE_BACKEND, which escalada.backend reads on import
+        from escalada.backend import BrokerBackend
+        from escalada.broker import Broker
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "broker.sock")
+
+        async def scenario():
+            broker = Broker(path)
+            await broker.start()
+            holder = BrokerBackend({}, path)
+            waiter = BrokerBackend({}, path, acquire_timeout=0.2)
+            await holder.start()
+            await waiter.start()
+            try:
+                await holder.acquire(1)
+                cancelled = asyncio.create_task(waiter.acquire(1))
+                await asyncio.sleep(0.05)
+                cancelled.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await cancelled
+                with self.assertRaises(asyncio.TimeoutError):
+                    await waiter.acquire(1)
+
+                # Both queued grants come and go; the box is free again
+                holder.release(1, holder.states[1], False)
+                await asyncio.wait_for(holder.acquire(1), 2)
+                holder.release(1, holder.states[1], False)
+                await holder.get(1)  # Its reply follows the release
+                return waiter.stats()["abandoned"], broker.grants, broker.releases
+            finally:
+                await waiter.close()
+                await holder.close()
+                await broker.close()
+
+        self.assertEqual(asyncio.run(scenario()), (2, 4, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
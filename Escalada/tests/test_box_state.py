@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+
+from escalada.api import live as live_module
+from escalada.api.live import Cmd, cmd, state_locks, state_map
+from escalada.box_state import BoxState
+
+
+def roster(*names):
+    return [{"nume": n, "marked": False} for n in names]
+
+
+class BoxStateRosterTest(unittest.TestCase):
+    def test_index_and_cursor_built_from_roster(self):
+        state = BoxState()
+        state.set_competitors(
+            [
+                {"nume": "Alex", "marked": True},
+                {"nume": "Bob", "marked": False},
+                {"nume": "Cara", "marked": False},
+            ]
+        )
+        self.assertEqual(state.find_competitor("Cara"), 2)
+        self.assertEqual(state.next_unmarked_name(), "Bob")
+
+    def test_find_prefers_valid_index(self):
+        state = BoxState()
+        state.set_competitors(roster("Alex", "Alex", "Bob"))
+        # Duplicate names: the index disambiguates, the name alone picks the first
+        self.assertEqual(state.find_competitor("Alex", 1), 1)
+        self.assertEqual(state.find_competitor("Alex"), 0)
+        self.assertEqual(state.find_competitor(None, 2), 2)
+
+    def test_find_falls_back_to_name(self):
+        state = BoxState()
+        state.set_competitors(roster("Alex", "Bob"))
+        self.assertEqual(state.find_competitor("Bob", 999), 1)
+        self.assertEqual(state.find_competitor("Bob", 0), 1)
+        self.assertIsNone(state.find_competitor("Nobody"))
+        self.assertIsNone(state.find_competitor(None, 999))
+
+    def test_cursor_skips_marked_competitors(self):
+        state = BoxState()
+        state.set_competitors(roster("A", "B", "C", "D"))
+        state.mark_competitor(1)
+        self.assertEqual(state.next_unmarked_name(), "A")
+        state.mark_competitor(0)
+        self.assertEqual(state.next_unmarked_name(), "C")
+        state.mark_competitor(2)
+        state.mark_competitor(3)
+        self.assertEqual(state.next_unmarked_name(), "")
+
+    def test_dict_style_access(self):
+        state = BoxState()
+        state["holdCount"] = 3.0
+        self.assertEqual(state.holdCount, 3.0)
+        self.assertEqual(state.get("holdCount"), 3.0)
+        self.assertIn("sessionId", state)
+        self.assertNotIn("_name_index", state)
+        self.assertIsNone(state.get("missing"))
+        with self.assertRaises(KeyError):
+            state["missing"]
+
+    def test_slots(self):
+        state = BoxState()
+        self.assertFalse(hasattr(state, "__dict__"))
+        with self.assertRaises(AttributeError):
+            state.unknown = 1
+
+
+class SubmitScoreIndexTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+
+    def test_submit_score_by_competitor_idx(self):
+        async def scenario():
+            await cmd(
+                Cmd(
+                    boxId=1,
+                    type="INIT_ROUTE",
+                    competitors=[{"nume": "Alex"}, {"nume": "Bob"}, {"nume": "Cara"}],
+                )
+            )
+            await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitorIdx=1, score=5))
+            await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitor="Alex", score=7))
+            return state_map[1]
+
+        state = asyncio.run(scenario())
+        self.assertEqual([c["marked"] for c in state.competitors], [True, True, False])
+        self.assertEqual(state.currentClimber, "Cara")
+
+    def test_reset_clears_roster_index(self):
+        async def scenario():
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", competitors=[{"nume": "Alex"}]))
+            await cmd(Cmd(boxId=1, type="RESET_BOX"))
+            await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitor="Alex", score=1))
+            return state_map[1]
+
+        state = asyncio.run(scenario())
+        self.assertEqual(state.competitors, [])
+        self.assertEqual(state.currentClimber, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from escalada.api import live as live_module
+from escalada.api.live import (
+    Cmd,
+    _build_snapshot,
+    capture_state,
+    cmd,
+    replay_journal,
+    restore_state,
+    state_locks,
+    state_map,
+)
+from escalada.box_state import BoxState
+from escalada.checkpoint import (
+    CHECKPOINT_FORMAT,
+    Checkpointer,
+    load_checkpoint,
+    write_checkpoint,
+)
+from escalada.journal import Journal, box_key
+
+
+class BoxStateRecordTest(unittest.TestCase):
+    def test_record_round_trip(self):
+        state = BoxState(initiated=True, holdsCount=30, holdCount=12.5, seq=9)
+        state.set_competitors(
+            [{"nume": "Alex", "marked": True}, {"nume": "Bob", "marked": False}]
+        )
+        record = json.loads(json.dumps(state.to_record()))
+        self.assertEqual(record["names"], ["Alex", "Bob"])
+        self.assertEqual(record["marked"], [0])
+
+        restored = BoxState.from_record(record)
+        self.assertEqual(restored, state)
+        self.assertEqual(restored.next_unmarked_name(), "Bob")
+        self.assertEqual(restored.find_competitor("Bob"), 1)
+
+    def test_update_from_record_keeps_roster_identity(self):
+        source = BoxState(holdCount=3.0)
+        source.set_competitors(
+            [{"nume": "Alex", "marked": False}, {"nume": "Bob", "marked": False}]
+        )
+        cache = BoxState.from_record(source.to_record())
+        roster = cache.competitors
+
+        source.mark_competitor(0)
+        source.seq = 4
+        cache.update_from_record(source.to_record())
+        self.assertIs(cache.competitors, roster)
+        self.assertEqual(cache, source)
+        self.assertEqual(cache.next_unmarked_name(), "Bob")
+
+        source.set_competitors([{"nume": "Cara", "marked": False}])
+        cache.update_from_record(source.to_record())
+        self.assertEqual(cache.competitors, [{"nume": "Cara", "marked": False}])
+
+    def test_record_shares_no_mutable_state(self):
+        state = BoxState()
+        state.set_competitors([{"nume": "Alex", "marked": False}])
+        record = state.to_record()
+        state.mark_competitor(0)
+        self.assertEqual(record["marked"], [])
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.journal_dir = os.path.join(self.tmp.name, "journal")
+        self.path = os.path.join(self.tmp.name, "checkpoint.json")
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.journal = None
+        live_module.VALIDATION_ENABLED = self._validation
+        state_map.clear()
+        state_locks.clear()
+
+    def _recover(self) -> int:
+        """What main.recover_state does, against the temp directory."""
+        state_map.clear()
+        checkpoint = load_checkpoint(self.path)
+        after = -1
+        if checkpoint is not None:
+            restore_state(checkpoint)
+            after = checkpoint["journal_generation"]
+        return replay_journal(Journal(self.journal_dir).read(after))
+
+    def test_checkpoint_compacts_journal_and_recovers_with_tail(self):
+        async def scenario():
+            journal = Journal(self.journal_dir)
+            journal.start()
+            live_module.journal = journal
+            checkpointer = Checkpointer(journal, capture_state, self.path, interval=0)
+            try:
+                await cmd(
+                    Cmd(
+                        boxId=1,
+                        type="INIT_ROUTE",
+                        holdsCount=20,
+                        competitors=[{"nume": "Alex"}, {"nume": "Bob"}],
+                    )
+                )
+                await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1))
+                await cmd(Cmd(boxId=2, type="RESET_BOX"))
+                self.assertTrue(await checkpointer.checkpoint())
+                # Nothing new since: skipped
+                self.assertFalse(await checkpointer.checkpoint())
+                # Tail after the checkpoint
+                await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitor="Alex", score=3))
+                await cmd(
+                    Cmd(boxId=2, type="INIT_ROUTE", competitors=[{"nume": "Cara"}])
+                )
+            finally:
+                live_module.journal = None
+                await journal.close()
+            return journal
+
+        journal = asyncio.run(scenario())
+        generations = {gen for _, gen, _ in journal.segments()}
+        self.assertEqual(generations, {2})
+
+        expected = {b: _build_snapshot(b, s) for b, s in state_map.items()}
+        replayed = self._recover()
+        self.assertEqual(replayed, 2)
+        self.assertEqual(
+            {b: _build_snapshot(b, s) for b, s in state_map.items()}, expected
+        )
+
+    def test_restart_writes_to_a_new_generation(self):
+        async def session():
+            journal = Journal(self.journal_dir)
+            journal.start()
+            await journal.append(box_key(1), {"n": 1})
+            await journal.close()
+            return journal.generation
+
+        first = asyncio.run(session())
+        second = asyncio.run(session())
+        self.assertEqual(second, first + 1)
+
+    def test_unknown_format_refuses_to_load(self):
+        write_checkpoint(self.path, {"format": CHECKPOINT_FORMAT + 1, "boxes": {}})
+        with self.assertRaises(RuntimeError):
+            load_checkpoint(self.path)
+        self.assertIsNone(load_checkpoint(os.path.join(self.tmp.name, "missing.json")))
+
+    def test_cold_start_100_boxes_500_competitors_under_one_second(self):
+        for box_id in range(100):
+            state = BoxState(initiated=True, holdsCount=40, routeIndex=2)
+            state.set_competitors(
+                [
+                    {"nume": f"Concurent {box_id}-{i}", "marked": i < 250}
+                    for i in range(500)
+                ]
+            )
+            state_map[box_id] = state
+        payload = capture_state()
+        payload.update(format=CHECKPOINT_FORMAT, journal_generation=1)
+        write_checkpoint(self.path, payload)
+
+        # Short tail: a few taps per box after the checkpoint
+        os.makedirs(self.journal_dir)
+        for box_id in range(100):
+            with open(
+                os.path.join(self.journal_dir, f"box_{box_id}.2.jsonl"), "w"
+            ) as f:
+                for _ in range(20):
+                    line = {
+                        "cmd": {"boxId": box_id, "type": "PROGRESS_UPDATE", "delta": 1}
+                    }
+                    line["sid"] = state_map[box_id].sessionId
+                    f.write(json.dumps(line) + "\n")
+        expected = {b: _build_snapshot(b, s) for b, s in state_map.items()}
+        for b in expected:
+            expected[b]["holdCount"] = 20
+            expected[b]["seq"] += 20
+
+        started = time.perf_counter()
+        self._recover()
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(
+            {b: _build_snapshot(b, s) for b, s in state_map.items()}, expected
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
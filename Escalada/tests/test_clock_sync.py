@@ -0,0 +1,116 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import state_locks, state_map
+from escalada.clock_sync import ClockEstimate
+from escalada.main import app
+from escalada.rate_limit import get_rate_limiter
+
+
+class ClockEstimateTest(unittest.TestCase):
+    def _sample(self, clock: ClockEstimate, rtt_ms: float, offset_ms: float) -> bool:
+        # A PING sent rtt_ms ago, answered by a client running offset_ms ahead
+        ping = clock.ping()
+        clock._pending[ping["timestamp"]] -= rtt_ms / 1000
+        client_time = ping["timestamp"] + offset_ms + rtt_ms / 2
+        return clock.pong({**ping, "type": "PONG", "clientTime": client_time})
+
+    def test_lowest_rtt_sample_wins(self):
+        clock = ClockEstimate()
+        self.assertTrue(self._sample(clock, 400, 900))
+        self.assertTrue(self._sample(clock, 20, 1000))
+        # Slower round trip: kept as a sample, but the estimate stays
+        self.assertFalse(self._sample(clock, 300, 700))
+        self.assertAlmostEqual(clock.offset_ms, 1000, delta=5)
+        self.assertAlmostEqual(clock.rtt_ms, 20, delta=5)
+        self.assertEqual(clock.frame()["type"], "CLOCK")
+
+    def test_any_pong_counts_as_alive(self):
+        clock = ClockEstimate()
+        clock.last_pong -= 100
+        # Old clients send unsolicited PONGs with their own timestamp
+        self.assertFalse(clock.pong({"type": "PONG", "timestamp": 1}))
+        self.assertLess(time.monotonic() - clock.last_pong, 1)
+        self.assertIsNone(clock.offset_ms)
+
+
+    def test_malformed_pong_is_only_a_liveness_signal(self):
+        clock = ClockEstimate()
+        ping = clock.ping()
+        for timestamp in ([ping["timestamp"]], {"t": 1}, "x", True, None):
+            self.assertFalse(clock.pong({"type": "PONG", "timestamp": timestamp}))
+        for client_time in (float("nan"), float("inf"), True, "1"):
+            self.assertFalse(
+                clock.pong({**ping, "type": "PONG", "clientTime": client_time})
+            )
+            ping = clock.ping()
+        self.assertEqual(clock.pongs, 9)
+        self.assertIsNone(clock.offset_ms)
+
+class HeartbeatClockTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        rl = get_rate_limiter()
+        rl.reset_all()
+        rl.max_per_minute = 100000
+        rl.max_per_second = 100000
+        rl.block_duration = 0
+
+    def tearDown(self):
+        state_map.clear()
+        state_locks.clear()
+
+    def test_pong_with_client_time_yields_clock_frame(self):
+        with patch.object(live_module, "CLOCK_SYNC_BURST_INTERVAL_SEC", 0.01):
+            with TestClient(app) as client:
+                with client.websocket_connect("/api/ws/4") as ws:
+                    self.assertEqual(ws.receive_json()["type"], "STATE_SNAPSHOT")
+                    ping = ws.receive_json()
+                    self.assertEqual(ping["type"], "PING")
+                    ws.send_json(
+                        {
+                            "type": "PONG",
+                            "timestamp": ping["timestamp"],
+                            "clientTime": ping["timestamp"] + 5000,
+                        }
+                    )
+                    frame = ws.receive_json()
+                    while frame["type"] == "PING":
+                        frame = ws.receive_json()
+                    stats = client.get("/api/stats/clock").json()
+
+        self.assertEqual(frame["type"], "CLOCK")
+        self.assertAlmostEqual(frame["offsetMs"], 5000, delta=100)
+        self.assertEqual(stats["estimated"], 1)
+        self.assertEqual(live_module._clocks, {})
+
+    def test_tickless_client_gets_timer_end_instant(self):
+        with TestClient(app) as client:
+            session = client.get("/api/state/5").json()["sessionId"]
+            for command in (
+                {
+                    "type": "INIT_ROUTE",
+                    "routeIndex": 1,
+                    "holdsCount": 10,
+                    "competitors": [{"nume": "Alex"}],
+                    "timerPreset": "05:00",
+                },
+                {"type": "START_TIMER", "sessionId": session},
+            ):
+                r = client.post("/api/cmd", json={"boxId": 5, **command})
+                self.assertEqual(r.status_code, 200)
+            with client.websocket_connect("/api/ws/5?ticks=0") as ws:
+                snapshot = ws.receive_json()
+
+        ends_in = snapshot["timerEndsAt"] - time.time() * 1000
+        self.assertAlmostEqual(ends_in, 300_000, delta=2000)
+        self.assertEqual(snapshot["timerState"], "running")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import random
+import tempfile
+import tracemalloc
+import unittest
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import (Cmd, capture_state, channels, cmd,
+                               evict_idle_boxes, get_state, restore_state,
+                               state_locks, state_map)
+from escalada.eviction import SpillStore, approx_size
+from escalada.main import app
+from escalada.rate_limit import get_rate_limiter
+
+
+def _reset():
+    state_map.clear()
+    state_locks.clear()
+    channels.clear()
+    live_module._last_active.clear()
+    live_module._last_broadcast.clear()
+    live_module._event_rings.clear()
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        _reset()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+        live_module.spill = None
+        _reset()
+
+    async def _init(self, box_id: int) -> None:
+        await cmd(
+            Cmd(
+                boxId=box_id,
+                type="INIT_ROUTE",
+                routeIndex=1,
+                holdsCount=0,
+                competitors=[{"nume": "Alex"}],
+            )
+        )
+        await cmd(Cmd(boxId=box_id, type="PROGRESS_UPDATE", delta=1))
+
+    def test_soak_random_probing_keeps_memory_flat(self):
+        """Random GETs for unused boxes must not grow any registry."""
+        rng = random.Random(7)
+
+        async def probe_round():
+            for _ in range(2000):
+                await get_state(rng.randint(0, 9999))
+            return await evict_idle_boxes(ttl=0)
+
+        async def soak():
+            await self._init(1)
+            # Warm-up: fills bounded caches (box ownership) to their size
+            for box_id in range(10000):
+                await get_state(box_id)
+            await evict_idle_boxes(ttl=0)
+            tracemalloc.start()
+            try:
+                await probe_round()
+                baseline = tracemalloc.get_traced_memory()[0]
+                for _ in range(10):
+                    result = await probe_round()
+                    self.assertGreater(result["evicted"], 1000)
+                    # Only the used box survives, and only while not spilled
+                    self.assertEqual(list(state_map), [1])
+                    self.assertLessEqual(len(state_locks), 1)
+                    self.assertLessEqual(len(live_module._last_active), 1)
+                grown = tracemalloc.get_traced_memory()[0] - baseline
+            finally:
+                tracemalloc.stop()
+            return grown
+
+        grown = asyncio.run(soak())
+        # Leaked boxes would be megabytes (~1 KB each, 2000 probes a round);
+        # what remains is bounded caches rehashing
+        self.assertLess(grown, 1024 * 1024)
+        self.assertEqual(state_map[1].holdCount, 1)
+
+    def test_recent_or_watched_boxes_stay(self):
+        async def scenario():
+            await get_state(1)
+            await get_state(2)
+            channels[2] = {object()}
+            result = await evict_idle_boxes(ttl=60)
+            self.assertEqual(result["evicted"], 0)
+            result = await evict_idle_boxes(ttl=0)
+            self.assertEqual(result["evicted"], 1)
+            self.assertEqual(sorted(state_map), [2])
+
+        asyncio.run(scenario())
+
+    def test_used_box_is_spilled_and_comes_back(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        async def scenario():
+            await self._init(3)
+            before = state_map[3].to_record()
+
+            # No spill store: a used box is never dropped
+            self.assertEqual((await evict_idle_boxes(ttl=0))["evicted"], 0)
+
+            live_module.spill = SpillStore(tmp.name)
+            live_module.spill.open()
+            self.assertEqual(
+                await evict_idle_boxes(ttl=0), {"evicted": 1, "spilled": 1}
+            )
+            self.assertNotIn(3, state_map)
+            # Checkpoints no longer carry it; the spill file does
+            self.assertNotIn("3", capture_state()["boxes"])
+
+            # A restart (new store, state from an empty checkpoint) still finds it
+            restore_state({"boxes": {}})
+            live_module.spill = SpillStore(tmp.name)
+            live_module.spill.open()
+            snapshot = await get_state(3)
+            self.assertEqual(state_map[3].to_record(), before)
+            self.assertEqual(snapshot["sessionId"], before["sessionId"])
+            self.assertEqual(live_module.spill.loaded, 1)
+
+            # Same session: commands continue where the box left off
+            await cmd(
+                Cmd(
+                    boxId=3,
+                    type="PROGRESS_UPDATE",
+                    delta=1,
+                    sessionId=before["sessionId"],
+                )
+            )
+            self.assertEqual(state_map[3].holdCount, 2)
+
+        asyncio.run(scenario())
+
+    def test_approx_size_counts_contents(self):
+        self.assertGreater(approx_size({"a": "x" * 1000}), 1000)
+        shared = ["y" * 1000]
+        self.assertLess(approx_size([shared, shared]), 2000)
+
+
+class MemoryEndpointTest(unittest.TestCase):
+    def setUp(self):
+        _reset()
+        rl = get_rate_limiter()
+        rl.reset_all()
+        rl.max_per_minute = 100000
+        rl.max_per_second = 100000
+        rl.block_duration = 0
+
+    def tearDown(self):
+        _reset()
+
+    def test_disconnect_removes_channel_and_report_lists_structures(self):
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/ws/5") as ws:
+                ws.receive_json()
+                self.assertIn(5, channels)
+            client.get("/api/state/6")
+            report = client.get("/api/stats/memory").json()
+
+        self.assertNotIn(5, channels)
+        self.assertEqual(report["channels"]["entries"], 0)
+        self.assertEqual(report["state_map"]["entries"], 2)
+        self.assertGreater(report["state_map"]["bytes"], 0)
+        self.assertEqual(report["eviction"]["sweeps"], 0)
+        for name in ("state_locks", "last_broadcast", "event_rings", "last_active"):
+            self.assertIn("entries", report[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import Cmd, _build_snapshot, cmd, state_locks, state_map
+from escalada.history import HistoryLog, parse_point
+from escalada.main import app
+
+INTERVAL = 4
+
+
+class HistoryLogTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.history = None
+        live_module.VALIDATION_ENABLED = self._validation
+        state_map.clear()
+        state_locks.clear()
+
+    def _snapshot(self) -> dict:
+        # Deep copy: the live roster keeps changing
+        return json.loads(json.dumps(_build_snapshot(1, state_map[1])))
+
+    async def _play(self, history: HistoryLog, taps: int) -> dict[int, tuple]:
+        """Run commands on box 1; returns seq -> (time after it, snapshot)."""
+        live_module.history = history
+        seen = {}
+        await cmd(
+            Cmd(
+                boxId=1,
+                type="INIT_ROUTE",
+                routeIndex=1,
+                holdsCount=0,
+                competitors=[{"nume": "Alex"}, {"nume": "Bob"}],
+            )
+        )
+        seen[state_map[1].seq] = (time.time(), self._snapshot())
+        for i in range(taps):
+            if i == 5:
+                await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitor="Alex", score=5))
+            else:
+                await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1))
+            seen[state_map[1].seq] = (time.time(), self._snapshot())
+        return seen
+
+    def test_state_at_every_seq_and_time_with_bounded_replay(self):
+        async def scenario():
+            history = HistoryLog(self.tmp.name, interval=INTERVAL)
+            await history.start()
+            seen = await self._play(history, 20)
+            for seq, (ts, snapshot) in seen.items():
+                state, info = await history.state_at(
+                    1, "seq", seq, live_module.replay_cmd
+                )
+                self.assertEqual(_build_snapshot(1, state), snapshot)
+                self.assertLessEqual(info["replayed"], INTERVAL)
+                state, _ = await history.state_at(1, "ts", ts, live_module.replay_cmd)
+                self.assertEqual(state.seq, seq)
+            self.assertIsNone(
+                await history.state_at(1, "seq", 0, live_module.replay_cmd)
+            )
+            self.assertGreater(history.cache_hits, 0)
+            await history.close()
+            return seen
+
+        seen = asyncio.run(scenario())
+
+        # Restart: the index is rebuilt from the file; a torn line is dropped
+        path = os.path.join(self.tmp.name, "box_1.jsonl")
+        with open(path, "ab") as f:
+            f.write(b'{"seq":99,"ts"')
+
+        async def reopened():
+            history = HistoryLog(self.tmp.name, interval=INTERVAL)
+            await history.start()
+            state, _ = await history.state_at(1, "seq", 10, live_module.replay_cmd)
+            lines = [
+                json.loads(line)
+                for chunk in [
+                    c async for c in history.events(1, ("seq", 7), ("seq", 12))
+                ]
+                for line in chunk.splitlines()
+            ]
+            await history.close()
+            return state, lines
+
+        state, lines = asyncio.run(reopened())
+        self.assertEqual(_build_snapshot(1, state), seen[10][1])
+        self.assertEqual([line["seq"] for line in lines], list(range(7, 13)))
+        self.assertEqual(lines[0]["cmd"]["type"], "SUBMIT_SCORE")
+
+    def test_box_that_starts_over_archives_old_history(self):
+        async def scenario():
+            history = HistoryLog(self.tmp.name, interval=INTERVAL)
+            await history.start()
+            await self._play(history, 3)
+            state_map.clear()
+            await self._play(history, 1)
+            await history.flush()
+            found = await history.state_at(1, "seq", 2, live_module.replay_cmd)
+            await history.close()
+            return found
+
+        state, _ = asyncio.run(scenario())
+        self.assertEqual(state.holdCount, 1)
+        archived = [n for n in os.listdir(self.tmp.name) if n != "box_1.jsonl"]
+        self.assertEqual(len(archived), 1)
+
+    def test_parse_point(self):
+        self.assertEqual(parse_point("12"), ("seq", 12))
+        self.assertEqual(parse_point("1760000000.5"), ("ts", 1760000000.5))
+        self.assertEqual(parse_point("2026-10-18T10:00:00+00:00")[0], "ts")
+        with self.assertRaises(ValueError):
+            parse_point("soon")
+
+
+class HistoryEndpointTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+        state_map.clear()
+        state_locks.clear()
+
+    def test_history_and_ndjson_range(self):
+        log = lambda *_: HistoryLog(self.tmp.name, interval=INTERVAL)
+        with patch("escalada.main.HistoryLog", log), TestClient(app) as client:
+            client.post(
+                "/api/cmd",
+                json={
+                    "boxId": 7,
+                    "type": "INIT_ROUTE",
+                    "routeIndex": 1,
+                    "holdsCount": 0,
+                    "competitors": [{"nume": "Alex"}],
+                },
+            )
+            first = state_map[7].seq
+            for _ in range(10):
+                client.post(
+                    "/api/cmd", json={"boxId": 7, "type": "PROGRESS_UPDATE", "delta": 1}
+                )
+
+            past = client.get(f"/api/history/7?at={first + 3}").json()
+            self.assertEqual(past["source"], "history")
+            self.assertEqual(past["state"]["holdCount"], 3)
+            live = client.get(f"/api/history/7?at={first + 10}").json()
+            self.assertEqual(live["source"], "live")
+            self.assertEqual(live["state"]["holdCount"], 10)
+            self.assertEqual(client.get("/api/history/7?at=soon").status_code, 400)
+            self.assertEqual(client.get("/api/history/8?at=1").status_code, 404)
+
+            response = client.get(
+                f"/api/history/7/events?start={first + 2}&end={first + 4}"
+            )
+            self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+            seqs = [json.loads(line)["seq"] for line in response.text.splitlines()]
+            self.assertEqual(seqs, [first + 2, first + 3, first + 4])
+            self.assertEqual(client.get("/api/stats/history").json()["recorded"], 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from escalada import main as main_module
+from escalada.api import live as live_module
+from escalada.api.live import (
+    Cmd,
+    _build_snapshot,
+    cmd,
+    replay_journal,
+    state_locks,
+    state_map,
+)
+from escalada.journal import GLOBAL_KEY, Journal, box_key
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_group_commit_batches_concurrent_appends(self):
+        journal = Journal(self.tmp.name)
+
+        async def scenario():
+            journal.start()
+            futures = [journal.append(box_key(i % 3), {"n": i}) for i in range(300)]
+            results = await asyncio.gather(*futures)
+            await journal.close()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(results))
+        self.assertEqual(journal.records, 300)
+        # Appends queued together share one write+fsync per file
+        self.assertLess(journal.fsyncs, 300)
+        records = journal.read()
+        self.assertEqual([r["n"] for r in records["box_1"]], list(range(1, 300, 3)))
+        self.assertEqual(
+            sorted(name for _, _, name in journal.segments()),
+            ["box_0.1.jsonl", "box_1.1.jsonl", "box_2.1.jsonl"],
+        )
+
+    def test_torn_last_line_is_skipped(self):
+        path = os.path.join(self.tmp.name, "box_1.1.jsonl")
+        with open(path, "wb") as f:
+            f.write(b'{"n":1}\n{"n":2}\n{"n":')
+        self.assertEqual(Journal(self.tmp.name).read(), {"box_1": [{"n": 1}, {"n": 2}]})
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+        self._criterion = live_module.time_criterion_enabled
+
+    def tearDown(self):
+        live_module.journal = None
+        live_module.VALIDATION_ENABLED = self._validation
+        live_module.time_criterion_enabled = self._criterion
+        state_map.clear()
+        state_locks.clear()
+
+    def _run_contest(self):
+        async def scenario():
+            journal = Journal(self.tmp.name)
+            journal.start()
+            live_module.journal = journal
+            try:
+                await cmd(
+                    Cmd(
+                        boxId=1,
+                        type="INIT_ROUTE",
+                        routeIndex=1,
+                        holdsCount=30,
+                        timerPreset="04:00",
+                        competitors=[{"nume": "Alex"}, {"nume": "Bob"}],
+                    )
+                )
+                await cmd(Cmd(boxId=2, type="RESET_BOX"))
+                await cmd(
+                    Cmd(boxId=2, type="INIT_ROUTE", competitors=[{"nume": "Cara"}])
+                )
+                await cmd(Cmd(boxId=1, type="START_TIMER"))
+                for _ in range(5):
+                    await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1))
+                await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=0.1))
+                await cmd(Cmd(boxId=1, type="REGISTER_TIME", registeredTime=88.5))
+                await cmd(
+                    Cmd(boxId=1, type="SUBMIT_SCORE", competitor="Alex", score=5.1)
+                )
+                await cmd(Cmd(boxId=1, type="TIMER_SYNC", remaining=12))
+                await cmd(
+                    Cmd(boxId=-1, type="SET_TIME_CRITERION", timeCriterionEnabled=True)
+                )
+                # Not state-changing: not journaled
+                await cmd(Cmd(boxId=1, type="REQUEST_STATE"))
+            finally:
+                live_module.journal = None
+                await journal.close()
+            return journal
+
+        return asyncio.run(scenario())
+
+    def test_replay_rebuilds_identical_state(self):
+        journal = self._run_contest()
+        expected = {b: _build_snapshot(b, s) for b, s in state_map.items()}
+
+        state_map.clear()
+        live_module.time_criterion_enabled = False
+        records = journal.read()
+        self.assertEqual(len(records[GLOBAL_KEY]), 1)
+        applied = replay_journal(records)
+
+        self.assertEqual(applied, journal.records)
+        self.assertTrue(live_module.time_criterion_enabled)
+        rebuilt = {b: _build_snapshot(b, s) for b, s in state_map.items()}
+        self.assertEqual(rebuilt, expected)
+        self.assertEqual(state_map[1].currentClimber, "Bob")
+
+    def test_lifespan_replays_journal_before_serving(self):
+        self._run_contest()
+        expected = _build_snapshot(1, state_map[1])
+        state_map.clear()
+
+        with mock.patch.object(
+            main_module, "JOURNAL_DIR", self.tmp.name
+        ), mock.patch.object(main_module, "JOURNAL_ENABLED", True), mock.patch.object(
+            main_module, "CHECKPOINT_PATH", os.path.join(self.tmp.name, "ckpt.json")
+        ):
+            with TestClient(main_module.app) as client:
+                snapshot = client.get("/api/state/1").json()
+                stats = client.get("/api/stats/journal").json()
+
+        self.assertEqual(snapshot, expected)
+        self.assertTrue(stats["enabled"])
+
+    def test_failed_journal_write_is_reported(self):
+        async def scenario():
+            journal = Journal(self.tmp.name)
+            journal.start()
+            live_module.journal = journal
+            try:
+                await cmd(Cmd(boxId=1, type="INIT_ROUTE", competitors=[{"nume": "Alex"}]))
+                with mock.patch.object(journal, "_write_batch", side_effect=OSError("disk full")):
+                    with self.assertRaises(HTTPException) as ctx:
+                        await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1))
+            finally:
+                live_module.journal = None
+                await journal.close()
+            return ctx.exception, journal
+
+        error, journal = asyncio.run(scenario())
+        self.assertEqual(error.status_code, 503)
+        self.assertEqual(journal.failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
 import asyncio
+import json
+import time
 import unittest
 
 from escalada.api.live import Cmd, cmd, state_map, state_locks
@@ -330,6 +332,501 @@ class TimeCriterionTest(BaseTestCase):
         self.assertEqual(result["status"], "ok")
 
 
+# ==================== BATCH TESTS ====================
+class _RecordingWS:
+    """Minimal WebSocket stand-in that records sent frames"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        import json
+
+        self.sent.append(json.loads(text))
+
+
+class CmdBatchTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        live_module.channels.clear()
+
+    def tearDown(self):
+        live_module.channels.clear()
+
+    def test_batch_applies_in_order_with_single_snapshot(self):
+        from escalada.api.live import CmdBatch, cmd_batch
+
+        async def scenario():
+            ws = _RecordingWS()
+            outbox = await live_module._register_subscriber(ws, 1)
+            result = await cmd_batch(
+                CmdBatch(
+                    boxId=1,
+                    commands=[
+                        Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=[{"nume": "Alex"}]),
+                        Cmd(boxId=1, type="START_TIMER"),
+                        Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1),
+                        Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1),
+                    ],
+                )
+            )
+            await outbox.flush()
+            await outbox.close()
+            return result, ws.sent
+
+        result, sent = asyncio.run(scenario())
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual([r["status"] for r in result["results"]], ["ok"] * 4)
+        self.assertEqual(state_map[1]["holdCount"], 2)
+        self.assertTrue(state_map[1]["started"])
+        types = [m["type"] for m in sent]
+        self.assertEqual(types.count("STATE_SNAPSHOT"), 1)
+        self.assertEqual(types[-1], "STATE_SNAPSHOT")
+        self.assertEqual(types[:4], ["INIT_ROUTE", "START_TIMER", "PROGRESS_UPDATE", "PROGRESS_UPDATE"])
+        self.assertEqual(sent[-1]["holdCount"], 2)
+
+    def test_batch_rejects_mixed_boxes(self):
+        from fastapi import HTTPException
+
+        from escalada.api.live import CmdBatch, cmd_batch
+
+        async def scenario():
+            await cmd_batch(
+                CmdBatch(
+                    boxId=1,
+                    commands=[
+                        Cmd(boxId=1, type="START_TIMER"),
+                        Cmd(boxId=2, type="START_TIMER"),
+                    ],
+                )
+            )
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(scenario())
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertNotIn(1, state_map)
+
+    def test_batch_invalid_command_applies_nothing(self):
+        from fastapi import HTTPException
+
+        from escalada.api.live import CmdBatch, cmd_batch
+
+        async def scenario():
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=[{"nume": "Alex"}]))
+            sid = state_map[1]["sessionId"]
+            live_module.VALIDATION_ENABLED = True
+            try:
+                await cmd_batch(
+                    CmdBatch(
+                        boxId=1,
+                        commands=[
+                            Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid),
+                            Cmd(boxId=1, type="PROGRESS_UPDATE", sessionId=sid),
+                        ],
+                    )
+                )
+            finally:
+                live_module.VALIDATION_ENABLED = False
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(scenario())
+        self.assertIn("Command 1", ctx.exception.detail)
+        self.assertEqual(state_map[1]["holdCount"], 0.0)
+
+    def test_batch_reports_stale_commands(self):
+        from escalada.api.live import CmdBatch, cmd_batch
+
+        async def scenario():
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=[{"nume": "Alex"}]))
+            sid = state_map[1]["sessionId"]
+            live_module.VALIDATION_ENABLED = True
+            try:
+                return await cmd_batch(
+                    CmdBatch(
+                        boxId=1,
+                        commands=[
+                            Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId="stale"),
+                            Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid),
+                        ],
+                    )
+                )
+            finally:
+                live_module.VALIDATION_ENABLED = False
+
+        result = asyncio.run(scenario())
+        self.assertEqual(result["results"][0], {"status": "ignored", "reason": "stale_session"})
+        self.assertEqual(result["results"][1], {"status": "ok"})
+        self.assertEqual(state_map[1]["holdCount"], 1)
+
+
+    def test_batch_missing_session_applies_nothing(self):
+        from fastapi import HTTPException
+
+        from escalada.api.live import CmdBatch, cmd_batch
+
+        async def scenario():
+            await cmd(Cmd(boxId=3, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=[{"nume": "Alex"}]))
+            sid = state_map[3]["sessionId"]
+            seq = state_map[3].seq
+            ws = _RecordingWS()
+            outbox = await live_module._register_subscriber(ws, 3)
+            live_module.VALIDATION_ENABLED = True
+            try:
+                with self.assertRaises(HTTPException) as ctx:
+                    await cmd_batch(
+                        CmdBatch(
+                            boxId=3,
+                            commands=[
+                                Cmd(boxId=3, type="PROGRESS_UPDATE", delta=1, sessionId=sid),
+                                Cmd(boxId=3, type="PROGRESS_UPDATE", delta=1),
+                            ],
+                        )
+                    )
+            finally:
+                live_module.VALIDATION_ENABLED = False
+            await outbox.flush()
+            await outbox.close()
+            return ctx.exception, seq, ws.sent
+
+        error, seq, sent = asyncio.run(scenario())
+        self.assertEqual(error.status_code, 400)
+        self.assertIn("Command 1", error.detail)
+        self.assertEqual(state_map[3]["holdCount"], 0)
+        self.assertEqual(state_map[3].seq, seq)
+        self.assertEqual(sent, [])
+
+    def test_foreign_fields_are_not_echoed(self):
+        from fastapi import HTTPException
+
+        async def scenario():
+            await cmd(Cmd(boxId=3, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=[{"nume": "Alex"}]))
+            sid = state_map[3]["sessionId"]
+            ws = _RecordingWS()
+            outbox = await live_module._register_subscriber(ws, 3)
+            live_module.VALIDATION_ENABLED = True
+            try:
+                with self.assertRaises(HTTPException) as ctx:
+                    await cmd(
+                        Cmd(
+                            boxId=3,
+                            type="PROGRESS_UPDATE",
+                            delta=1,
+                            sessionId=sid,
+                            competitor="<script>alert(1)</script>",
+                            categorie="<img onerror=alert(1)>",
+                        )
+                    )
+            finally:
+                live_module.VALIDATION_ENABLED = False
+            await outbox.flush()
+            await outbox.close()
+            return ctx.exception, ws.sent
+
+        error, sent = asyncio.run(scenario())
+        self.assertEqual(error.status_code, 400)
+        self.assertEqual(state_map[3]["holdCount"], 0)
+        self.assertEqual(sent, [])
+
+
+# ==================== BROADCAST TESTS ====================
+class _FailingWS:
+    async def send_text(self, text):
+        raise RuntimeError("socket closed")
+
+
+class BroadcastFanOutTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        live_module.channels.clear()
+        live_module._event_rings.clear()
+
+    def tearDown(self):
+        live_module.channels.clear()
+        live_module._event_rings.clear()
+
+    def test_payload_encoded_once_for_all_subscribers(self):
+        from unittest.mock import patch
+
+        async def scenario():
+            sockets = [_RecordingWS() for _ in range(200)]
+            outboxes = [await live_module._register_subscriber(ws, 1) for ws in sockets]
+            real_dumps = live_module.json.dumps
+            with patch.object(live_module.json, "dumps", side_effect=real_dumps) as dumps:
+                await live_module._broadcast_to_box(1, {"type": "PING", "n": 1})
+            for outbox in outboxes:
+                await outbox.flush()
+                await outbox.close()
+            return sockets, dumps.call_count
+
+        sockets, calls = asyncio.run(scenario())
+        self.assertEqual(calls, 1)
+        seq = live_module._event_rings[1].last
+        for ws in sockets:
+            self.assertEqual(ws.sent, [{"type": "PING", "n": 1, "eventSeq": seq}])
+
+    def test_dead_sockets_removed(self):
+        async def scenario():
+            good = _RecordingWS()
+            good_box = await live_module._register_subscriber(good, 1)
+            await live_module._register_subscriber(_FailingWS(), 1)
+            await live_module._broadcast_to_box(1, {"type": "PING"})
+            await asyncio.sleep(0)
+            await good_box.flush()
+            return good, good_box
+
+        good, good_box = asyncio.run(scenario())
+        self.assertEqual(live_module.channels[1], {good_box})
+        seq = live_module._event_rings[1].last
+        self.assertEqual(good.sent, [{"type": "PING", "eventSeq": seq}])
+
+    def test_stalled_subscriber_does_not_block_commands(self):
+        class StalledWS:
+            def __init__(self):
+                self.closed_with = None
+
+            async def send_text(self, text):
+                await asyncio.Event().wait()
+
+            async def close(self, code=1000):
+                self.closed_with = code
+
+        async def scenario():
+            stalled = await live_module._register_subscriber(StalledWS(), 1)
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=100, competitors=[{"nume": "Alex"}]))
+            sid = state_map[1]["sessionId"]
+            for _ in range(200):
+                await asyncio.wait_for(
+                    cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid)),
+                    timeout=1,
+                )
+            queued = len(stalled)
+            await stalled.close()
+            return queued, stalled
+
+        queued, stalled = asyncio.run(scenario())
+        self.assertEqual(state_map[1]["holdCount"], 100)
+        self.assertLessEqual(queued, stalled.maxsize)
+        self.assertGreater(stalled.overflows, 0)
+
+
+# ==================== DELTA SNAPSHOT TESTS ====================
+class DeltaSnapshotTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        live_module.channels.clear()
+        live_module._last_broadcast.clear()
+
+    def tearDown(self):
+        live_module.channels.clear()
+        live_module._last_broadcast.clear()
+
+    def _run_with_subscribers(self, steps):
+        """Run `steps(sid)` with one legacy and one delta subscriber on box 1."""
+
+        async def scenario():
+            legacy_ws = _RecordingWS()
+            delta_ws = _RecordingWS()
+            legacy = await live_module._register_subscriber(legacy_ws, 1)
+            delta = await live_module._register_subscriber(delta_ws, 1, deltas=True)
+            competitors = [{"nume": f"C{i}", "marked": False} for i in range(100)]
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=10, competitors=competitors))
+            await steps(state_map[1]["sessionId"])
+            for outbox in (legacy, delta):
+                await outbox.flush()
+                await outbox.close()
+            return legacy_ws.sent, delta_ws.sent
+
+        return asyncio.run(scenario())
+
+    def test_snapshot_carries_monotonic_seq(self):
+        async def steps(sid):
+            await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+            await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+
+        legacy, _ = self._run_with_subscribers(steps)
+        seqs = [m["seq"] for m in legacy if m["type"] == "STATE_SNAPSHOT"]
+        self.assertEqual(seqs, [1, 2, 3])
+        self.assertEqual(state_map[1]["seq"], 3)
+
+    def test_progress_update_sends_compact_delta(self):
+        async def steps(sid):
+            await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+
+        legacy, deltas = self._run_with_subscribers(steps)
+        delta = [m for m in deltas if m["type"] == "STATE_DELTA"][-1]
+        self.assertEqual(delta["changes"], {"holdCount": 1})
+        self.assertEqual((delta["baseSeq"], delta["seq"]), (1, 2))
+        self.assertNotIn("marked", delta)
+        self.assertNotIn("STATE_DELTA", [m["type"] for m in legacy])
+        full = [m for m in legacy if m["type"] == "STATE_SNAPSHOT"][-1]
+        self.assertLess(len(json.dumps(delta)) * 20, len(json.dumps(full)))
+
+    def test_submit_score_sends_marked_index(self):
+        async def steps(sid):
+            await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+            await cmd(Cmd(boxId=1, type="SUBMIT_SCORE", competitor="C0", score=1, sessionId=sid))
+
+        _, deltas = self._run_with_subscribers(steps)
+        delta = [m for m in deltas if m["type"] == "STATE_DELTA"][-1]
+        self.assertEqual(delta["marked"], [[0, True]])
+        self.assertEqual(delta["changes"]["currentClimber"], "C1")
+        self.assertNotIn("competitors", delta["changes"])
+
+    def test_deltas_chain_by_base_seq(self):
+        async def steps(sid):
+            await cmd(Cmd(boxId=1, type="START_TIMER", sessionId=sid))
+            await cmd(Cmd(boxId=1, type="TIMER_SYNC", remaining=30, sessionId=sid))
+            await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+
+        _, deltas = self._run_with_subscribers(steps)
+        frames = [m for m in deltas if m["type"] in ("STATE_SNAPSHOT", "STATE_DELTA")]
+        # TIMER_SYNC advances seq without a broadcast; the next delta bridges it
+        seq = None
+        for frame in frames:
+            if frame["type"] == "STATE_DELTA":
+                self.assertEqual(frame["baseSeq"], seq)
+            seq = frame["seq"]
+        self.assertEqual(frames[-1]["changes"], {"holdCount": 1, "remaining": 30})
+
+    def test_init_route_delta_includes_roster(self):
+        async def steps(sid):
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=2, holdsCount=10, competitors=[{"nume": "New"}]))
+
+        _, deltas = self._run_with_subscribers(steps)
+        delta = [m for m in deltas if m["type"] == "STATE_DELTA"][-1]
+        self.assertEqual(delta["changes"]["competitors"], [{"nume": "New", "marked": False}])
+        self.assertEqual(delta["changes"]["routeIndex"], 2)
+
+
+# ==================== SNAPSHOT COALESCING TESTS ====================
+class SnapshotCoalescingTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        live_module.channels.clear()
+        live_module._last_broadcast.clear()
+        self._window = live_module.SNAPSHOT_COALESCE_MS
+        for key in live_module.broadcast_stats:
+            live_module.broadcast_stats[key] = 0
+
+    def tearDown(self):
+        live_module.SNAPSHOT_COALESCE_MS = self._window
+        live_module.channels.clear()
+        live_module._last_broadcast.clear()
+
+    def _burst(self, window_ms: float, taps: int):
+        live_module.SNAPSHOT_COALESCE_MS = window_ms
+
+        async def scenario():
+            ws = _RecordingWS()
+            outbox = await live_module._register_subscriber(ws, 1)
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=50, competitors=[{"nume": "Alex"}]))
+            sid = state_map[1]["sessionId"]
+            for _ in range(taps):
+                await cmd(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, sessionId=sid))
+            await asyncio.sleep(window_ms / 1000 * 3)
+            await outbox.flush()
+            await outbox.close()
+            return ws.sent
+
+        return asyncio.run(scenario())
+
+    def test_disabled_by_default_sends_snapshot_per_command(self):
+        sent = self._burst(0, 10)
+        self.assertEqual([m["type"] for m in sent].count("STATE_SNAPSHOT"), 11)
+        self.assertEqual(live_module.broadcast_stats["frames_saved"], 0)
+
+    def test_burst_merged_into_latest_snapshot(self):
+        sent = self._burst(20, 10)
+        types = [m["type"] for m in sent]
+        # Every echo is still delivered
+        self.assertEqual(types.count("PROGRESS_UPDATE"), 10)
+        self.assertEqual(types.count("INIT_ROUTE"), 1)
+        snapshots = [m for m in sent if m["type"] == "STATE_SNAPSHOT"]
+        self.assertEqual(len(snapshots), 1)
+        self.assertEqual(snapshots[-1]["holdCount"], 10)
+        stats = live_module.broadcast_stats
+        self.assertEqual(stats["snapshots_requested"], 11)
+        self.assertEqual(stats["snapshots_coalesced"], 10)
+        self.assertEqual(stats["frames_saved"], 10)
+
+
+# ==================== BOX REGISTRY CONTENTION TESTS ====================
+class BoxRegistryContentionTest(BaseTestCase):
+    """Commands and state reads on different boxes must never wait on each other"""
+
+    def test_held_box_lock_does_not_block_other_boxes(self):
+        from escalada.api.live import _get_box_lock, _send_state_snapshot, get_state
+
+        async def scenario():
+            await cmd(Cmd(boxId=1, type="INIT_ROUTE", competitors=[{"nume": "Alex"}]))
+            # Simulate a slow command holding box 1
+            async with _get_box_lock(1):
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        cmd(Cmd(boxId=2, type="INIT_ROUTE", competitors=[])),
+                        cmd(Cmd(boxId=2, type="PROGRESS_UPDATE", delta=1)),
+                        get_state(3),
+                        _send_state_snapshot(4),
+                    ),
+                    timeout=1.0,
+                )
+            return state_map[2]["holdCount"]
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+
+    def test_concurrent_first_use_creates_box_once(self):
+        from escalada.api.live import _get_box_lock, get_state
+
+        async def scenario():
+            snapshots = await asyncio.gather(*(get_state(7) for _ in range(50)))
+            locks = {id(_get_box_lock(7)) for _ in range(50)}
+            return {s["sessionId"] for s in snapshots}, locks
+
+        sessions, locks = asyncio.run(scenario())
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(len(locks), 1)
+
+    def test_many_busy_boxes_apply_in_order_on_their_own_locks(self):
+        # Latency under the same load: python -m benchmarks.bench_box_latency
+        from escalada.api.live import _get_box_lock, _send_state_snapshot, get_state
+
+        boxes = 48
+        seen: dict[int, list[int]] = {b: [] for b in range(boxes)}
+        foreign_locks: list[int] = []
+
+        async def judge(box_id: int):
+            await cmd(
+                Cmd(boxId=box_id, type="INIT_ROUTE", competitors=[{"nume": "A"}])
+            )
+            for _ in range(20):
+                await cmd(Cmd(boxId=box_id, type="PROGRESS_UPDATE", delta=1))
+                seen[box_id].append(state_map[box_id]["holdCount"])
+
+        async def spectator(box_id: int):
+            for _ in range(20):
+                await get_state(box_id)
+                await _send_state_snapshot(box_id)
+                # Between commands no box lock is left held
+                foreign_locks.extend(
+                    b for b in range(boxes) if _get_box_lock(b).locked()
+                )
+                await asyncio.sleep(0)
+
+        async def scenario():
+            await asyncio.gather(
+                *(judge(b) for b in range(boxes)),
+                *(spectator(b) for b in range(boxes)),
+            )
+            return {id(_get_box_lock(b)) for b in range(boxes)}
+
+        locks = asyncio.run(scenario())
+        # Each box's commands applied one at a time, in the order sent
+        for b in range(boxes):
+            self.assertEqual(seen[b], list(range(1, 21)), f"box {b}")
+        self.assertEqual(foreign_locks, [])
+        self.assertEqual(len(locks), boxes)
+
+
 # ==================== HELPER FUNCTION TESTS ====================
 class HelperFunctionsTest(BaseTestCase):
     def test_parse_timer_preset_valid(self):
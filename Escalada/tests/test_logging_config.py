@@ -0,0 +1,67 @@
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import unittest
+
+from escalada.logging_config import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    _gzip_namer,
+    _gzip_rotator,
+)
+
+
+def make_record(msg, *args, **extra):
+    record = logging.makeLogRecord(
+        {"name": "escalada.test", "levelno": logging.INFO, "levelname": "INFO"}
+    )
+    record.msg = msg
+    record.args = args
+    record.__dict__.update(extra)
+    return record
+
+
+class LoggingPipelineTest(unittest.TestCase):
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        for i in range(3):
+            handler.emit(make_record("record %d", i))
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "record 0")
+
+    def test_json_formatter_includes_extra_fields(self):
+        line = JsonFormatter().format(
+            make_record("GET %s", "/api/state/1", status=200, duration_ms=1.5)
+        )
+        payload = json.loads(line)
+        self.assertEqual(payload["msg"], "GET /api/state/1")
+        self.assertEqual(payload["status"], 200)
+        self.assertEqual(payload["duration_ms"], 1.5)
+        self.assertEqual(payload["level"], "INFO")
+
+    def test_rotated_files_are_gzipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "escalada.log")
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=200, backupCount=2, encoding="utf-8"
+            )
+            handler.namer = _gzip_namer
+            handler.rotator = _gzip_rotator
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            for i in range(20):
+                handler.emit(make_record("line %02d ștefan", i))
+            handler.close()
+
+            files = sorted(os.listdir(tmp))
+            self.assertIn("escalada.log.1.gz", files)
+            self.assertNotIn("escalada.log.3.gz", files)
+            with gzip.open(os.path.join(tmp, "escalada.log.1.gz"), "rt") as f:
+                self.assertIn("ștefan", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
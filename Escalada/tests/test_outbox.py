@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+
+from escalada.outbox import SLOW_CONSUMER_CLOSE_CODE, Outbox
+
+
+class GatedWS:
+    """WebSocket stand-in whose sends block until the gate is opened"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class OutboxTest(unittest.TestCase):
+    def test_frames_written_in_order(self):
+        async def scenario():
+            ws = GatedWS()
+            ws.gate.set()
+            outbox = Outbox(ws, 1, maxsize=10)
+            outbox.start()
+            for i in range(5):
+                self.assertTrue(outbox.send(f"frame-{i}"))
+            await outbox.flush()
+            await outbox.close()
+            return ws.sent
+
+        self.assertEqual(asyncio.run(scenario()), [f"frame-{i}" for i in range(5)])
+
+    def test_overflow_coalesces_to_latest_snapshot(self):
+        async def scenario():
+            ws = GatedWS()
+            outbox = Outbox(
+                ws, 1, resync=lambda: "snapshot-latest", maxsize=3, policy="coalesce"
+            )
+            outbox.start()
+            for i in range(10):
+                outbox.send(f"echo-{i}")
+            queued = len(outbox)
+            ws.gate.set()
+            await outbox.flush()
+            await outbox.close()
+            return queued, ws.sent, outbox.overflows
+
+        queued, sent, overflows = asyncio.run(scenario())
+        self.assertLessEqual(queued, 3)
+        self.assertGreater(overflows, 0)
+        # The 10th frame overflowed, so the queue collapsed to one fresh snapshot
+        self.assertEqual(sent, ["snapshot-latest"])
+
+    def test_overflowing_snapshot_replaces_queue(self):
+        async def scenario():
+            ws = GatedWS()
+            outbox = Outbox(ws, 1, maxsize=2, policy="coalesce")
+            outbox.start()
+            await asyncio.sleep(0)
+            outbox.send("echo-0")
+            outbox.send("echo-1")
+            outbox.send("echo-2")
+            outbox.send("snap", snapshot=True)
+            ws.gate.set()
+            await outbox.flush()
+            await outbox.close()
+            return ws.sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(sent[-1], "snap")
+        self.assertNotIn("echo-2", sent)
+
+    def test_coalescing_keeps_replies_in_order(self):
+        async def scenario():
+            ws = GatedWS()
+            outbox = Outbox(ws, 1, resync=lambda: "snapshot-latest", maxsize=4, policy="coalesce")
+            outbox.start()
+            await asyncio.sleep(0)
+            outbox.send("echo-0")
+            outbox.send("ack-0", reply=True)
+            outbox.send("echo-1")
+            outbox.send("nack-1", reply=True)
+            outbox.send("echo-2")
+            outbox.send("ack-2", reply=True)
+            ws.gate.set()
+            await outbox.flush()
+            await outbox.close()
+            return ws.sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(sent, ["ack-0", "nack-1", "snapshot-latest", "ack-2"])
+
+    def test_unread_replies_disconnect(self):
+        async def scenario():
+            ws = GatedWS()
+            outbox = Outbox(ws, 1, resync=lambda: "snapshot-latest", maxsize=2, policy="coalesce")
+            outbox.start()
+            await asyncio.sleep(0)
+            results = [outbox.send(f"ack-{i}", reply=True) for i in range(3)]
+            await asyncio.sleep(0.01)
+            return ws, outbox, results
+
+        ws, outbox, results = asyncio.run(scenario())
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(outbox.closed)
+        self.assertEqual(ws.closed_with, SLOW_CONSUMER_CLOSE_CODE)
+
+    def test_overflow_disconnects_with_policy_code(self):
+        dead = []
+
+        async def scenario():
+            ws = GatedWS()
+            outbox = Outbox(ws, 1, on_dead=dead.append, maxsize=2, policy="disconnect")
+            outbox.start()
+            results = [outbox.send(f"echo-{i}") for i in range(4)]
+            await asyncio.sleep(0.01)
+            return ws, outbox, results
+
+        ws, outbox, results = asyncio.run(scenario())
+        self.assertEqual(results, [True, True, False, False])
+        self.assertTrue(outbox.closed)
+        self.assertEqual(dead, [outbox])
+        self.assertEqual(ws.closed_with, SLOW_CONSUMER_CLOSE_CODE)
+
+    def test_send_failure_marks_dead(self):
+        dead = []
+
+        class BrokenWS:
+            async def send_text(self, text):
+                raise RuntimeError("gone")
+
+        async def scenario():
+            outbox = Outbox(BrokenWS(), 1, on_dead=dead.append)
+            outbox.start()
+            outbox.send("frame")
+            await outbox.flush()
+            return outbox
+
+        outbox = asyncio.run(scenario())
+        self.assertTrue(outbox.closed)
+        self.assertEqual(dead, [outbox])
+        self.assertFalse(outbox.send("late"))
+
+
+if __name__ == "__main__":
+    unittest.main()
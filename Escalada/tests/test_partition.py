@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from escalada.api import live as live_module
+from escalada.api.live import Cmd, cmd, get_state, state_locks, state_map
+from escalada.dispatcher import Dispatcher, worker_env
+from escalada.main import app
+from escalada.partition import HashRing
+
+
+class HashRingTest(unittest.TestCase):
+    def test_owner_is_stable_and_spread(self):
+        ring = HashRing(4)
+        owners = [ring.owner(box_id) for box_id in range(1000)]
+        self.assertEqual(owners, [HashRing(4).owner(b) for b in range(1000)])
+        for node in range(4):
+            # Even spread within a loose margin
+            self.assertGreater(owners.count(node), 150)
+
+    def test_adding_a_worker_moves_only_its_share(self):
+        before = HashRing(4)
+        after = HashRing(5)
+        moved = [b for b in range(1000) if before.owner(b) != after.owner(b)]
+        # Every moved box goes to the new worker, about 1/5 of them
+        self.assertTrue(all(after.owner(b) == 4 for b in moved))
+        self.assertLess(len(moved), 300)
+
+    def test_single_worker_owns_everything(self):
+        ring = HashRing(1)
+        self.assertEqual({ring.owner(b) for b in range(-5, 50)}, {0})
+        with self.assertRaises(ValueError):
+            HashRing(0)
+
+    def test_worker_env_separates_journals(self):
+        first, second = worker_env(0, 2), worker_env(1, 2)
+        self.assertEqual(first["PARTITION_COUNT"], "2")
+        self.assertNotEqual(first["JOURNAL_DIR"], second["JOURNAL_DIR"])
+        self.assertNotEqual(first["HISTORY_DIR"], second["HISTORY_DIR"])
+        self.assertNotEqual(first["CHECKPOINT_PATH"], second["CHECKPOINT_PATH"])
+        self.assertNotEqual(first["LOG_FILE"], second["LOG_FILE"])
+
+    def test_spawned_worker_uses_its_env(self):
+        script = (
+            "import json, logging, escalada.main\n"
+            "from escalada import history, journal, logging_config, partition\n"
+            "logging.getLogger('escalada').warning('worker up')\n"
+            "logging_config.stop_logging()\n"
+            "print(json.dumps([partition.PARTITION_INDEX, journal.JOURNAL_DIR,"
+            " history.HISTORY_DIR, logging_config.LOG_FILE]))\n"
+        )
+        env = worker_env(1, 2)
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            json.loads(result.stdout.splitlines()[-1]),
+            [1, env["JOURNAL_DIR"], env["HISTORY_DIR"], env["LOG_FILE"]],
+        )
+        with open(env["LOG_FILE"], encoding="utf-8") as f:
+            self.assertIn("worker up", f.read())
+
+
+class OwnershipTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+        owner = patch.object(live_module, "owns_box", lambda box_id: box_id % 2 == 0)
+        owner.start()
+        self.addCleanup(owner.stop)
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+        state_map.clear()
+        state_locks.clear()
+
+    def test_foreign_box_is_refused(self):
+        async def scenario():
+            self.assertEqual(
+                await cmd(Cmd(boxId=2, type="INIT_ROUTE")), {"status": "ok"}
+            )
+            with self.assertRaises(HTTPException) as ctx:
+                await cmd(Cmd(boxId=3, type="INIT_ROUTE"))
+            self.assertEqual(ctx.exception.status_code, 421)
+            with self.assertRaises(HTTPException):
+                await get_state(3)
+
+        asyncio.run(scenario())
+        self.assertNotIn(3, state_map)
+
+    def test_foreign_box_socket_is_closed(self):
+        with TestClient(app) as client:
+            with self.assertRaises(WebSocketDisconnect) as ctx:
+                with client.websocket_connect("/api/ws/3"):
+                    pass
+            self.assertEqual(ctx.exception.code, 1008)
+            with client.websocket_connect("/api/ws/2") as ws:
+                self.assertEqual(ws.receive_json()["type"], "STATE_SNAPSHOT")
+
+
+class _FakeWorker:
+    """Unix-socket HTTP server that records requests and echoes WS bytes."""
+
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self.requests: list[tuple[str, bytes]] = []
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._serve, self.path)
+
+    async def _serve(self, reader, writer):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        request_line = head.split("\r\n", 1)[0]
+        length = 0
+        for line in head.split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        body = await reader.readexactly(length) if length else b""
+        self.requests.append((head, body))
+        if "upgrade: websocket" in head.lower():
+            writer.write(b"HTTP/1.1 101 Switching Protocols\r\n\r\n")
+            while data := await reader.read(1024):
+                writer.write(data)
+        else:
+            data = json.dumps({"worker": self.index, "line": request_line}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(data) + data
+            )
+        await writer.drain()
+        writer.close()
+
+
+async def _http(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+def _post(path: str, body: dict) -> bytes:
+    data = json.dumps(body).encode()
+    return (
+        b"POST %s HTTP/1.1\r\nHost: x\r\nConnection: keep-alive\r\n"
+        b"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+        % (path.encode(), len(data))
+    ) + data
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_routes_by_box_owner(self):
+        async def scenario():
+            workers = [
+                _FakeWorker(i, os.path.join(self.tmp.name, f"w{i}.sock"))
+                for i in range(3)
+            ]
+            for worker in workers:
+                await worker.start()
+            dispatcher = Dispatcher([w.path for w in workers])
+            server = await dispatcher.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            ring = dispatcher.ring
+            try:
+                for box_id in range(12):
+                    reply = await _http(
+                        port, _post("/api/cmd", {"boxId": box_id, "type": "X"})
+                    )
+                    body = json.loads(reply.split(b"\r\n\r\n", 1)[1])
+                    self.assertEqual(body["worker"], ring.owner(box_id))
+
+                    for path in (
+                        b"/api/state/%d",
+                        b"/api/history/%d",
+                        b"/api/history/%d/events?since=0",
+                    ):
+                        reply = await _http(
+                            port, b"GET " + path % box_id + b" HTTP/1.1\r\nHost: x\r\n\r\n"
+                        )
+                        body = json.loads(reply.split(b"\r\n\r\n", 1)[1])
+                        self.assertEqual(body["worker"], ring.owner(box_id), path)
+
+                # Global toggle reaches every worker
+                await _http(
+                    port,
+                    _post(
+                        "/api/cmd",
+                        {"boxId": -1, "type": "SET_TIME_CRITERION"},
+                    ),
+                )
+                await asyncio.sleep(0.05)
+                for worker in workers:
+                    self.assertTrue(
+                        any(
+                            b"SET_TIME_CRITERION" in body for _, body in worker.requests
+                        )
+                    )
+                # Keep-alive is not forwarded; the socket is bound to one worker
+                head = workers[ring.owner(0)].requests[0][0]
+                self.assertIn("Connection: close", head)
+                self.assertNotIn("keep-alive", head)
+
+                # WebSocket upgrade: bytes flow both ways through the splice
+                owner = ring.owner(5)
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(
+                    b"GET /api/ws/5 HTTP/1.1\r\nHost: x\r\n"
+                    b"Connection: Upgrade\r\nUpgrade: websocket\r\n\r\n"
+                )
+                status = await reader.readuntil(b"\r\n\r\n")
+                self.assertIn(b"101", status)
+                writer.write(b"frame")
+                self.assertEqual(await reader.readexactly(5), b"frame")
+                writer.close()
+                self.assertIn("/api/ws/5", workers[owner].requests[-1][0])
+
+                stats = await _http(
+                    port, b"GET /api/stats/dispatcher HTTP/1.1\r\nHost: x\r\n\r\n"
+                )
+                stats = json.loads(stats.split(b"\r\n\r\n", 1)[1])
+                self.assertEqual(stats["websockets"], 1)
+                self.assertEqual(stats["fanouts"], 2)
+            finally:
+                await dispatcher.close()
+                for worker in workers:
+                    worker.server.close()
+
+        asyncio.run(scenario())
+
+    def test_unreachable_worker_answers_502(self):
+        async def scenario():
+            dispatcher = Dispatcher([os.path.join(self.tmp.name, "missing.sock")])
+            server = await dispatcher.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reply = await _http(port, b"GET /api/state/1 HTTP/1.1\r\n\r\n")
+            finally:
+                await dispatcher.close()
+            self.assertTrue(reply.startswith(b"HTTP/1.1 502"))
+            self.assertEqual(dispatcher.errors, 1)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
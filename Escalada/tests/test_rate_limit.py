@@ -0,0 +1,296 @@
+import random
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from escalada import rate_limit
+from escalada.main import app
+from escalada.rate_limit import (
+    ClientBuckets,
+    RateLimiter,
+    RateLimitSweeper,
+    get_rate_limiter,
+)
+
+
+class ListLimiter:
+    """The previous list-filtering limiter, as the reference behaviour"""
+
+    def __init__(self, per_minute, per_second, block, limits):
+        self.per_minute, self.per_second, self.block = per_minute, per_second, block
+        self.limits = limits
+        self.requests: dict[int, list] = {}
+        self.commands: dict[tuple, list] = {}
+        self.blocked: dict[int, float] = {}
+
+    def check(self, now, box_id, command_type):
+        if self.blocked.get(box_id, 0) > now:
+            return False
+        requests = self.requests.setdefault(box_id, [])
+        requests[:] = [ts for ts in requests if now - ts < 60]
+        if len([ts for ts in requests if now - ts < 1]) >= self.per_second:
+            self.blocked[box_id] = now + self.block
+            return False
+        if len(requests) >= self.per_minute:
+            self.blocked[box_id] = now + self.block
+            return False
+        cmd = self.commands.setdefault((box_id, command_type), [])
+        cmd[:] = [ts for ts in cmd if now - ts < 60]
+        if len(cmd) >= self.limits.get(command_type, 999):
+            return False
+        requests.append(now)
+        cmd.append(now)
+        return True
+
+
+class RateLimiterTest(unittest.TestCase):
+    def _limiter(self):
+        limiter = RateLimiter(max_per_minute=40, max_per_second=5, block_duration=3)
+        limiter.set_command_limit("PROGRESS_UPDATE", 25)
+        limiter.set_command_limit("INIT_ROUTE", 2)
+        return limiter
+
+    def test_same_decisions_as_list_filtering(self):
+        rng = random.Random(3)
+        limiter = self._limiter()
+        reference = ListLimiter(40, 5, 3, limiter.command_limits)
+        now = 1_000_000.0
+        decisions = []
+        with patch.object(rate_limit.time, "time", lambda: now):
+            for _ in range(5000):
+                # Bursts and lulls, so every limit and the block are hit
+                now += rng.choice([0.01, 0.05, 0.3, 1.5, 7])
+                box_id = rng.randint(1, 3)
+                command_type = rng.choice(
+                    ["PROGRESS_UPDATE", "INIT_ROUTE", "TIMER_SYNC"]
+                )
+                allowed, _ = limiter.check_rate_limit(box_id, command_type)
+                self.assertEqual(
+                    allowed, reference.check(now, box_id, command_type), (now, box_id)
+                )
+                decisions.append(allowed)
+        self.assertIn(False, decisions)
+        self.assertIn(True, decisions)
+
+    def test_limits_changed_at_runtime_keep_newest_requests(self):
+        limiter = self._limiter()
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            for i in range(4):
+                now += 0.1
+                self.assertTrue(limiter.check_rate_limit(1, "TIMER_SYNC")[0])
+            limiter.max_per_second = 3
+            now += 0.1
+            self.assertFalse(limiter.check_rate_limit(1, "TIMER_SYNC")[0])
+            stats = limiter.get_stats(1)
+        self.assertEqual(stats["requests_per_second"], 3)
+        self.assertTrue(stats["is_blocked"])
+
+    def test_check_allocates_nothing_once_windows_are_full(self):
+        limiter = RateLimiter(max_per_minute=120, max_per_second=2, block_duration=0)
+        limiter.set_command_limit("PROGRESS_UPDATE", 120)
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            # Just under every limit: each ring stays full, each check passes
+            for _ in range(600):
+                now += 0.51
+                self.assertTrue(limiter.check_rate_limit(1, "PROGRESS_UPDATE")[0])
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                for _ in range(1000):
+                    now += 0.51
+                    limiter.check_rate_limit(1, "PROGRESS_UPDATE")
+                grown = tracemalloc.get_traced_memory()[0] - before
+            finally:
+                tracemalloc.stop()
+        self.assertLess(grown, 1024)
+
+    def test_cleanup_drops_idle_boxes(self):
+        limiter = self._limiter()
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            limiter.check_rate_limit(1, "TIMER_SYNC")
+            now += 10
+            limiter.check_rate_limit(2, "TIMER_SYNC")
+            now += 295
+            limiter.cleanup_old_data()
+        self.assertEqual(list(limiter.request_history), [2])
+        self.assertEqual(list(limiter.command_history), [2])
+
+    def test_reads_do_not_track_boxes(self):
+        limiter = self._limiter()
+        for box_id in range(100):
+            self.assertFalse(limiter.is_blocked(box_id))
+            self.assertEqual(limiter.get_stats(box_id)["requests_per_minute"], 0)
+        self.assertEqual(len(limiter.request_history), 0)
+        self.assertEqual(len(limiter.command_history), 0)
+
+    def test_key_cap_forgets_least_recently_checked(self):
+        limiter = RateLimiter(max_keys=3)
+        for box_id in (1, 2, 3, 1, 4):
+            limiter.check_rate_limit(box_id, "TIMER_SYNC")
+        self.assertEqual(list(limiter.request_history), [3, 1, 4])
+        self.assertEqual(sorted(limiter.command_history), [1, 3, 4])
+        self.assertEqual(limiter.stats()["box"]["lru_evicted"], 1)
+
+    def test_key_cap_keeps_blocked_boxes(self):
+        limiter = RateLimiter(max_per_second=1, block_duration=60, max_keys=3)
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            limiter.check_rate_limit(1, "TIMER_SYNC")
+            self.assertFalse(limiter.check_rate_limit(1, "TIMER_SYNC")[0])
+            for box_id in (2, 3, 4, 5):
+                now += 1
+                limiter.check_rate_limit(box_id, "TIMER_SYNC")
+            # Box 1 was least recently checked, but forgetting it would unblock it
+            self.assertEqual(sorted(limiter.request_history), [1, 4, 5])
+            self.assertTrue(limiter.is_blocked(1))
+            self.assertFalse(limiter.check_rate_limit(1, "TIMER_SYNC")[0])
+        self.assertEqual(limiter.stats()["box"]["lru_evicted"], 2)
+
+    def test_sweep_respects_budget_and_blocks(self):
+        limiter = RateLimiter(max_per_second=1, block_duration=500)
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            # Box 0 gets blocked; 1..9 are just idle
+            limiter.check_rate_limit(0, "TIMER_SYNC")
+            limiter.check_rate_limit(0, "TIMER_SYNC")
+            for box_id in range(1, 10):
+                limiter.check_rate_limit(box_id, "TIMER_SYNC")
+            now += 301
+            limiter.check_rate_limit(5, "TIMER_SYNC")
+            sweeper = RateLimitSweeper(limiter, budget=3)
+            self.assertEqual(sweeper.run_once(), 0)  # Blocked box 0 stops it
+            now += 200
+            self.assertEqual(sweeper.run_once(), 3)
+            self.assertEqual(sweeper.run_once(), 3)
+            self.assertEqual(sweeper.run_once(), 3)
+            # Box 5 was checked within the idle window
+            self.assertEqual(sweeper.run_once(), 0)
+        self.assertEqual(list(limiter.request_history), [5])
+        self.assertEqual(sweeper.stats()["swept"], 9)
+
+    def test_batch_is_charged_as_one_request(self):
+        limiter = self._limiter()
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            # 30 commands, more than the 5 per second, in one batch
+            batch = ["PROGRESS_UPDATE"] * 29 + ["TIMER_SYNC"]
+            self.assertTrue(limiter.check_batch(1, batch)[0])
+            stats = limiter.get_stats(1)
+            self.assertEqual(stats["requests_per_second"], 1)
+            self.assertEqual(stats["command_counts"], {"PROGRESS_UPDATE": 1, "TIMER_SYNC": 1})
+            # A batch over a command limit is refused without charging anything
+            limiter.check_rate_limit(1, "INIT_ROUTE")
+            limiter.check_rate_limit(1, "INIT_ROUTE")
+            allowed, reason = limiter.check_batch(1, ["PROGRESS_UPDATE", "INIT_ROUTE"])
+            stats = limiter.get_stats(1)
+        self.assertFalse(allowed)
+        self.assertIn("INIT_ROUTE", reason)
+        self.assertEqual(stats["requests_per_second"], 3)
+        self.assertEqual(stats["command_counts"]["PROGRESS_UPDATE"], 1)
+
+    def test_runaway_client_is_limited_instead_of_the_box(self):
+        limiter = RateLimiter(max_per_minute=60, max_per_second=5, block_duration=60)
+        tab, judge = {"ip": "10.0.0.9"}, {"ip": "10.0.0.2", "sub": "judge-1"}
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            flood = [
+                limiter.check_rate_limit(1, "PROGRESS_UPDATE", tab)[0] for _ in range(8)
+            ]
+            # The tab filled this second's window: the judge waits it out...
+            self.assertFalse(limiter.check_rate_limit(1, "PROGRESS_UPDATE", judge)[0])
+            now += 1.1
+            # ...but the box is not blocked; the tab's bucket is still empty
+            self.assertTrue(limiter.check_rate_limit(1, "PROGRESS_UPDATE", judge)[0])
+            self.assertFalse(limiter.check_rate_limit(1, "PROGRESS_UPDATE", tab)[0])
+            self.assertFalse(limiter.is_blocked(1))
+            # Refilled at 60 / 60 * 0.5 per second: no block to sit out
+            now += 1
+            self.assertTrue(limiter.check_rate_limit(1, "PROGRESS_UPDATE", tab)[0])
+            stats = limiter.stats()
+        self.assertEqual(flood, [True] * 5 + [False] * 3)
+        self.assertEqual(stats["ip"]["rejected"], 4)
+        self.assertEqual(stats["sub"]["checks"], 2)
+        self.assertEqual(stats["box"]["rejected"], 1)
+
+    def test_box_is_blocked_only_without_a_sender_budget(self):
+        limiter = RateLimiter(max_per_minute=60, max_per_second=5, block_duration=60)
+        # RATE_LIMIT_IP_SHARE=0: an IP alone no longer identifies the sender
+        limiter.client_limits["ip"] = ClientBuckets(0)
+        tab, judge = {"ip": "10.0.0.9"}, {"ip": "10.0.0.2", "sub": "judge-1"}
+        now = 1_000_000.0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            flood = [
+                limiter.check_rate_limit(1, "PROGRESS_UPDATE", tab)[0] for _ in range(6)
+            ]
+            self.assertTrue(limiter.is_blocked(1))
+            now += 1.1
+            # The blocked box refuses everyone, a verified judge included
+            self.assertFalse(limiter.check_rate_limit(1, "PROGRESS_UPDATE", judge)[0])
+            # A verified sub does identify the sender: its box is not blocked
+            for _ in range(6):
+                limiter.check_rate_limit(2, "PROGRESS_UPDATE", judge)
+            self.assertFalse(limiter.is_blocked(2))
+        self.assertEqual(flood, [True] * 5 + [False])
+
+    def test_client_budget_grows_with_the_boxes_it_drives(self):
+        # Default limits: six ContestPage windows on one PC, TIMER_SYNC once
+        # a second each, is more than half of one box's 300 per minute
+        limiter = RateLimiter(max_per_minute=300, max_per_second=20, block_duration=60)
+        pc = {"ip": "10.0.0.5"}
+        now = 1_000_000.0
+        rejected = 0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            for _ in range(180):
+                now += 1
+                for box_id in range(1, 7):
+                    rejected += not limiter.check_rate_limit(box_id, "TIMER_SYNC", pc)[0]
+            # A judge on the same address still gets through
+            allowed, _ = limiter.check_rate_limit(3, "PROGRESS_UPDATE", pc)
+        self.assertEqual(rejected, 0)
+        self.assertTrue(allowed)
+        self.assertEqual(limiter.stats()["ip"]["rejected"], 0)
+
+    def test_client_counts_boxes_it_drives_up_to_its_cap(self):
+        limiter = RateLimiter(max_per_minute=60, max_per_second=2, block_duration=0)
+        limiter.client_limits["ip"] = rate_limit.ClientBuckets(1, slots=1, boxes=3)
+        buckets = limiter.client_limits["ip"]
+        self.assertEqual(buckets._drive(0, 1, 100.0), 1)
+        self.assertEqual(buckets._drive(0, 2, 101.0), 2)
+        self.assertEqual(buckets._drive(0, 1, 102.0), 2)
+        self.assertEqual(buckets._drive(0, 3, 103.0), 3)
+        # Past the cap a new box replaces the one seen longest ago (2)
+        self.assertEqual(buckets._drive(0, 4, 104.0), 3)
+        self.assertEqual(buckets._drive(0, None, 105.0), 3)
+        # A minute later only the boxes seen since still count
+        self.assertEqual(buckets._drive(0, 4, 162.5), 2)
+
+    def test_client_refill_is_a_share_of_the_minute_limit(self):
+        limiter = RateLimiter(max_per_minute=120, max_per_second=4, block_duration=0)
+        limiter.client_limits["sub"].share = 0.25
+        now = 1_000_000.0
+        accepted = 0
+        with patch.object(rate_limit.time, "time", lambda: now):
+            for _ in range(600):
+                now += 0.1
+                accepted += limiter.check_clients({"sub": "judge-1"})[0]
+        # Burst of 4, then 120 / 60 * 0.25 = 0.5 per second over 60 s
+        self.assertAlmostEqual(accepted, 4 + 30, delta=1)
+
+
+class RateLimitStatsTest(unittest.TestCase):
+    def test_sweeper_runs_with_the_app(self):
+        get_rate_limiter().reset_all()
+        with TestClient(app) as client:
+            stats = client.get("/api/stats/rate_limit").json()
+        self.assertEqual(stats["box"]["tracked"], 0)
+        self.assertEqual(set(stats), {"box", "ip", "sub", "precheck", "sweep"})
+        self.assertIsNotNone(stats["sweep"])
+
+
+if __name__ == "__main__":
+    unittest.main()
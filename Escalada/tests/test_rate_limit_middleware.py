@@ -0,0 +1,167 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import state_locks, state_map
+from escalada.auth import create_access_token
+from escalada.main import app
+from escalada.rate_limit import get_rate_limiter
+from escalada.rate_limit_middleware import (
+    RateLimitMiddleware,
+    client_keys,
+    peek_commands,
+)
+
+
+class PeekCommandsTest(unittest.TestCase):
+    def test_peeks_known_commands_only(self):
+        self.assertEqual(
+            peek_commands("/api/cmd", b'{"boxId": 3, "type": "TIMER_SYNC"}'),
+            [(3, "TIMER_SYNC")],
+        )
+        self.assertEqual(
+            peek_commands(
+                "/api/cmd/batch",
+                b'{"boxId": 2, "commands": [{"type": "PROGRESS_UPDATE"},'
+                b' {"type": "SUBMIT_SCORE"}]}',
+            ),
+            [(2, "PROGRESS_UPDATE"), (2, "SUBMIT_SCORE")],
+        )
+        for body in (
+            b"not json",
+            b"[1]",
+            b'{"boxId": "3", "type": "TIMER_SYNC"}',
+            b'{"boxId": true, "type": "TIMER_SYNC"}',
+            b'{"boxId": 3, "type": "NOT_A_COMMAND"}',
+        ):
+            self.assertIsNone(peek_commands("/api/cmd", body), body)
+        self.assertIsNone(peek_commands("/api/cmd/batch", b'{"boxId": 2}'))
+
+
+class ClientKeysTest(unittest.TestCase):
+    def test_peer_address_and_verified_subject(self):
+        token = create_access_token({"sub": "judge-3"}).encode()
+        scope = {
+            "client": ("192.168.1.20", 51234),
+            "headers": [
+                (b"x-forwarded-for", b"10.9.9.9"),
+                (b"authorization", b"Bearer " + token),
+            ],
+        }
+        self.assertEqual(client_keys(scope), {"ip": "192.168.1.20", "sub": "judge-3"})
+
+    def test_dispatcher_address_and_forged_token(self):
+        header, payload, _ = create_access_token({"sub": "judge-3"}).split(".")
+        scope = {
+            "client": None,
+            "headers": [
+                # Sent by the client, then the one the dispatcher appended
+                (b"x-forwarded-for", b"1.1.1.1"),
+                (b"x-forwarded-for", b"1.1.1.1, 192.168.1.21"),
+                (b"authorization", f"Bearer {header}.{payload}.forged".encode()),
+            ],
+        }
+        self.assertEqual(client_keys(scope), {"ip": "192.168.1.21"})
+
+
+class RateLimitMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = True
+        self.limiter = get_rate_limiter()
+        self.limiter.reset_all()
+        self._limits = (
+            self.limiter.max_per_minute,
+            self.limiter.max_per_second,
+            self.limiter.block_duration,
+        )
+        self.limiter.max_per_minute = 100000
+        self.limiter.max_per_second = 100000
+        self.limiter.block_duration = 0
+
+    def tearDown(self):
+        (
+            self.limiter.max_per_minute,
+            self.limiter.max_per_second,
+            self.limiter.block_duration,
+        ) = self._limits
+        self.limiter.reset_all()
+        live_module.VALIDATION_ENABLED = self._validation
+        state_map.clear()
+        state_locks.clear()
+
+    def test_flood_is_rejected_before_validation(self):
+        self.limiter.max_per_second = 2
+        checks = self.limiter.checks
+        with patch.object(
+            live_module, "_validate_cmd", wraps=live_module._validate_cmd
+        ) as validated:
+            with TestClient(app) as client:
+                session = client.get("/api/state/7").json()["sessionId"]
+                command = {"boxId": 7, "type": "REQUEST_STATE", "sessionId": session}
+                codes = [
+                    client.post("/api/cmd", json=command).status_code for _ in range(3)
+                ]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(validated.call_count, 2)
+        # Counted once per request, not again inside cmd()
+        self.assertEqual(self.limiter.checks - checks, 3)
+
+    def test_batch_is_one_request(self):
+        self.limiter.max_per_second = 20
+        checks = self.limiter.checks
+        with TestClient(app) as client:
+            session = client.get("/api/state/7").json()["sessionId"]
+            command = {"boxId": 7, "type": "REQUEST_STATE", "sessionId": session}
+            r = client.post("/api/cmd/batch", json={"boxId": 7, "commands": [command] * 30})
+        self.assertEqual(r.status_code, 200, r.text)
+        self.assertEqual(self.limiter.checks - checks, 1)
+        self.assertEqual(self.limiter.get_stats(7)["requests_per_second"], 1)
+
+    def test_unknown_type_is_left_to_validation(self):
+        with TestClient(app) as client:
+            r = client.post("/api/cmd", json={"boxId": 7, "type": "NOT_A_COMMAND"})
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(len(self.limiter.request_history), 0)
+        # Still charged to the sender
+        self.assertEqual(self.limiter.stats()["ip"]["slots_used"], 1)
+
+    def test_oversized_body_is_refused(self):
+        with TestClient(app) as client:
+            r = client.post(
+                "/api/cmd",
+                content=b'{"boxId": 1, "type": "INIT_ROUTE", "x": "'
+                + b"a" * 300_000
+                + b'"}',
+                headers={"content-type": "application/json"},
+            )
+            stats = client.get("/api/stats/rate_limit").json()
+        self.assertEqual(r.status_code, 413)
+        self.assertGreaterEqual(stats["precheck"]["too_large"], 1)
+
+    def test_streamed_body_is_cut_off_at_the_limit(self):
+        chunks = [b'{"boxId": 1, ', b'"type": "TIMER_SYNC", ', b'"remaining": 5}']
+        sent: list[dict] = []
+
+        async def receive():
+            body = chunks.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+
+        async def send(message):
+            sent.append(message)
+
+        async def downstream(scope, receive, send):
+            self.fail("body over the limit reached the app")
+
+        scope = {"type": "http", "method": "POST", "path": "/api/cmd", "headers": []}
+        asyncio.run(RateLimitMiddleware(downstream, max_body=32)(scope, receive, send))
+        self.assertEqual(sent[0]["status"], 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import time
+import unittest
+
+TAPS_BEFORE_KILL = 200
+
+
+class ReplicationStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "replication.sock")
+
+    def test_snapshot_then_records_in_order_and_reconnect(self):
+        # Imported here: spawned workers read REPLICATION_* when they import it
+        from escalada.replication import Replica, ReplicationSource
+
+        async def scenario():
+            primary = {"boxes": {}, "n": 0}
+            standby = {}
+            records = []
+
+            async def on_snapshot(state):
+                standby.clear()
+                standby.update(state)
+                records.clear()
+
+            source = ReplicationSource(lambda: dict(primary), self.path, heartbeat=0.02)
+            # Accepted before any replica: covered by the snapshot
+            primary["n"] = 3
+            for i in range(3):
+                source.ship("box_1", {"i": i})
+            await source.start()
+            replica = Replica(
+                on_snapshot, lambda key, rec: records.append(rec["i"]), self.path
+            )
+            replica.retry = 0.02
+            replica.start()
+            try:
+                while replica.snapshots == 0:
+                    await asyncio.sleep(0.01)
+                for i in range(3, 103):
+                    source.ship("box_1", {"i": i})
+                while replica.applied_seq < 103:
+                    await asyncio.sleep(0.01)
+                self.assertEqual(standby["n"], 3)
+                self.assertEqual(records, list(range(3, 103)))
+
+                # Heartbeats carry the primary's seq; acks report it back
+                await asyncio.sleep(0.1)
+                self.assertEqual(replica.stats()["lag_records"], 0)
+                self.assertEqual(source.stats()["replicas"][0]["acked_seq"], 103)
+
+                # Primary restarts: the replica reconnects and resyncs
+                await source.close()
+                while replica.connected:
+                    await asyncio.sleep(0.01)
+                primary["n"] = 7
+                source = ReplicationSource(lambda: dict(primary), self.path)
+                await source.start()
+                while replica.snapshots < 2:
+                    await asyncio.sleep(0.01)
+                self.assertEqual(standby["n"], 7)
+                self.assertEqual(records, [])
+            finally:
+                await replica.close()
+                await source.close()
+
+        asyncio.run(scenario())
+
+
+def _primary(env, acked):
+    """A primary under load: taps box 1 until killed, reporting each ACK."""
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+
+    from escalada.api import live
+    from escalada.main import app
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/cmd",
+            json={
+                "boxId": 1,
+                "type": "INIT_ROUTE",
+                "routeIndex": 1,
+                "holdsCount": 0,
+                "competitors": [{"nume": "Alex"}, {"nume": "Bob"}],
+            },
+        )
+        assert response.status_code == 200, response.text
+        session_id = client.get("/api/state/1").json()["sessionId"]
+        # Taps as fast as possible (the rate limiter would cap them)
+        live.VALIDATION_ENABLED = False
+        taps = 0
+        while True:
+            response = client.post(
+                "/api/cmd",
+                json={"boxId": 1, "type": "PROGRESS_UPDATE", "delta": 1},
+            )
+            assert response.status_code == 200, response.text
+            taps += 1
+            acked.put((taps, session_id))
+
+
+def _standby(env, control, results):
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+
+    from escalada.main import app
+
+    with TestClient(app) as client:
+        refused = client.post(
+            "/api/cmd", json={"boxId": 1, "type": "INIT_ROUTE", "competitors": []}
+        ).status_code
+        results.put(("ready", refused))
+
+        session_id = control.get(timeout=60)
+        lag = client.get("/api/stats/replication").json()
+        started = time.monotonic()
+        promoted = client.post("/api/replication/promote").json()
+        before = client.get("/api/state/1").json()
+        # The client keeps its sessionId and carries on against the standby
+        tap = client.post(
+            "/api/cmd",
+            json={
+                "boxId": 1,
+                "type": "PROGRESS_UPDATE",
+                "delta": 1,
+                "sessionId": session_id,
+            },
+        ).json()
+        after = client.get("/api/state/1").json()
+        elapsed = time.monotonic() - started
+        with client.websocket_connect("/api/ws/1") as ws:
+            snapshot = ws.receive_json()
+        results.put(("done", lag, promoted, before, tap, after, snapshot, elapsed))
+
+
+class FailoverTest(unittest.TestCase):
+    """Kill the primary mid-stream; the promoted standby has every ACKed tap"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _env(self, role: str) -> dict:
+        return {
+            "REPLICATION_ROLE": role,
+            "REPLICATION_SOCKET": os.path.join(self.tmp.name, "replication.sock"),
+            "JOURNAL_DIR": os.path.join(self.tmp.name, role, "journal"),
+            "CHECKPOINT_PATH": os.path.join(self.tmp.name, role, "checkpoint.json"),
+            "LOG_FILE": os.path.join(self.tmp.name, f"{role}.log"),
+        }
+
+    def test_kill_primary_under_load_and_promote(self):
+        ctx = multiprocessing.get_context("spawn")
+        acked, control, results = ctx.Queue(), ctx.Queue(), ctx.Queue()
+        standby = ctx.Process(
+            target=_standby, args=(self._env("replica"), control, results)
+        )
+        standby.start()
+        self.addCleanup(standby.kill)
+        ready, refused = results.get(timeout=60)
+        self.assertEqual(refused, 503)
+
+        primary = ctx.Process(target=_primary, args=(self._env("primary"), acked))
+        primary.start()
+        self.addCleanup(primary.kill)
+        taps = 0
+        while taps < TAPS_BEFORE_KILL:
+            taps, session_id = acked.get(timeout=60)
+        os.kill(primary.pid, signal.SIGKILL)
+        primary.join(timeout=10)
+        # Everything the primary acknowledged before dying
+        while True:
+            try:
+                taps, session_id = acked.get(timeout=0.5)
+            except queue.Empty:
+                break
+
+        control.put(session_id)
+        _, lag, promoted, before, tap, after, snapshot, elapsed = results.get(
+            timeout=60
+        )
+        standby.join(timeout=20)
+        self.assertEqual(standby.exitcode, 0)
+
+        self.assertEqual(lag["role"], "replica")
+        self.assertIn("lag_ms", lag)
+        self.assertEqual(promoted["status"], "ok")
+        # Async shipping: at most the taps in flight at the kill are beyond ACKs
+        self.assertGreaterEqual(before["holdCount"], taps)
+        self.assertEqual(before["sessionId"], session_id)
+        self.assertEqual(tap, {"status": "ok"})
+        self.assertEqual(after["holdCount"], before["holdCount"] + 1)
+        self.assertEqual(snapshot["sessionId"], session_id)
+        self.assertEqual(snapshot["holdCount"], after["holdCount"])
+        self.assertLess(elapsed, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
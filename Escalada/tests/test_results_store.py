@@ -0,0 +1,168 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from escalada.results_store import ResultsStore
+
+
+def _routes():
+    return {
+        1: [
+            ("Alice", 1, 30.0, 95, 1.5),
+            ("Bob", 1, 30.0, None, 1.5),
+            ("Cara", 3, 12.0, 140, 3.0),
+        ]
+    }
+
+
+class ResultsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = ResultsStore(os.path.join(self.tmp.name, "results.db"))
+        self.addCleanup(self.store.close)
+
+    def _save(self, category="Tineri", overall=None):
+        self.store.save_category(
+            category,
+            1,
+            True,
+            [("Alice", "CS Arad"), ("Bob", ""), ("Cara", "Vertical")],
+            _routes(),
+            overall or [("Alice", 1, 1.5), ("Bob", 1, 1.5), ("Cara", 3, 3.0)],
+        )
+
+    def test_wal_mode(self):
+        (mode,) = self.store._conn().execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(mode, "wal")
+
+    def test_round_trip_keeps_ranking_order(self):
+        self._save()
+        self.assertEqual(self.store.podium("Tineri"), ["Alice", "Bob", "Cara"])
+        overall = self.store.overall("Tineri")
+        self.assertTrue(overall["use_time_tiebreak"])
+        self.assertEqual(
+            overall["rows"][0],
+            {
+                "rank": 1,
+                "name": "Alice",
+                "club": "CS Arad",
+                "scores": [30.0],
+                "times": [95],
+                "total": 1.5,
+            },
+        )
+        route = self.store.route("Tineri", 1)
+        self.assertEqual([r["name"] for r in route], ["Alice", "Bob", "Cara"])
+        self.assertIsNone(route[1]["time"])
+        self.assertEqual(route[2]["points"], 3.0)
+
+    def test_unknown_category_or_route(self):
+        self._save()
+        self.assertIsNone(self.store.podium("Seniori"))
+        self.assertIsNone(self.store.overall("Seniori"))
+        self.assertIsNone(self.store.route("Tineri", 2))
+
+    def test_saving_again_replaces_the_category(self):
+        self._save()
+        self._save(overall=[("Cara", 1, 1.0), ("Alice", 2, 2.0), ("Bob", 3, 3.0)])
+        self._save(category="Seniori")
+        self.assertEqual(self.store.podium("Tineri"), ["Cara", "Alice", "Bob"])
+        self.assertEqual(self.store.categories(), ["Seniori", "Tineri"])
+        (competitors,) = (
+            self.store._conn().execute("SELECT COUNT(*) FROM competitors").fetchone()
+        )
+        self.assertEqual(competitors, 6)
+
+    def test_failed_save_leaves_previous_results(self):
+        self._save()
+        with self.assertRaises(KeyError):
+            # Overall row for a competitor that was never inserted
+            self._save(overall=[("Nobody", 1, 1.0)])
+        self.assertEqual(self.store.podium("Tineri"), ["Alice", "Bob", "Cara"])
+
+    def test_reads_from_other_threads(self):
+        self._save()
+        found = []
+        thread = threading.Thread(
+            target=lambda: found.append(self.store.podium("Tineri"))
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(found, [["Alice", "Bob", "Cara"]])
+
+
+class SaveRankingStoreTest(unittest.TestCase):
+    """save_ranking writes the store; podium and ranking read it back"""
+
+    def setUp(self):
+        from escalada.api.podium import router as podium_router
+        from escalada.api.save_ranking import router as save_router
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = ResultsStore(os.path.join(self.tmp.name, "results.db"))
+        self.addCleanup(self.store.close)
+        for module in ("escalada.api.save_ranking", "escalada.api.podium"):
+            patcher = patch(f"{module}.get_results_store", return_value=self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        app = FastAPI()
+        app.include_router(save_router)
+        app.include_router(podium_router)
+        self.client = TestClient(app)
+
+    def test_save_then_podium_and_exports(self):
+        response = self.client.post(
+            "/save_ranking",
+            json={
+                "categorie": "Tineri",
+                "route_count": 2,
+                "scores": {
+                    "Alice": [30, 20],
+                    "Bob": [25, 28],
+                    "Cara": [10, 10],
+                    "Dan": [30, 20],
+                },
+                "clubs": {"Alice": "CS Arad"},
+                "times": {"Alice": [95, 100], "Dan": [90, 100]},
+                "use_time_tiebreak": True,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["saved"]), 6)
+
+        with patch("pandas.read_excel") as read_excel:
+            podium = self.client.get("/podium/Tineri").json()
+        read_excel.assert_not_called()
+        self.assertEqual([p["name"] for p in podium], self.store.podium("Tineri")[:3])
+
+        # The Excel export is derived from the store and matches it row for row
+        exported = pd.read_excel(
+            os.path.join("escalada", "clasamente", "Tineri", "overall.xlsx")
+        )
+        overall = self.client.get("/ranking/Tineri").json()
+        self.assertEqual(list(exported["Nume"]), [r["name"] for r in overall["rows"]])
+        self.assertIn("Time R1", exported.columns)
+
+        route = self.client.get("/ranking/Tineri", params={"route": 1}).json()
+        # Same score on route 1, Dan was faster
+        self.assertEqual([r["name"] for r in route[:2]], ["Dan", "Alice"])
+        self.assertEqual(route[1]["time"], 95)
+        self.assertEqual(self.client.get("/ranking/Tineri?route=3").status_code, 404)
+        self.assertEqual(self.client.get("/stats/results").json()["saves"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+from escalada.api import live as live_module
+from escalada.api.live import (
+    Cmd,
+    capture_state,
+    cmd,
+    get_state,
+    replay_cmd,
+    state_locks,
+    state_map,
+)
+from escalada.box_state import BoxState
+from escalada.timer_engine import TimerEngine, TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_fires_each_key_once_at_its_tick(self):
+        wheel = TimerWheel(slots=8)
+        wheel.arm(1, 3)
+        wheel.arm(2, 3)
+        wheel.arm(3, 20)  # more than a lap ahead: shares slot 4 with tick 4
+        wheel.arm(4, 5)
+        wheel.cancel(4)
+        self.assertEqual(wheel.advance(2), [])
+        self.assertEqual(sorted(wheel.advance(4)), [1, 2])
+        self.assertEqual(wheel.advance(19), [])
+        # A stalled loop jumping ahead still fires what came due
+        self.assertEqual(wheel.advance(40), [3])
+        self.assertEqual(len(wheel), 0)
+
+    def test_past_deadline_fires_on_next_tick(self):
+        wheel = TimerWheel(slots=8)
+        wheel.advance(10)
+        wheel.arm(1, 2)
+        self.assertEqual(wheel.advance(11), [1])
+
+
+class TimerEngineTest(unittest.TestCase):
+    def test_ticks_whole_seconds_and_expires_once(self):
+        frames: list[dict] = []
+        expired: list[int] = []
+
+        async def on_expire(box_id):
+            expired.append(box_id)
+
+        async def scenario():
+            engine = TimerEngine(frames.append, on_expire, hz=50)
+            engine.start()
+            engine.run(1, 1.2)
+            engine.run(2, 5)
+            await asyncio.sleep(0.1)
+            self.assertAlmostEqual(engine.stop(2), 4.9, delta=0.1)
+            await asyncio.sleep(1.3)
+            await engine.close()
+            return engine
+
+        engine = asyncio.run(scenario())
+        self.assertEqual(expired, [1])
+        shown = [f[1] for f in frames if 1 in f]
+        self.assertEqual(shown, [2, 1, 0])
+        self.assertEqual(engine.stats()["running"], 0)
+        self.assertEqual(engine.expired, 1)
+
+
+class ServerTimerTest(unittest.TestCase):
+    """START/STOP/RESUME drive the box timer; expiry registers the time"""
+
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = False
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+        live_module.timers = None
+        state_map.clear()
+        state_locks.clear()
+
+    def test_timer_runs_on_server_and_replays_from_journal(self):
+        async def scenario():
+            live_module.timers = TimerEngine(
+                live_module.deliver_timer_ticks, live_module.expire_timer, hz=50
+            )
+            live_module.timers.start()
+            with patch.object(
+                live_module, "_journal_cmd", wraps=live_module._journal_cmd
+            ) as journaled:
+                await cmd(
+                    Cmd(
+                        boxId=1,
+                        type="INIT_ROUTE",
+                        routeIndex=1,
+                        holdsCount=10,
+                        competitors=[{"nume": "Alex"}],
+                        timerPreset="00:01",
+                    )
+                )
+                await cmd(Cmd(boxId=1, type="START_TIMER"))
+                await asyncio.sleep(0.3)
+                await cmd(Cmd(boxId=1, type="STOP_TIMER"))
+                paused = state_map[1].remaining
+                ignored = await cmd(Cmd(boxId=1, type="TIMER_SYNC", remaining=42))
+                await asyncio.sleep(0.2)
+                await cmd(Cmd(boxId=1, type="RESUME_TIMER"))
+                await asyncio.sleep(1.0)
+                records = [
+                    json.loads(c.args[1].model_dump_json())
+                    for c in journaled.call_args_list
+                ]
+            await live_module.timers.close()
+            return paused, ignored, records
+
+        paused, ignored, records = asyncio.run(scenario())
+        self.assertAlmostEqual(paused, 0.7, delta=0.1)
+        self.assertEqual(ignored["reason"], "server_timer")
+
+        sm = state_map[1]
+        self.assertEqual(sm.timerState, "paused")
+        self.assertEqual(sm.remaining, 0)
+        self.assertEqual(sm.lastRegisteredTime, 1.0)
+        self.assertEqual(
+            [r["type"] for r in records[1:]],
+            [
+                "START_TIMER",
+                "STOP_TIMER",
+                "RESUME_TIMER",
+                "STOP_TIMER",
+                "REGISTER_TIME",
+            ],
+        )
+
+        # Replaying the journaled commands rebuilds the same timer fields
+        replayed = BoxState()
+        for record in records:
+            replay_cmd(replayed, {"cmd": record, "sid": sm.sessionId})
+        for name in ("timerState", "remaining", "lastRegisteredTime", "seq"):
+            self.assertEqual(getattr(replayed, name), getattr(sm, name))
+
+
+    def test_ticks_do_not_write_box_state(self):
+        async def scenario():
+            live_module.timers = TimerEngine(
+                live_module.deliver_timer_ticks, live_module.expire_timer, hz=50
+            )
+            live_module.timers.start()
+            await cmd(
+                Cmd(
+                    boxId=1,
+                    type="INIT_ROUTE",
+                    routeIndex=1,
+                    holdsCount=10,
+                    competitors=[{"nume": "Alex"}],
+                    timerPreset="00:05",
+                )
+            )
+            await cmd(Cmd(boxId=1, type="START_TIMER"))
+            started = (state_map[1].remaining, state_map[1].seq)
+            await asyncio.sleep(1.2)
+            ticked = (state_map[1].remaining, state_map[1].seq)
+            snapshot = await get_state(1)
+            record = capture_state()["boxes"]["1"]
+            await live_module.timers.close()
+            return started, ticked, snapshot, record
+
+        started, ticked, snapshot, record = asyncio.run(scenario())
+        # State still holds what START_TIMER stamped; readers get the deadline
+        self.assertEqual(ticked, started)
+        self.assertEqual(started[0], 5.0)
+        self.assertAlmostEqual(snapshot["remaining"], 3.8, delta=0.2)
+        self.assertAlmostEqual(record["remaining"], 3.8, delta=0.2)
+
+if __name__ == "__main__":
+    unittest.main()
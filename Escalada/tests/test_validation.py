@@ -0,0 +1,116 @@
+import unittest
+
+from pydantic import ValidationError
+
+from escalada.api.live import Cmd
+from escalada.validation import (ProgressUpdateCmd, TimerSyncCmd,
+                                 validate_command)
+
+
+class ValidateCommandTest(unittest.TestCase):
+    def assertInvalid(self, **fields):
+        with self.assertRaises(ValueError):
+            validate_command(Cmd(**fields))
+
+    def test_valid_commands(self):
+        for fields in [
+            {"boxId": 1, "type": "START_TIMER", "sessionId": "abc"},
+            {"boxId": -1, "type": "SET_TIME_CRITERION", "timeCriterionEnabled": True},
+            {"boxId": 1, "type": "PROGRESS_UPDATE", "delta": 0.1},
+            {"boxId": 1, "type": "TIMER_SYNC", "remaining": 42},
+            {"boxId": 1, "type": "REGISTER_TIME", "registeredTime": 12.5},
+            {
+                "boxId": 1,
+                "type": "SUBMIT_SCORE",
+                "score": 7,
+                "competitor": "Ștefan D'Ascenzo",
+                "competitorIdx": 3,
+            },
+            {
+                "boxId": 1,
+                "type": "INIT_ROUTE",
+                "routeIndex": 1,
+                "holdsCount": 20,
+                "competitors": [{"nume": "Alex"}],
+                "timerPreset": "5:00",
+            },
+        ]:
+            validate_command(Cmd(**fields))
+
+    def test_fields_of_other_types_are_rejected(self):
+        self.assertInvalid(boxId=1, type="PROGRESS_UPDATE", delta=1, score=500)
+        self.assertInvalid(
+            boxId=1,
+            type="PROGRESS_UPDATE",
+            delta=1,
+            competitor="<script>alert(1)</script>",
+            categorie="<img onerror=alert(1)>",
+        )
+        # Explicit nulls and the legacy time alias are still accepted
+        validate_command(Cmd(boxId=1, type="PROGRESS_UPDATE", delta=1, score=None))
+        validate_command(Cmd(boxId=1, type="REGISTER_TIME", registeredTime=3, time=3))
+        validate_command(Cmd(boxId=1, type="STOP_TIMER", remaining=12.5))
+
+    def test_unknown_type_rejected(self):
+        self.assertInvalid(boxId=1, type="DROP_TABLES")
+
+    def test_required_fields_per_type(self):
+        self.assertInvalid(boxId=1, type="PROGRESS_UPDATE")
+        self.assertInvalid(boxId=1, type="TIMER_SYNC")
+        self.assertInvalid(boxId=1, type="REGISTER_TIME")
+        self.assertInvalid(boxId=1, type="SUBMIT_SCORE", score=5)
+        self.assertInvalid(boxId=1, type="INIT_ROUTE", routeIndex=1, holdsCount=5)
+        self.assertInvalid(boxId=-1, type="SET_TIME_CRITERION")
+
+    def test_field_rules(self):
+        self.assertInvalid(boxId=1, type="SUBMIT_SCORE", score=5, competitor="<b>x</b>")
+        self.assertInvalid(
+            boxId=1,
+            type="INIT_ROUTE",
+            routeIndex=1,
+            holdsCount=5,
+            competitors=[{"nume": "x"}],
+            timerPreset="5 minutes",
+        )
+        self.assertInvalid(boxId=10000, type="START_TIMER")
+        self.assertInvalid(boxId=1, type="START_TIMER", sessionId="x" * 65)
+
+    def test_fast_paths_match_models(self):
+        cases = (
+            [
+                (ProgressUpdateCmd, {"boxId": 1, "type": "PROGRESS_UPDATE", "delta": d})
+                for d in (-10, -0.1, 1, 10, 10.5, -11, float("nan"))
+            ]
+            + [
+                (TimerSyncCmd, {"boxId": b, "type": "TIMER_SYNC", "remaining": r})
+                for b, r in ((1, 0), (1, 9999), (1, -1), (1, 10000), (-2, 5))
+            ]
+            + [
+                (
+                    ProgressUpdateCmd,
+                    {
+                        "boxId": 1,
+                        "type": "PROGRESS_UPDATE",
+                        "delta": 1,
+                        "boxVersion": v,
+                    },
+                )
+                for v in (0, 99999, -1, 100000)
+            ]
+        )
+        for model, fields in cases:
+            try:
+                model(**fields)
+                expected = True
+            except ValidationError:
+                expected = False
+            try:
+                validate_command(Cmd(**fields))
+                actual = True
+            except ValueError:
+                actual = False
+            self.assertEqual(actual, expected, fields)
+
+
+if __name__ == "__main__":
+    unittest.main()
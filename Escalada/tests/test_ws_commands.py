@@ -0,0 +1,220 @@
+import json
+import unittest
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import state_locks, state_map
+from escalada.main import app
+from escalada.rate_limit import get_rate_limiter
+
+
+def recv_until(ws, wanted: set[str], max_steps: int = 20) -> dict:
+    """Receive frames until one with a type in `wanted` arrives."""
+    for _ in range(max_steps):
+        payload = json.loads(ws.receive_text())
+        if payload.get("type") in wanted:
+            return payload
+    raise AssertionError(f"Did not receive any of {wanted}")
+
+
+class WebSocketCommandTest(unittest.TestCase):
+    """Judge commands sent over /api/ws/{box_id} instead of POST /api/cmd"""
+
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = True
+        rl = get_rate_limiter()
+        rl.reset_all()
+        rl.max_per_minute = 100000
+        rl.max_per_second = 100000
+        rl.block_duration = 0
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+
+    def _init_route(self, box_id: int) -> None:
+        r = self.client.post(
+            "/api/cmd",
+            json={
+                "boxId": box_id,
+                "type": "INIT_ROUTE",
+                "routeIndex": 1,
+                "holdsCount": 10,
+                "competitors": [{"nume": "Alex"}, {"nume": "Bob"}],
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+
+    def test_progress_update_acked_and_applied(self):
+        self._init_route(1)
+        with self.client.websocket_connect("/api/ws/1") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(
+                json.dumps(
+                    {
+                        "id": "tap-1",
+                        "type": "PROGRESS_UPDATE",
+                        "delta": 1,
+                        "sessionId": snap["sessionId"],
+                    }
+                )
+            )
+            ack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(ack["type"], "ACK")
+        self.assertEqual(ack["id"], "tap-1")
+        self.assertEqual(ack["status"], "ok")
+        self.assertEqual(state_map[1]["holdCount"], 1)
+
+    def test_invalid_command_is_nacked(self):
+        self._init_route(2)
+        with self.client.websocket_connect("/api/ws/2") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(
+                json.dumps(
+                    {
+                        "id": 7,
+                        "type": "PROGRESS_UPDATE",
+                        "sessionId": snap["sessionId"],
+                    }
+                )
+            )
+            nack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(nack["type"], "NACK")
+        self.assertEqual(nack["id"], 7)
+        self.assertEqual(nack["code"], 400)
+        self.assertEqual(state_map[2]["holdCount"], 0.0)
+
+    def test_missing_session_is_nacked(self):
+        self._init_route(3)
+        with self.client.websocket_connect("/api/ws/3") as ws:
+            recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(json.dumps({"id": "a", "type": "START_TIMER"}))
+            nack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(nack["type"], "NACK")
+        self.assertIn("sessionId", nack["error"])
+        self.assertFalse(state_map[3]["started"])
+
+    def test_stale_session_is_acked_as_ignored(self):
+        self._init_route(4)
+        with self.client.websocket_connect("/api/ws/4") as ws:
+            recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(
+                json.dumps({"id": "b", "type": "START_TIMER", "sessionId": "old-tab"})
+            )
+            ack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(ack["type"], "ACK")
+        self.assertEqual(ack["status"], "ignored")
+        self.assertEqual(ack["reason"], "stale_session")
+
+    def test_command_for_other_box_is_nacked(self):
+        self._init_route(5)
+        with self.client.websocket_connect("/api/ws/5") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(
+                json.dumps(
+                    {
+                        "id": "c",
+                        "boxId": 6,
+                        "type": "START_TIMER",
+                        "sessionId": snap["sessionId"],
+                    }
+                )
+            )
+            nack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(nack["type"], "NACK")
+        self.assertNotIn(6, state_map)
+
+    def test_cmd_batch_over_socket(self):
+        self._init_route(7)
+        with self.client.websocket_connect("/api/ws/7") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            sid = snap["sessionId"]
+            ws.send_text(
+                json.dumps(
+                    {
+                        "id": "batch-1",
+                        "type": "CMD_BATCH",
+                        "commands": [
+                            {"type": "PROGRESS_UPDATE", "delta": 1, "sessionId": sid},
+                            {"type": "PROGRESS_UPDATE", "delta": 1, "sessionId": sid},
+                            {"type": "PROGRESS_UPDATE", "delta": 1, "sessionId": sid},
+                        ],
+                    }
+                )
+            )
+            ack = recv_until(ws, {"ACK", "NACK"})
+        self.assertEqual(ack["type"], "ACK")
+        self.assertEqual(ack["id"], "batch-1")
+        self.assertEqual(len(ack["results"]), 3)
+        self.assertEqual(state_map[7]["holdCount"], 3)
+
+    def test_cmd_batch_http_endpoint(self):
+        self._init_route(8)
+        sid = state_map[8]["sessionId"]
+        r = self.client.post(
+            "/api/cmd/batch",
+            json={
+                "boxId": 8,
+                "commands": [
+                    {"boxId": 8, "type": "START_TIMER", "sessionId": sid},
+                    {"boxId": 8, "type": "PROGRESS_UPDATE", "delta": 1, "sessionId": sid},
+                ],
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["results"], [{"status": "ok"}, {"status": "ok"}])
+        self.assertTrue(state_map[8]["started"])
+
+    def test_socket_flood_is_charged_to_its_client_not_the_box(self):
+        rl = get_rate_limiter()
+        self.addCleanup(setattr, rl, "max_per_second", rl.max_per_second)
+        self.addCleanup(setattr, rl, "block_duration", rl.block_duration)
+        rl.max_per_second = 3
+        rl.block_duration = 60
+        self._init_route(3)
+        checks = rl.stats()["ip"]["checks"]
+        with self.client.websocket_connect("/api/ws/3") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            replies = []
+            for i in range(6):
+                ws.send_text(
+                    json.dumps(
+                        {
+                            "id": i,
+                            "type": "PROGRESS_UPDATE",
+                            "delta": 1,
+                            "sessionId": snap["sessionId"],
+                        }
+                    )
+                )
+                replies.append(recv_until(ws, {"ACK", "NACK"}))
+        self.assertIn(429, [r.get("code") for r in replies])
+        self.assertEqual(rl.stats()["ip"]["checks"] - checks, 6)
+        # The tab is limited on its own; the judge can still reach the box
+        self.assertFalse(rl.is_blocked(3))
+
+    def test_delta_subscriber_gets_snapshot_then_deltas(self):
+        self._init_route(9)
+        with self.client.websocket_connect("/api/ws/9?deltas=1") as ws:
+            snap = recv_until(ws, {"STATE_SNAPSHOT"})
+            ws.send_text(
+                json.dumps(
+                    {
+                        "id": "d",
+                        "type": "PROGRESS_UPDATE",
+                        "delta": 1,
+                        "sessionId": snap["sessionId"],
+                    }
+                )
+            )
+            delta = recv_until(ws, {"STATE_DELTA"})
+        self.assertEqual(delta["baseSeq"], snap["seq"])
+        self.assertEqual(delta["changes"], {"holdCount": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
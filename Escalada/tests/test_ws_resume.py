@@ -0,0 +1,124 @@
+import unittest
+
+from fastapi.testclient import TestClient
+
+from escalada.api import live as live_module
+from escalada.api.live import state_locks, state_map
+from escalada.event_ring import EventRing
+from escalada.main import app
+from escalada.rate_limit import get_rate_limiter
+
+
+class EventRingTest(unittest.TestCase):
+    def test_since_returns_only_missed_frames(self):
+        ring = EventRing(maxlen=3)
+        first = ring.next_seq()
+        ring.append(first, "a")
+        for text in "bcd":
+            ring.append(ring.next_seq(), text, snapshot=text == "d")
+
+        # "a" was evicted: resuming from before it needs a snapshot
+        self.assertIsNone(ring.since(first - 1))
+        self.assertEqual(ring.since(first), [("b", False), ("c", False), ("d", True)])
+        self.assertEqual(ring.since(first + 2), [("d", True)])
+        self.assertEqual(ring.since(ring.last), [])
+        self.assertIsNone(ring.since(ring.last + 1))
+
+    def test_numbers_from_an_older_ring_are_unknown(self):
+        old = EventRing()
+        old.append(old.next_seq(), "x")
+        new = EventRing()
+        new.append(new.next_seq(), "y")
+        self.assertIsNone(new.since(old.last))
+
+
+class WebSocketResumeTest(unittest.TestCase):
+    """Reconnecting with ?since=<eventSeq> replays only the missed frames"""
+
+    def setUp(self):
+        state_map.clear()
+        state_locks.clear()
+        live_module.channels.clear()
+        live_module._event_rings.clear()
+        for key in live_module.broadcast_stats:
+            live_module.broadcast_stats[key] = 0
+        self._validation = live_module.VALIDATION_ENABLED
+        live_module.VALIDATION_ENABLED = True
+        rl = get_rate_limiter()
+        rl.reset_all()
+        rl.max_per_minute = 100000
+        rl.max_per_second = 100000
+        rl.block_duration = 0
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        live_module.VALIDATION_ENABLED = self._validation
+        live_module._event_rings.clear()
+
+    def _connect_once(self, box_id: int) -> dict:
+        with self.client.websocket_connect(f"/api/ws/{box_id}") as ws:
+            return ws.receive_json()
+
+    def _tap(self, box_id: int, session_id: str) -> None:
+        r = self.client.post(
+            "/api/cmd",
+            json={
+                "boxId": box_id,
+                "type": "PROGRESS_UPDATE",
+                "delta": 1,
+                "sessionId": session_id,
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+
+    def test_resume_replays_gap_then_continues_live(self):
+        snapshot = self._connect_once(1)
+        since = snapshot["eventSeq"]
+        self._tap(1, snapshot["sessionId"])
+        self._tap(1, snapshot["sessionId"])
+
+        with self.client.websocket_connect(f"/api/ws/1?since={since}") as ws:
+            missed = [ws.receive_json() for _ in range(4)]
+            self.assertEqual(
+                [m["type"] for m in missed],
+                ["PROGRESS_UPDATE", "STATE_SNAPSHOT"] * 2,
+            )
+            self.assertEqual(
+                [m["eventSeq"] for m in missed], list(range(since + 1, since + 5))
+            )
+            self.assertEqual(missed[-1]["holdCount"], 2)
+
+            # No snapshot was queued after the replay: the next frame is live
+            self._tap(1, snapshot["sessionId"])
+            echo = ws.receive_json()
+            self.assertEqual(echo["type"], "PROGRESS_UPDATE")
+            self.assertEqual(echo["eventSeq"], since + 5)
+
+        stats = self.client.get("/api/stats/broadcast").json()
+        self.assertEqual(stats["resumes"], 1)
+        self.assertEqual(stats["events_replayed"], 4)
+
+    def test_unknown_or_evicted_gap_gets_a_snapshot(self):
+        snapshot = self._connect_once(2)
+        self._tap(2, snapshot["sessionId"])
+        with self.client.websocket_connect("/api/ws/2?since=5") as ws:
+            frame = ws.receive_json()
+        self.assertEqual(frame["type"], "STATE_SNAPSHOT")
+        self.assertEqual(frame["holdCount"], 1)
+        self.assertEqual(frame["eventSeq"], live_module._event_rings[2].last)
+
+    def test_gap_larger_than_outbox_gets_a_snapshot(self):
+        snapshot = self._connect_once(3)
+        for _ in range(40):
+            self._tap(3, snapshot["sessionId"])
+        url = f"/api/ws/3?since={snapshot['eventSeq']}"
+        with self.client.websocket_connect(url) as ws:
+            frame = ws.receive_json()
+        self.assertEqual(frame["type"], "STATE_SNAPSHOT")
+        self.assertEqual(frame["holdCount"], 40)
+        stats = self.client.get("/api/stats/broadcast").json()
+        self.assertEqual(stats["resume_fallbacks"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()